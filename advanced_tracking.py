@@ -6,6 +6,7 @@ Uses person tracking + face recognition for better accuracy
 import boto3
 import time
 import json
+from label_cache import detect_labels_cached
 
 class AdvancedStreamTracker:
     def __init__(self):
@@ -59,10 +60,11 @@ class AdvancedStreamTracker:
         
         # 1. Detect labels (activities)
         try:
-            label_response = self.rekognition.detect_labels(
-                Image={'Bytes': frame_bytes},
-                MaxLabels=15,
-                MinConfidence=70
+            label_response = detect_labels_cached(
+                self.rekognition,
+                frame_bytes,
+                max_labels=15,
+                min_confidence=70
             )
             results['labels'] = label_response.get('Labels', [])
         except Exception as e:
@@ -70,10 +72,11 @@ class AdvancedStreamTracker:
         
         # 2. Detect people with pose estimation
         try:
-            person_response = self.rekognition.detect_labels(
-                Image={'Bytes': frame_bytes},
-                MaxLabels=15,
-                Features=['GENERAL_LABELS']
+            person_response = detect_labels_cached(
+                self.rekognition,
+                frame_bytes,
+                max_labels=15,
+                features=['GENERAL_LABELS']
             )
             
             # Check for person labels
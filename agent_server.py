@@ -14,6 +14,8 @@ from dotenv import load_dotenv
 import boto3
 from threading import Thread
 from datetime import datetime
+from video_frames import extract_frames
+from video_meta import get_metadata
 
 load_dotenv()
 
@@ -22,6 +24,9 @@ AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 WEBHOOK_URL = os.getenv('WEBHOOK_URL', 'http://localhost:8000/api/events/detection')
 COLLECTION_ID = os.getenv('COLLECTION_ID', 'streambet-streamers')
 
+# JPEG settings for frames sent to Rekognition (see video_frames.ANALYSIS_PROFILES)
+AGENT_ANALYSIS_PROFILE = os.getenv('AGENT_ANALYSIS_PROFILE', 'full')
+
 # Initialize Flask app
 app = Flask(__name__)
 
@@ -57,92 +62,77 @@ def extract_and_analyze_frames(video_url, video_id, labels, confidence_threshold
         
         print(f"✅ Video downloaded to {temp_video}")
         
-        # Open video
-        cap = cv2.VideoCapture(temp_video)
-        if not cap.isOpened():
+        # Decode sampled frames (across processes for long videos)
+        metadata = get_metadata(temp_video)
+        if metadata is None:
             raise Exception("Could not open video")
-        
-        video_fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / video_fps if video_fps > 0 else 0
+        video_fps = metadata['fps']
+        total_frames = metadata['frame_count']
+        duration = metadata['duration']
         
         print(f"📹 Video: {video_fps} fps, {total_frames} frames, {duration:.2f}s")
         print(f"🎬 Analyzing {fps_sample} frames per second...")
         
-        frame_interval = int(video_fps / fps_sample) if video_fps > 0 else 1
-        frame_count = 0
+        frames = extract_frames(temp_video, fps=fps_sample, profile=AGENT_ANALYSIS_PROFILE)
         detections = []
         last_notification_time = {}  # Cooldown per label
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        for timestamp, frame_bytes in frames:
+            frame_count = int(round(timestamp * video_fps)) if video_fps > 0 else int(timestamp)
             
-            if frame_count % frame_interval == 0:
-                timestamp = frame_count / video_fps if video_fps > 0 else frame_count
+            # Detect labels with Rekognition
+            try:
+                response = rek_client.detect_labels(
+                    Image={'Bytes': frame_bytes},
+                    MaxLabels=10,
+                    MinConfidence=confidence_threshold * 100
+                )
                 
-                # Convert frame to JPEG
-                _, buffer = cv2.imencode('.jpg', frame)
-                frame_bytes = buffer.tobytes()
+                detected_labels = response.get('Labels', [])
                 
-                # Detect labels with Rekognition
-                try:
-                    response = rek_client.detect_labels(
-                        Image={'Bytes': frame_bytes},
-                        MaxLabels=10,
-                        MinConfidence=confidence_threshold * 100
-                    )
-                    
-                    detected_labels = response.get('Labels', [])
+                # Check for target labels
+                for label in detected_labels:
+                    label_name = label['Name'].lower()
+                    label_confidence = label['Confidence'] / 100
                     
-                    # Check for target labels
-                    for label in detected_labels:
-                        label_name = label['Name'].lower()
-                        label_confidence = label['Confidence'] / 100
-                        
-                        # If this label matches our filter
-                        if label_name in [l.lower() for l in labels]:
-                            # Check cooldown (don't spam same label)
-                            last_time = last_notification_time.get(label_name, 0)
-                            if time.time() - last_time > 5.0:  # 5 second cooldown
-                                
-                                # Get bounding boxes if available
-                                bbox = None
-                                if label.get('Instances'):
-                                    instance = label['Instances'][0]
-                                    box = instance.get('BoundingBox', {})
-                                    bbox = [
-                                        box.get('Left', 0),
-                                        box.get('Top', 0),
-                                        box.get('Width', 0),
-                                        box.get('Height', 0)
-                                    ]
-                                
-                                # Send webhook notification
-                                event_data = {
-                                    'event': 'detection',
-                                    'video_id': video_id,
-                                    'frame_id': frame_count,
-                                    'timestamp': timestamp,
-                                    'label': label_name,
-                                    'confidence': label_confidence,
-                                    'bbox': bbox,
-                                    'ts': time.time()
-                                }
-                                
-                                print(f"🚨 DETECTION: {label_name} at {timestamp:.2f}s ({label_confidence*100:.1f}%)")
-                                send_webhook(event_data)
-                                
-                                detections.append(event_data)
-                                last_notification_time[label_name] = time.time()
-                
-                except Exception as e:
-                    print(f"⚠️  Frame analysis error: {e}")
+                    # If this label matches our filter
+                    if label_name in [l.lower() for l in labels]:
+                        # Check cooldown (don't spam same label)
+                        last_time = last_notification_time.get(label_name, 0)
+                        if time.time() - last_time > 5.0:  # 5 second cooldown
+                            
+                            # Get bounding boxes if available
+                            bbox = None
+                            if label.get('Instances'):
+                                instance = label['Instances'][0]
+                                box = instance.get('BoundingBox', {})
+                                bbox = [
+                                    box.get('Left', 0),
+                                    box.get('Top', 0),
+                                    box.get('Width', 0),
+                                    box.get('Height', 0)
+                                ]
+                            
+                            # Send webhook notification
+                            event_data = {
+                                'event': 'detection',
+                                'video_id': video_id,
+                                'frame_id': frame_count,
+                                'timestamp': timestamp,
+                                'label': label_name,
+                                'confidence': label_confidence,
+                                'bbox': bbox,
+                                'ts': time.time()
+                            }
+                            
+                            print(f"🚨 DETECTION: {label_name} at {timestamp:.2f}s ({label_confidence*100:.1f}%)")
+                            send_webhook(event_data)
+                            
+                            detections.append(event_data)
+                            last_notification_time[label_name] = time.time()
             
-            frame_count += 1
-        
-        cap.release()
+            except Exception as e:
+                print(f"⚠️  Frame analysis error: {e}")
         
         # Clean up
         os.remove(temp_video)
@@ -152,8 +142,8 @@ def extract_and_analyze_frames(video_url, video_id, labels, confidence_threshold
         return {
             'status': 'success',
             'video_id': video_id,
-            'total_frames': frame_count,
-            'frames_analyzed': frame_count // frame_interval,
+            'total_frames': total_frames,
+            'frames_analyzed': len(frames),
             'detections_count': len(detections),
             'detections': detections
         }
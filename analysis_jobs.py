@@ -0,0 +1,400 @@
+"""
+Shared analysis jobs for StreamBet
+Viewers asking for the same analysis (same video content, query and
+parameters) share one run: the job's event generator runs once on a
+background thread and each event is published to every subscriber.
+
+Each subscriber reads through a bounded buffer. One that falls more than
+JOB_SUBSCRIBER_BUFFER events behind (a slow client) stops being fed and
+catches up from the job's event history instead, so it never holds up the
+analysis or the other viewers. Late joiners replay the history first and
+then follow live; a finished job is replayed to new viewers for
+JOB_RETAIN_SECONDS without running again. A run that failed - the generator
+raised, or yielded an error event or a 'partial' one (frames dropped) - is
+forgotten as soon as it ends, so the next viewer starts a fresh run.
+
+Event ids are the run's id plus the event's position in it; with
+EVENT_LOG_DIR set events are also appended to an on-disk log (event_log.py),
+so a reconnecting client resumes after its Last-Event-ID from memory, from
+the log, or by following another worker's live log. Ids only line up within
+one run (commentary is interleaved as it finishes), so a client whose run is
+gone gets a RESET event and the current run from its first event.
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import hashlib
+import threading
+
+from event_log import EventLogWriter, log_path, log_state, log_length, log_run, read_log, EVENT_LOG_DIR
+
+ANALYSIS_JOBS_ENABLED = os.getenv('ANALYSIS_JOBS_ENABLED', 'true').lower() == 'true'
+
+# Live events buffered per subscriber before it falls back to the history
+JOB_SUBSCRIBER_BUFFER = int(os.getenv('JOB_SUBSCRIBER_BUFFER', '64'))
+
+# Finished jobs replayed to new viewers for this long (and at most this many)
+JOB_RETAIN_SECONDS = float(os.getenv('JOB_RETAIN_SECONDS', '600'))
+JOB_MAX_RETAINED = int(os.getenv('JOB_MAX_RETAINED', '64'))
+
+# A running job with nobody watching is cancelled after this long
+JOB_ORPHAN_SECONDS = float(os.getenv('JOB_ORPHAN_SECONDS', '15'))
+
+_DONE = object()
+
+# Sent (without an id) before replaying a different run than the client resumed
+RESET = json.dumps({'type': 'reset', 'message': 'Analysis restarted, replaying from the start'})
+
+
+def _is_failure(event):
+    """Error event, or a result the generator marked as missing frames"""
+    return isinstance(event, dict) and (event.get('type') == 'error' or bool(event.get('partial')))
+
+
+def job_key(content_hash, query, params):
+    """Registry key: video bytes + query + every parameter that changes the result"""
+    raw = json.dumps([content_hash, query, params], sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+def parse_event_id(value):
+    """
+    (run_id, index) from a Last-Event-ID, None without one
+    An id from no known run gives (None, -1), which never matches a run.
+    """
+    if not value:
+        return None
+    run_id, _, index = value.rpartition('-')
+    if not run_id or not index.isdigit():
+        return None, -1
+    return run_id, int(index)
+
+
+def _with_ids(run_id, pairs, reset=False):
+    """(index, payload) pairs as (event id, payload), after a RESET if asked"""
+    try:
+        if reset:
+            yield None, RESET
+        for index, payload in pairs:
+            yield f"{run_id}-{index}", payload
+    finally:
+        pairs.close()
+
+
+class Subscription:
+    """One viewer of a job; events() yields the job's (index, payload) pairs in order"""
+
+    def __init__(self, job, start=0):
+        self.job = job
+        self.buffer = queue.Queue(maxsize=JOB_SUBSCRIBER_BUFFER)
+        self.cursor = start  # Index of the next event this viewer should see
+        self.lagging = True  # Starts by replaying the history
+        self.resyncs = 0
+
+    def offer(self, index, event):
+        """Called by the job with its lock held, never blocks"""
+        if self.lagging:
+            return
+        try:
+            self.buffer.put_nowait((index, event))
+        except queue.Full:
+            self.lagging = True
+            self.resyncs += 1
+
+    def events(self):
+        """History so far, then live events until the job finishes"""
+        job = self.job
+        try:
+            while True:
+                with job.lock:
+                    backlog = None
+                    if self.lagging:
+                        backlog = job.history[self.cursor:]
+                        finished = job.finished
+                        # Everything queued is also in the backlog
+                        while not self.buffer.empty():
+                            self.buffer.get_nowait()
+                        self.lagging = False
+
+                if backlog is not None:
+                    for event in backlog:
+                        self.cursor += 1
+                        yield self.cursor - 1, event
+                    if finished:
+                        return
+                    continue
+
+                index, event = self.buffer.get()
+                if event is _DONE:
+                    return
+                if index < self.cursor:
+                    continue
+                self.cursor = index + 1
+                yield index, event
+        finally:
+            job.unsubscribe(self)
+
+
+class AnalysisJob:
+    """
+    One run of an event generator, broadcast to any number of subscribers
+    Events are JSON-encoded once here, not once per viewer
+    """
+
+    def __init__(self, key, produce, log=None, run_id=None):
+        self.key = key
+        self.run_id = run_id or new_run_id()
+        self.produce = produce
+        self.log = log
+        self.lock = threading.Lock()
+        self.history = []
+        self.subscribers = set()
+        self.finished = False
+        self.cancelled = False
+        self.failed = False
+        self.created_at = time.time()
+        self.finished_at = None
+        self.idle_since = None
+        self.subscriptions = 0
+        self.resyncs = 0
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name=f"analysis-job-{self.key[:8]}").start()
+
+    def subscribe(self, start=0):
+        subscription = Subscription(self, start)
+        with self.lock:
+            self.subscribers.add(subscription)
+            self.subscriptions += 1
+            self.idle_since = None
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.subscribers:
+                self.subscribers.discard(subscription)
+                self.resyncs += subscription.resyncs
+                if not self.subscribers:
+                    self.idle_since = time.time()
+
+    def _publish(self, event):
+        payload = json.dumps(event)
+        if self.log:
+            try:
+                self.log.append(payload)
+            except OSError as e:
+                print(f"⚠️ Event log write failed, resume limited to this worker: {e}")
+                self.log = None
+        with self.lock:
+            index = len(self.history)
+            self.history.append(payload)
+            for subscription in self.subscribers:
+                subscription.offer(index, payload)
+
+    def _orphaned(self):
+        with self.lock:
+            return self.idle_since is not None and time.time() - self.idle_since >= JOB_ORPHAN_SECONDS
+
+    def _run(self):
+        events = self.produce()
+        try:
+            for event in events:
+                if _is_failure(event):
+                    self.failed = True
+                self._publish(event)
+                if self._orphaned() and _cancel_if_orphaned(self):
+                    print(f"🛑 Analysis job {self.key[:8]} cancelled, no viewers left")
+                    break
+        except Exception as e:
+            print(f"❌ Analysis job {self.key[:8]} failed: {e}")
+            self.failed = True
+        finally:
+            # Runs the generator's own cleanup (decoder threads, storage pins)
+            events.close()
+            if self.cancelled or self.failed:
+                _forget(self)
+            elif self.log:
+                try:
+                    self.log.finish()
+                except OSError as e:
+                    print(f"⚠️ Could not close event log: {e}")
+            with self.lock:
+                self.finished = True
+                self.finished_at = time.time()
+                for subscription in self.subscribers:
+                    subscription.offer(len(self.history), _DONE)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'key': self.key,
+                'run': self.run_id,
+                'events': len(self.history),
+                'subscribers': len(self.subscribers),
+                'subscriptions': self.subscriptions,
+                'finished': self.finished,
+                'cancelled': self.cancelled,
+                'failed': self.failed
+            }
+
+
+_jobs = {}  # key -> AnalysisJob
+_jobs_lock = threading.Lock()
+_counters = {'jobs_started': 0, 'subscriptions': 0, 'jobs_cancelled': 0, 'jobs_failed': 0, 'log_replays': 0}
+
+
+def _cancel_if_orphaned(job):
+    """Drop an unwatched job from the registry; False if a viewer joined meanwhile"""
+    with _jobs_lock:
+        if not job._orphaned():
+            return False
+        job.cancelled = True
+        _counters['jobs_cancelled'] += 1
+        if _jobs.get(job.key) is job:
+            del _jobs[job.key]
+        return True
+
+
+def _forget(job):
+    """
+    Drop a cancelled or failed job and its partial log so nobody is replayed it
+    Under _jobs_lock, so no viewer in this process picks up the log meanwhile
+    """
+    with _jobs_lock:
+        if job.failed:
+            print(f"🗑️ Analysis job {job.key[:8]} not retained, its run failed")
+            _counters['jobs_failed'] += 1
+        if _jobs.get(job.key) is job:
+            del _jobs[job.key]
+        if job.log:
+            job.log.discard()
+
+
+def _expire_finished():
+    """Forget finished jobs past their retention (caller holds _jobs_lock)"""
+    now = time.time()
+    finished = sorted(
+        (job for job in _jobs.values() if job.finished),
+        key=lambda job: job.finished_at
+    )
+    excess = len(finished) - JOB_MAX_RETAINED
+    for i, job in enumerate(finished):
+        if job.cancelled or job.failed or i < excess or now - job.finished_at > JOB_RETAIN_SECONDS:
+            _jobs.pop(job.key, None)
+
+
+def _logged_run(path, resuming):
+    """
+    Run id of the on-disk log to serve when no job for its key is in this
+    process: a finished log (recent, or any age when resuming), or another
+    worker's live one. None when a new run has to start.
+    """
+    state = log_state(path)
+    if state == 'finished':
+        recent = time.time() - os.path.getmtime(path) <= JOB_RETAIN_SECONDS
+        if resuming or recent:
+            return log_run(path)
+    elif state == 'live':
+        return log_run(path)
+    return None
+
+
+def subscribe(key, produce, resume=None):
+    """
+    Events for key as (event id, JSON payload) pairs, starting produce() as a
+    new job if no run is in memory or on disk. resume is the client's
+    (run_id, index) from parse_event_id: when that run is still available
+    events up to index are skipped, otherwise the available (or a new) run is
+    sent from its start after a RESET.
+    Returns (events, started_new_job); events is None when a resumed
+    analysis has already sent everything.
+    """
+    def start_for(run_id):
+        return resume[1] + 1 if resume and resume[0] == run_id else 0
+
+    log = None
+    run_id = None
+    with _jobs_lock:
+        _expire_finished()
+        job = _jobs.get(key)
+        if job is None and EVENT_LOG_DIR:
+            path = log_path(key)
+            logged_run = _logged_run(path, resume is not None)
+            if logged_run is None:
+                try:
+                    os.remove(path)  # Stale or expired run
+                except FileNotFoundError:
+                    pass
+                run_id = new_run_id()
+                try:
+                    log = EventLogWriter(path, run_id)
+                except FileExistsError:
+                    # Another worker started this run a moment ago
+                    logged_run = log_run(path)
+            if logged_run is not None:
+                start = start_for(logged_run)
+                if start and log_state(path) == 'finished' and start >= log_length(path):
+                    return None, False
+                _counters['subscriptions'] += 1
+                _counters['log_replays'] += 1
+                events = read_log(path, start, follow=True)
+                return _with_ids(logged_run, events, reset=resume is not None and not start), False
+
+        created = job is None
+        if created:
+            job = AnalysisJob(key, produce, log, run_id)
+            _jobs[key] = job
+            _counters['jobs_started'] += 1
+        start = start_for(job.run_id)
+        if start:
+            with job.lock:
+                if job.finished and start >= len(job.history):
+                    return None, False
+        _counters['subscriptions'] += 1
+        subscription = job.subscribe(start)
+    if created:
+        job.start()
+    return _with_ids(job.run_id, subscription.events(), reset=resume is not None and not start), created
+
+
+def numbered_events(events, resume=None):
+    """
+    (event id, JSON payload) pairs for an unshared run (ANALYSIS_JOBS_ENABLED=false)
+    Every connection is a new run, so a resuming client is reset first.
+    """
+    run_id = new_run_id()
+    try:
+        if resume is not None:
+            yield None, RESET
+        for index, event in enumerate(events):
+            yield f"{run_id}-{index}", json.dumps(event)
+    finally:
+        events.close()
+
+
+def stats():
+    """Jobs started vs. viewers served, for /api/job-stats"""
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+        counters = dict(_counters)
+    job_stats = [job.stats() for job in jobs]
+    return {
+        'enabled': ANALYSIS_JOBS_ENABLED,
+        'jobs_started': counters['jobs_started'],
+        'jobs_cancelled': counters['jobs_cancelled'],
+        'jobs_failed': counters['jobs_failed'],
+        'subscriptions': counters['subscriptions'],
+        'analyses_saved': counters['subscriptions'] - counters['jobs_started'],
+        'running': sum(1 for job in job_stats if not job['finished']),
+        'retained': sum(1 for job in job_stats if job['finished']),
+        'viewers': sum(job['subscribers'] for job in job_stats),
+        'slow_viewer_resyncs': sum(job.resyncs for job in jobs),
+        'log_replays': counters['log_replays']
+    }
@@ -6,11 +6,13 @@ Hackathon Demo: AWS Rekognition + Simple Betting Interface
 import os
 import json
 import boto3
-import cv2
 import time
 import sys
 import io
 import re
+import itertools
+import threading
+import weakref
 from flask import Flask, render_template, request, jsonify, Response, send_from_directory, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
@@ -19,12 +21,33 @@ import traceback
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from PIL import Image
-from moviepy.editor import VideoFileClip
-import tempfile
 import base64
 import requests
 from elevenlabs import ElevenLabs, VoiceSettings
 from dotenv import load_dotenv
+from video_frames import extract_frames, FrameStream, WindowReader, AnalysisStats, ANALYSIS_PROFILES
+from pipeline import ordered_map
+from label_cache import detect_labels_cached, get_label_cache
+from frame_dedup import FrameDeduper
+from sampling import make_scheduler
+from video_meta import get_metadata, content_hash
+from interpretation import InterpretationBatcher
+import label_rules
+from keyword_matcher import label_matcher, classify, has_class
+from interpretation_cache import InterpretationCache, get_interpretation_cache, INTERPRETATION_CACHE_ENABLED
+from commentary import CommentaryPipeline
+from tts_cache import tts_key, get_tts_cache, TTS_CACHE_ENABLED
+from storage_janitor import get_storage_janitor, STORAGE_JANITOR_ENABLED
+from serving import bounded, offload_cpu
+import serving
+from audio_index import get_audio_track, wav_bytes, AUDIO_INDEX_DIR
+from transcription import peek_transcript, start_transcript, whisper_invoker, StubWhisperRuntime, STUB_ENDPOINT, TRANSCRIPT_DIR
+from vad import has_speech, noise_floor, VAD_ENABLED
+from analysis_jobs import job_key, numbered_events, parse_event_id, ANALYSIS_JOBS_ENABLED
+import analysis_jobs
+from event_log import EVENT_LOG_DIR
+from prewarm import get_prewarmer, PREWARM_ENABLED, PREWARM_CONCURRENCY, PRIORITY_WAITING
+from label_store import get_label_store, save_labels, DECISIONS, YES, NO, LABEL_STORE_DIR
 
 # Load environment variables from .env file
 load_dotenv()
@@ -42,10 +65,11 @@ USE_MOCK_MODE = os.getenv('USE_MOCK_MODE', 'false').lower() == 'true'  # Set to
 
 # AWS Clients
 try:
-    s3_client = boto3.client('s3', region_name=AWS_REGION)
-    rek_client = boto3.client('rekognition', region_name=AWS_REGION)
-    bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
-    sagemaker_runtime = boto3.client('sagemaker-runtime', region_name='ap-southeast-2')
+    # bounded(): calls go through the AWS executor under gevent workers (serving.py)
+    s3_client = bounded(boto3.client('s3', region_name=AWS_REGION))
+    rek_client = bounded(boto3.client('rekognition', region_name=AWS_REGION))
+    bedrock_client = bounded(boto3.client('bedrock-runtime', region_name='us-east-1'))
+    sagemaker_runtime = bounded(boto3.client('sagemaker-runtime', region_name='ap-southeast-2'))
     print("✅ AWS clients initialized successfully")
     print("🤖 Bedrock AI available - AI commentary enabled")
     print("🎤 SageMaker Runtime ready for Whisper ASR")
@@ -59,6 +83,14 @@ except Exception as e:
 WHISPER_ENDPOINT = os.getenv('WHISPER_ENDPOINT_NAME', None)  # Set in .env if you have a deployed endpoint
 WHISPER_MODEL_ARN = "arn:aws:sagemaker:ap-southeast-2:aws:hub-content/SageMakerPublicHub/Model/huggingface-asr-whisper-large-v3-turbo/1.1.12"
 
+# 'track': transcribe the whole audio once and look speech up by time (transcription.py)
+# 'segment': one Whisper call per 5s window around each commentary frame
+TRANSCRIPTION_MODE = os.getenv('TRANSCRIPTION_MODE', 'track')
+
+if WHISPER_ENDPOINT == STUB_ENDPOINT:
+    sagemaker_runtime = StubWhisperRuntime()
+    print("🧪 Using the local Whisper stub (no SageMaker calls)")
+
 if WHISPER_ENDPOINT:
     print(f"🎙️ Whisper ASR endpoint configured: {WHISPER_ENDPOINT}")
     print("🎙️ Audio analysis enabled for enhanced commentary")
@@ -82,17 +114,82 @@ else:
     print("💡 Set ELEVENLABS_API_KEY in .env to enable voice commentary")
     elevenlabs_client = None
 
+# Everything below shapes the audio, so all of it is part of the TTS cache key
+ELEVENLABS_MODEL_ID = "eleven_turbo_v2_5"
+ELEVENLABS_OUTPUT_FORMAT = "mp3_44100_128"
+ELEVENLABS_VOICE_SETTINGS = {
+    'stability': 0.5,
+    'similarity_boost': 0.75,
+    'style': 0.5,
+    'use_speaker_boost': True
+}
+
 ALLOWED_EXTENSIONS = {'mp4', 'mov', 'avi'}
 UPLOAD_FOLDER = 'uploads'
 AUDIO_FOLDER = 'audio_commentary'
 
+# Frame resize/JPEG profile per analysis endpoint (see video_frames.ANALYSIS_PROFILES)
+# Override per request with ?profile=<name> to compare profiles
+ENDPOINT_PROFILES = {
+    'stream_counter': os.getenv('PROFILE_STREAM_COUNTER', 'fast'),
+    'analyze_video_stream': os.getenv('PROFILE_ANALYZE_VIDEO_STREAM', 'fast'),
+    'analyze_video': os.getenv('PROFILE_ANALYZE_VIDEO', 'fast'),
+    'analyze_frames': os.getenv('PROFILE_ANALYZE_FRAMES', 'balanced'),
+}
+
+# Payload size + Rekognition latency per profile, served at /api/analysis-stats
+analysis_stats = AnalysisStats()
+
+# /api/stream-counter keeps this many frames in Rekognition/Bedrock at once,
+# and looks at most REORDER_WINDOW frames ahead of the last emitted event
+STREAM_COUNTER_CONCURRENCY = int(os.getenv('STREAM_COUNTER_CONCURRENCY', '4'))
+STREAM_COUNTER_REORDER_WINDOW = int(os.getenv('STREAM_COUNTER_REORDER_WINDOW', '8'))
+
+# Coarse-to-fine search: coarse frames whose labels hit an action keyword get
+# the window around them (half the gap to the previous sample, each side)
+# re-sampled at REFINE_FPS, so sub-second actions between samples aren't missed
+# (trigger keywords: the 'refine' class in keyword_matcher.py). Only action
+# queries (backflips) refine; refined frames come out of the motion sampling
+# call budget, and there are at most REFINE_MAX_FRAMES of them per stream
+STREAM_COUNTER_REFINE = os.getenv('STREAM_COUNTER_REFINE', 'true').lower() == 'true'
+REFINE_FPS = float(os.getenv('REFINE_FPS', '6'))
+REFINE_MAX_HALF_WINDOW = float(os.getenv('REFINE_MAX_HALF_WINDOW', '1.5'))
+REFINE_MAX_FRAMES = int(os.getenv('REFINE_MAX_FRAMES', '20'))
+# Evaluate compiled label rules (label_rules.py) before asking Bedrock
+STREAM_COUNTER_RULES = os.getenv('STREAM_COUNTER_RULES', 'true').lower() == 'true'
+
+# Endpoints whose frames are labeled in the background right after upload
+# (prewarm.py); 'stream_counter,analyze_frames' warms both samplings
+PREWARM_ENDPOINTS = [
+    endpoint.strip() for endpoint in os.getenv('PREWARM_ENDPOINTS', 'stream_counter').split(',')
+    if endpoint.strip()
+]
+
+
 # Create audio folder if it doesn't exist
 if not os.path.exists(AUDIO_FOLDER):
     os.makedirs(AUDIO_FOLDER)
 
+# Byte budget + LRU eviction for uploads, screenshots, commentary audio,
+# decoded audio tracks, transcripts, stored labels and analysis event logs.
+# Analyses pin the video they read (storage.acquire/release)
+storage = get_storage_janitor([
+    root for root in (UPLOAD_FOLDER, AUDIO_FOLDER, AUDIO_INDEX_DIR, TRANSCRIPT_DIR, LABEL_STORE_DIR, EVENT_LOG_DIR)
+    if root
+])
+if STORAGE_JANITOR_ENABLED:
+    storage.start()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def endpoint_profile(endpoint):
+    """Analysis profile for an endpoint, honoring a valid ?profile= override"""
+    requested = request.args.get('profile')
+    if requested in ANALYSIS_PROFILES:
+        return requested
+    return ENDPOINT_PROFILES[endpoint]
+
 # Mock betting data for demo
 DEMO_BETS = [
     {
@@ -219,11 +316,12 @@ def analyze_single_frame():
         frame_file = request.files['frame']
         frame_bytes = frame_file.read()
         
-        # Analyze with Rekognition
-        response = rek_client.detect_labels(
-            Image={'Bytes': frame_bytes},
-            MaxLabels=20,  # Get more labels for discovery
-            MinConfidence=60  # Lower threshold to see more options
+        # Analyze with Rekognition (cached by frame content)
+        response = detect_labels_cached(
+            rek_client,
+            frame_bytes,
+            max_labels=20,  # Get more labels for discovery
+            min_confidence=60  # Lower threshold to see more options
         )
         
         return jsonify({
@@ -332,6 +430,9 @@ def configure_detection():
             # Use Bedrock to understand intent
             config = generate_config_with_ai(intent)
         
+        # Compile once into label rules so most frames never need Bedrock
+        config['rules'] = label_rules.normalize_program(config.get('rules')) or label_rules.compile_rules(config)
+        
         # Generate response message
         response_message = f"""
 ✅ Got it! I've configured detection for: <strong>{config['target']}</strong>
@@ -369,16 +470,24 @@ Generate a JSON detection configuration with these fields:
 - target: Short name for what to detect (e.g., "Backflips", "Roller Coasters", "Game Kills")
 - query: The exact question to ask about each video frame (e.g., "Is anyone doing a backflip?")
 - mode: Either "Detection" or "Counting" (use Counting if user asks "how many")
+- rules: AWS Rekognition label rules that decide a frame without asking an AI
+  - required: list of groups of lowercase label keywords, every group needs a matching label
+  - forbidden: label keywords that mean "No"
+  - weak: label keywords that hint at the target but need an AI to confirm
+  - min_confidence: label confidence (0-100) needed to match
+  - count_from_instances: true to count instances of the last required group's labels
+  - strict: true only if the required labels are certain to appear whenever the target is visible
+  Use "rules": null if Rekognition labels can't show the target (text, colours, UI elements)
 
 Examples:
 User: "detect ishowspeed backflip"
-Output: {{"target": "IShowSpeed Backflips", "query": "Is anyone doing a backflip or acrobatic move?", "mode": "Detection"}}
+Output: {{"target": "IShowSpeed Backflips", "query": "Is anyone doing a backflip or acrobatic move?", "mode": "Detection", "rules": {{"required": [["person", "human"], ["jump", "flip", "acrobatic", "airborne", "gymnastics"]], "forbidden": [], "weak": ["sport", "fighting", "dancing"], "min_confidence": 70, "count_from_instances": true, "strict": true}}}}
 
 User: "count roller coasters"
-Output: {{"target": "Roller Coasters", "query": "Is a roller coaster visible in this frame?", "mode": "Counting"}}
+Output: {{"target": "Roller Coasters", "query": "Is a roller coaster visible in this frame?", "mode": "Counting", "rules": {{"required": [["roller coaster", "coaster"]], "forbidden": [], "weak": ["ride", "amusement park"], "min_confidence": 70, "count_from_instances": true, "strict": true}}}}
 
 User: "video game kills"
-Output: {{"target": "Game Kills", "query": "Is there a kill notification or elimination indicator visible?", "mode": "Counting"}}
+Output: {{"target": "Game Kills", "query": "Is there a kill notification or elimination indicator visible?", "mode": "Counting", "rules": null}}
 
 Now generate config for: "{intent}"
 Return ONLY the JSON, no other text."""
@@ -387,7 +496,7 @@ Return ONLY the JSON, no other text."""
             modelId='anthropic.claude-3-sonnet-20240229-v1:0',
             body=json.dumps({
                 "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 300,
+                "max_tokens": 600,
                 "messages": [{
                     "role": "user",
                     "content": prompt
@@ -465,39 +574,28 @@ def generate_config_fallback(intent):
         }
 
 def extract_audio_segment(video_path, start_time, duration=5):
-    """Extract audio segment from video for transcription"""
+    """
+    WAV bytes of the audio around start_time, for transcription
+    The video's audio is demuxed once (audio_index.py), later segments are slices
+    """
     try:
-        with VideoFileClip(video_path) as video:
-            # Extract audio segment around the timestamp
-            audio_start = max(0, start_time - duration/2)
-            audio_end = min(video.duration, start_time + duration/2)
-            
-            audio_clip = video.subclip(audio_start, audio_end).audio
-            if audio_clip is None:
-                return None
-            
-            # Save to temporary file
-            temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            audio_clip.write_audiofile(temp_audio.name, fps=16000, verbose=False, logger=None)
-            
-            return temp_audio.name
+        track = get_audio_track(video_path)
+        if track is None:
+            return None
+        segment = track.segment_around(start_time, duration)
+        if not len(segment):
+            return None
+        return wav_bytes(segment, track.sample_rate)
     except Exception as e:
         print(f"⚠️ Audio extraction failed: {e}")
         return None
 
-def transcribe_audio_segment(audio_path):
-    """Transcribe audio using SageMaker Whisper endpoint"""
-    if not sagemaker_runtime or not WHISPER_ENDPOINT or not audio_path:
-        # Clean up temp file
-        if audio_path and os.path.exists(audio_path):
-            os.unlink(audio_path)
+def transcribe_audio_segment(audio_bytes):
+    """Transcribe WAV bytes (from extract_audio_segment) using SageMaker Whisper endpoint"""
+    if not sagemaker_runtime or not WHISPER_ENDPOINT or not audio_bytes:
         return None
     
     try:
-        # Read audio file and encode to base64
-        with open(audio_path, 'rb') as audio_file:
-            audio_bytes = audio_file.read()
-        
         # Prepare payload for SageMaker
         payload = {
             "inputs": base64.b64encode(audio_bytes).decode('utf-8'),
@@ -518,17 +616,10 @@ def transcribe_audio_segment(audio_path):
         result = json.loads(response['Body'].read().decode('utf-8'))
         transcription = result.get('text', '').strip()
         
-        # Clean up temp file
-        if os.path.exists(audio_path):
-            os.unlink(audio_path)
-        
         return transcription if transcription else None
         
     except Exception as e:
         print(f"⚠️ SageMaker transcription failed: {e}")
-        # Clean up temp file on error
-        if audio_path and os.path.exists(audio_path):
-            os.unlink(audio_path)
         return None
 
 def generate_commentary(labels_text, celebrities, answer, timestamp, query, frame_context=None, audio_text=None):
@@ -537,13 +628,14 @@ def generate_commentary(labels_text, celebrities, answer, timestamp, query, fram
     
     try:
         celebrity_name = celebrities[0].split('(')[0].strip() if celebrities else "the athlete"
+        heard = f"\nHeard on stream: \"{audio_text[:150]}\"" if audio_text else ""
         
         # Short natural sports commentary prompt
         if "backflip" in query.lower() or "jump" in query.lower():
             prompt = f"""Sports commentator. Describe {celebrity_name}'s action in ONE short sentence (8-12 words max).
 
 Scene: {labels_text[:200]}
-Action: {answer}
+Action: {answer}{heard}
 
 Style - Keep it natural and brief:
 - "Nice flip - good rotation there"
@@ -554,7 +646,7 @@ Style - Keep it natural and brief:
 
 One short sentence only:"""
         else:
-            prompt = f"""Sports commentary. Describe this in ONE brief sentence (8-12 words): {labels_text[:200]}
+            prompt = f"""Sports commentary. Describe this in ONE brief sentence (8-12 words): {labels_text[:200]}{heard}
 
 Be natural and concise:"""
         
@@ -617,23 +709,28 @@ def text_to_speech(text, timestamp):
         print(f"⚠️ Voice disabled: client={elevenlabs_client is not None}, text={bool(text)}")
         return None
     
-    try:
+    def synthesize():
         print(f"🎤 Converting to speech: {text[:50]}...")
-        
         # Generate audio using ElevenLabs (simplified - no signal on macOS)
-        audio_generator = elevenlabs_client.text_to_speech.convert(
+        return elevenlabs_client.text_to_speech.convert(
             voice_id=ELEVENLABS_VOICE_ID,
             optimize_streaming_latency="0",
-            output_format="mp3_44100_128",
+            output_format=ELEVENLABS_OUTPUT_FORMAT,
             text=text,
-            model_id="eleven_turbo_v2_5",
-            voice_settings=VoiceSettings(
-                stability=0.5,
-                similarity_boost=0.75,
-                style=0.5,
-                use_speaker_boost=True
-            )
+            model_id=ELEVENLABS_MODEL_ID,
+            voice_settings=VoiceSettings(**ELEVENLABS_VOICE_SETTINGS)
         )
+    
+    try:
+        # Same text + voice + settings = same mp3, served without an ElevenLabs call
+        if TTS_CACHE_ENABLED:
+            key = tts_key(text, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL_ID, ELEVENLABS_VOICE_SETTINGS, ELEVENLABS_OUTPUT_FORMAT)
+            audio_filename = get_tts_cache(AUDIO_FOLDER).get_or_render(key, synthesize)
+            storage.touch(os.path.join(AUDIO_FOLDER, audio_filename))
+            print(f"🔊 Voice audio ready: {audio_filename}")
+            return f"/audio/{audio_filename}"
+        
+        audio_generator = synthesize()
         
         # Save audio to file
         audio_filename = f"commentary_{int(timestamp*1000)}.mp3"
@@ -653,6 +750,253 @@ def text_to_speech(text, timestamp):
         traceback.print_exc()
         return None
 
+# Fallback narration phrases (also the TTS phrase bank, see prerender_commentary_audio)
+COMMENTARY_IGNORED_LABELS = ['person', 'people', 'adult', 'male', 'man', 'human', 'face', 'head', 'clothing']
+
+# Map generic labels to better scene descriptions
+COMMENTARY_SCENE_MAP = {
+    'fun': 'theme park',
+    'amusement park': 'theme park',
+    'theme park': 'theme park',
+    'sport': 'sports venue',
+    'fighting': 'action area',
+    'basketball': 'basketball court',
+    'people': 'venue'
+}
+COMMENTARY_DEFAULT_SCENE = 'venue'
+
+# Action detected - short exciting commentary
+COMMENTARY_ACTION_PHRASES = [
+    "There's the launch - body rotating through the air",
+    "Nice flip here - good form on the rotation",
+    "Up he goes with the backflip attempt",
+    "Launching into the flip - crowd's loving it",
+    "Here comes another acrobatic move",
+    "Perfect rotation on that flip"
+]
+
+# No action - short natural commentary by crowd size
+COMMENTARY_SOLO_PHRASES = [
+    "The athlete at the {scene} preparing for the next move",
+    "Moving solo through the {scene} setting up position",
+    "One athlete working the {scene} here"
+]
+COMMENTARY_GROUP_PHRASES = [
+    "Small group at the {scene} getting ready",
+    "A few athletes gathering at the {scene}",
+    "The {scene} with a handful of people setting up"
+]
+COMMENTARY_CROWD_PHRASES = [
+    "Crowd building at the {scene} waiting for action",
+    "Packed {scene} with everyone watching closely",
+    "Lots of energy in the {scene} crowd right now"
+]
+COMMENTARY_EMPTY_PHRASES = [
+    "The camera captures the {scene} scene right now, with the atmosphere building as we await the next moment of action"
+]
+
+# Extra scenes to pre-render besides the mapped ones, comma-separated
+TTS_PRERENDER_SCENES = [s.strip() for s in os.getenv('TTS_PRERENDER_SCENES', '').split(',') if s.strip()]
+
+def fallback_commentary(labels_data, answer, has_person_in_frame, person_count):
+    """Smart natural behavior narration when AI commentary isn't available"""
+    import random
+    
+    # Get clean scene description (avoid raw labels like "Person", "Adult")
+    scene_labels = [l['name'].lower() for l in labels_data if l['name'].lower() not in COMMENTARY_IGNORED_LABELS]
+    scene = scene_labels[0] if scene_labels else COMMENTARY_DEFAULT_SCENE
+    scene = COMMENTARY_SCENE_MAP.get(scene, scene)
+    
+    if not has_person_in_frame:
+        patterns = COMMENTARY_EMPTY_PHRASES
+    elif 'yes' in answer.lower():
+        patterns = COMMENTARY_ACTION_PHRASES
+    elif person_count == 1:
+        patterns = COMMENTARY_SOLO_PHRASES
+    elif person_count < 5:
+        patterns = COMMENTARY_GROUP_PHRASES
+    else:
+        patterns = COMMENTARY_CROWD_PHRASES
+    return random.choice(patterns).format(scene=scene)
+
+def commentary_phrase_bank():
+    """Every fallback phrase for the known scenes - what prerender_commentary_audio speaks"""
+    scenes = sorted(set(COMMENTARY_SCENE_MAP.values()) | {COMMENTARY_DEFAULT_SCENE} | set(TTS_PRERENDER_SCENES))
+    phrases = list(COMMENTARY_ACTION_PHRASES)
+    for templates in (COMMENTARY_SOLO_PHRASES, COMMENTARY_GROUP_PHRASES, COMMENTARY_CROWD_PHRASES, COMMENTARY_EMPTY_PHRASES):
+        for template in templates:
+            phrases.extend(template.format(scene=scene) for scene in scenes)
+    return list(dict.fromkeys(phrases))
+
+def prerender_commentary_audio():
+    """
+    Speak the whole phrase bank into the TTS cache so fallback commentary
+    never waits on ElevenLabs. Already-cached phrases cost nothing.
+    """
+    if not elevenlabs_client or not TTS_CACHE_ENABLED:
+        print("⚠️ TTS pre-render skipped: needs ElevenLabs and TTS_CACHE_ENABLED")
+        return {'phrases': 0, 'rendered': 0, 'failed': 0}
+    
+    phrases = commentary_phrase_bank()
+    cache = get_tts_cache(AUDIO_FOLDER)
+    renders_before = cache.renders
+    failed = 0
+    print(f"🎤 Pre-rendering {len(phrases)} commentary phrases...")
+    for text in phrases:
+        if not text_to_speech(text, 0):
+            failed += 1
+    rendered = cache.renders - renders_before
+    print(f"✅ Phrase bank ready: {rendered} rendered, {len(phrases) - rendered - failed} already cached, {failed} failed")
+    return {'phrases': len(phrases), 'rendered': rendered, 'failed': failed}
+
+def whisper_enabled():
+    return bool(sagemaker_runtime and WHISPER_ENDPOINT)
+
+# Segment mode VAD counters per video: windows seen/skipped, seconds not sent
+segment_vad_stats = {}
+segment_vad_lock = threading.Lock()
+# Noise floor of each decoded track, measured once over the whole track
+segment_noise_floors = weakref.WeakKeyDictionary()
+
+def transcribe_window(video_path, timestamp, duration=5):
+    """Segment mode: one Whisper call for the window around timestamp, skipped when nobody speaks"""
+    track = get_audio_track(video_path)
+    if track is None:
+        return None
+    window = track.segment_around(timestamp, duration)
+    if VAD_ENABLED and track not in segment_noise_floors:
+        segment_noise_floors[track] = noise_floor(track.samples, track.sample_rate)
+    skipped = VAD_ENABLED and not has_speech(window, track.sample_rate, segment_noise_floors.get(track))
+    with segment_vad_lock:
+        stats = segment_vad_stats.setdefault(video_path, {'windows': 0, 'skipped_windows': 0, 'skipped_seconds': 0.0})
+        stats['windows'] += 1
+        if skipped:
+            stats['skipped_windows'] += 1
+            stats['skipped_seconds'] = round(stats['skipped_seconds'] + len(window) / track.sample_rate, 2)
+    if skipped:
+        print(f"🤫 No speech around {timestamp:.1f}s, skipping transcription")
+        return None
+    return transcribe_audio_segment(wav_bytes(window, track.sample_rate))
+
+def speech_near(video_path, timestamp):
+    """What was said around timestamp, None without Whisper or speech"""
+    if not whisper_enabled() or not video_path:
+        return None
+    try:
+        if TRANSCRIPTION_MODE == 'track':
+            # Index lookup once the whole track is transcribed; until then the
+            # transcription runs in the background and commentary goes without
+            transcript = peek_transcript(video_path)
+            if transcript is None:
+                start_transcript(video_path, whisper_invoker(sagemaker_runtime, WHISPER_ENDPOINT))
+                return None
+            return transcript.near(timestamp)
+        return transcribe_window(video_path, timestamp)
+    except Exception as e:
+        print(f"⚠️ Speech lookup failed: {e}")
+        return None
+
+def transcription_stats(video_path):
+    """Per-video VAD savings for the complete event, None if nothing was transcribed"""
+    if TRANSCRIPTION_MODE == 'track':
+        transcript = peek_transcript(video_path)
+        return transcript.stats if transcript else None
+    with segment_vad_lock:
+        stats = segment_vad_stats.get(video_path)
+        return dict(stats) if stats else None
+
+def prefetch_transcript(video_path):
+    """Start whole-track transcription in the background so it's ready for the first commentary"""
+    if whisper_enabled() and TRANSCRIPTION_MODE == 'track':
+        try:
+            start_transcript(video_path, whisper_invoker(sagemaker_runtime, WHISPER_ENDPOINT))
+        except OSError as e:
+            print(f"⚠️ Could not start transcription: {e}")
+
+# Frame sampling + Rekognition parameters each endpoint uses, so prewarmed
+# labels land on exactly the label cache keys the endpoint will look up
+PREWARM_PASSES = {
+    'stream_counter': {'fps': 1/3, 'max_labels': 10, 'min_confidence': 70, 'motion': True},
+    'analyze_frames': {'fps': 1, 'max_labels': 15, 'min_confidence': 70, 'motion': False},
+}
+
+def rekognition_labels_data(rek_response):
+    """detect_labels response → [{'name', 'confidence', 'instances'}] as the analyzers use it"""
+    return [{
+        'name': label['Name'],
+        'confidence': label['Confidence'],
+        'instances': len(label.get('Instances', []))
+    } for label in rek_response.get('Labels', [])]
+
+def prewarm_video(video_file):
+    """Probe, decode and label a fresh upload the way the analysis endpoints will (prewarm.py)"""
+    started = time.perf_counter()
+    storage.acquire(video_file)
+    try:
+        get_metadata(video_file)
+        prefetch_transcript(video_file)
+        for endpoint in PREWARM_ENDPOINTS:
+            settings = PREWARM_PASSES.get(endpoint)
+            if not settings:
+                continue
+            profile = ENDPOINT_PROFILES[endpoint]
+            scheduler = make_scheduler() if settings['motion'] else None
+            deduper = FrameDeduper()
+            
+            def label(frame):
+                timestamp, frame_bytes = frame
+                return rekognition_labels_data(deduper.detect(frame_bytes, lambda: analyze_frame_with_rekognition(
+                    frame_bytes, rek_client, profile,
+                    max_labels=settings['max_labels'],
+                    min_confidence=settings['min_confidence']
+                )))
+            
+            frames = FrameStream(video_file, fps=settings['fps'], profile=profile, scheduler=scheduler)
+            labeled = []
+            try:
+                # Duplicates are decided in frame order, as the stream will decide them
+                for (timestamp, _), analysis in ordered_map(label, deduper.sequence(frames), workers=PREWARM_CONCURRENCY):
+                    labeled.append((timestamp, analysis.result()))
+            finally:
+                frames.close()
+            # New queries on this video are answered from the columns (/api/requery)
+            save_labels(content_hash(video_file), endpoint, labeled)
+            print(f"🔥 Prewarmed {len(labeled)} {endpoint} frames of {os.path.basename(video_file)}")
+    finally:
+        storage.release(video_file)
+    print(f"🔥 Prewarm of {os.path.basename(video_file)} done in {time.perf_counter() - started:.1f}s")
+
+prewarmer = get_prewarmer(prewarm_video)
+
+def compose_commentary(timestamp, query, labels_data, labels_text, recognized_people,
+                       has_person_in_frame, person_count, answer, frame_context, video_path=None):
+    """Commentary text for one frame (runs on the commentary pool)"""
+    print(f"📝 Generating commentary for {timestamp:.1f}s...")
+    commentary = None
+    
+    if bedrock_client:
+        audio_text = speech_near(video_path, timestamp)
+        if audio_text:
+            print(f"👂 Speech near {timestamp:.1f}s: {audio_text[:60]}")
+        extra_info = ""
+        if has_person_in_frame:
+            extra_info = f"Person count: {person_count}. "
+        # generate_commentary backs off on throttling by itself
+        commentary = generate_commentary(
+            extra_info + labels_text,
+            recognized_people,
+            answer,
+            timestamp,
+            query,
+            frame_context,
+            audio_text
+        )
+    
+    if not commentary:
+        commentary = fallback_commentary(labels_data, answer, has_person_in_frame, person_count)
+        print(f"📝 Using smart natural commentary")
+    return commentary
+
 def fallback_label_matching(labels_data, query):
     """Fallback label matching when AI is not available"""
     count = 0
@@ -660,10 +1004,7 @@ def fallback_label_matching(labels_data, query):
     
     if 'backflip' in query.lower() or 'flip' in query.lower() or 'acrobatic' in query.lower() or 'ishowspeed' in query.lower():
         # Selective action detection - only clear action keywords
-        ACTION_keywords = ['jump', 'jumping', 'flip', 'flipping', 'diving', 'acrobatic', 'gymnastics', 'floating', 'airborne', 'midair', 'flying']
-        NOT_ENOUGH_keywords = ['fighting', 'sport', 'dancing', 'activity', 'exercise', 'playing', 'fun']
-        person_keywords = ['person', 'human', 'people']
-        
+        # ('action' / 'weak' / 'person' classes in keyword_matcher.py)
         has_person = False
         has_clear_action = False
         has_weak_activity = False
@@ -673,16 +1014,16 @@ def fallback_label_matching(labels_data, query):
         print(f"🔍 Selective backflip detection - only clear actions count...")
         
         for label in labels_data:
-            label_lower = label['name'].lower()
+            label_classes = classify(label['name'])
             instances = label['instances'] if label['instances'] > 0 else 0
             
             # Check for person
-            if any(k in label_lower for k in person_keywords):
+            if 'person' in label_classes:
                 has_person = True
                 print(f"  ✓ Person detected: {label['name']} ({instances} instances)")
             
             # Check for CLEAR action signals ONLY
-            if any(k in label_lower for k in ACTION_keywords):
+            if 'action' in label_classes:
                 has_clear_action = True
                 detected_labels.append(label['name'])
                 if instances > 0:
@@ -692,7 +1033,7 @@ def fallback_label_matching(labels_data, query):
                 print(f"  ✓✓ CLEAR ACTION: {label['name']}")
             
             # Not enough alone - log but don't count
-            elif any(k in label_lower for k in NOT_ENOUGH_keywords):
+            elif 'weak' in label_classes:
                 has_weak_activity = True
                 print(f"  ⚠️ Weak signal (not enough): {label['name']}")
         
@@ -713,9 +1054,8 @@ def fallback_label_matching(labels_data, query):
             print(f"  ❌ No person detected")
     
     elif 'roller coaster' in query.lower() or 'coaster' in query.lower():
-        keywords = ['roller coaster', 'coaster', 'ride', 'amusement']
         for label in labels_data:
-            if any(k in label['name'].lower() for k in keywords):
+            if has_class(label['name'], 'coaster'):
                 count = label['instances'] if label['instances'] > 0 else 1
                 answer = f"Yes - {count} ({label['name']})"
                 break
@@ -729,205 +1069,356 @@ def fallback_label_matching(labels_data, query):
     
     return count, answer
 
+def find_video(video_path):
+    """Local file for a client's video path (/uploads/x.mp4, uploads/x.mp4, ...), plus the paths tried"""
+    possible_paths = [
+        video_path.lstrip('/'),
+        video_path,
+        f"uploads/{video_path.split('/')[-1]}"
+    ]
+    for path in possible_paths:
+        if os.path.exists(path):
+            print(f"✅ Video found at: {path}")
+            return path, possible_paths
+    return None, possible_paths
+
+def sse_stream(events):
+    """SSE text for (id, JSON payload) pairs; the id is what EventSource resumes from"""
+    try:
+        for event_id, payload in events:
+            if event_id is None:
+                yield f"data: {payload}\n\n"  # Keeps the client's Last-Event-ID
+            else:
+                yield f"id: {event_id}\ndata: {payload}\n\n"
+    finally:
+        events.close()
+
 @app.route('/api/stream-counter')
 def stream_counter():
     """Stream counting results in real-time (SSE)"""
     video_path = request.args.get('video_path', '')
     query = request.args.get('query', 'What do you see?')
+    profile = endpoint_profile('stream_counter')
+    request_budget = request.args.get('budget', type=int)
+    refine = STREAM_COUNTER_REFINE and request.args.get('refine', 'true').lower() != 'false'
+    mode = request.args.get('mode', 'Detection')
+    
+    # Rule program from /api/configure-detection, or compiled here from its target;
+    # a free-text query alone has no rules and every frame goes to Bedrock
+    target = request.args.get('target', '')
+    rules = None
+    if STREAM_COUNTER_RULES:
+        try:
+            rules = label_rules.normalize_program(json.loads(request.args.get('rules', 'null')))
+        except ValueError:
+            rules = None
+        rules = rules or label_rules.compile_rules({'target': target})
+        if not rules['required']:
+            rules = None  # Would only mark every frame ambiguous
+    rule_stats = {'yes': 0, 'no': 0, 'ambiguous': 0}
+    rule_stats_lock = threading.Lock()
     
-    print(f"📊 Stream counter request - Video: {video_path}, Query: {query}")
+    print(f"📊 Stream counter request - Video: {video_path}, Query: {query}, Profile: {profile}")
     if bedrock_client:
         print(f"🤖 AI Mode: Using Amazon Titan Text with context awareness")
     else:
         print(f"⚡ Basic Mode: Using keyword matching")
     
-    # Smart response cache to avoid redundant AI calls
-    ai_response_cache = {}
+    # Special handling for backflip detection
+    is_backflip_query = any(word in query.lower() for word in ['backflip', 'flip', 'acrobatic'])
+    # Refinement looks for short actions - counts of things already visible in
+    # every sample (people, coasters) gain nothing from extra frames
+    refine = refine and is_backflip_query
+    
+    if is_backflip_query:
+        instructions = """Is someone CLEARLY doing a backflip or jumping acrobatically in the frame?
+
+COUNT as YES (action keywords):
+- Jump, Jumping, Flip, Flipping, Diving, Airborne, Flying, Acrobatic, Gymnast
+
+DO NOT count alone (need action keywords too):
+- Fighting, Sport, Dancing, Activity, Exercise, Playing, Fun
+
+Rules:
+1. MUST have Person AND at least ONE action keyword (Jump/Flip/Airborne etc)
+2. Sport/Fighting/Activity alone WITHOUT Jump/Flip/Airborne → "No"
+3. Just Person/People standing → "No"
+
+Be selective. Only "Yes" if clear jumping/flipping action. Answer Yes/No only."""
+    else:
+        instructions = f"""Given these AWS Rekognition labels from a video frame, answer the question.
+
+Question: {query}
+
+Respond with:
+1. A number if counting (e.g., "3" for 3 people)
+2. "Yes" or "No" for detection questions
+3. Be specific and accurate"""
+    
+    # Frames waiting on Bedrock at the same time share one invoke_model call
+    interpreter = InterpretationBatcher(bedrock_client, instructions) if bedrock_client else None
+    
+    video_file, possible_paths = find_video(video_path)
     
     def generate():
         # Send initial connection message
-        yield f"data: {json.dumps({'type': 'connected', 'message': 'Stream started'})}\n\n"
+        yield {'type': 'connected', 'message': 'Stream started'}
         
+        frames = None
+        window_reader = None
+        pinned_video = None
+        # Commentary/voice never hold up a detection event, see commentary.py
+        narrator = CommentaryPipeline(compose_commentary, text_to_speech if elevenlabs_client else None)
         try:
-            # Load video - try multiple path formats
-            video_file = None
-            possible_paths = [
-                video_path.lstrip('/'),
-                video_path,
-                f"uploads/{video_path.split('/')[-1]}"
-            ]
-            
-            for path in possible_paths:
-                if os.path.exists(path):
-                    video_file = path
-                    print(f"✅ Video found at: {path}")
-                    break
-            
             if not video_file:
                 error_msg = f"Video not found. Tried: {possible_paths}"
                 print(f"❌ {error_msg}")
-                yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
+                yield {'type': 'error', 'message': error_msg}
                 return
             
+            # Not evictable while this stream reads it
+            storage.acquire(video_file)
+            pinned_video = video_file
+            # Someone is watching - a prewarm still waiting in the queue goes first
+            prewarmer.promote(video_file)
+            prefetch_transcript(video_file)
+            
             # Extract frames from video (sample smartly for speed)
             print(f"🎬 Extracting frames from: {video_path}")
             
-            # For speed: extract every 2 seconds for long videos, every 1s for short
-            video = cv2.VideoCapture(video_file)
-            video_fps = video.get(cv2.CAP_PROP_FPS)
-            duration = video.get(cv2.CAP_PROP_FRAME_COUNT) / video_fps if video_fps > 0 else 30
-            video.release()
+            # Header values come from the metadata index (probed once at upload)
+            metadata = get_metadata(video_file)
+            duration = metadata['duration'] if metadata and metadata['duration'] > 0 else 30
             
-            # Balanced sampling: enough frames for good coverage
-            sample_rate = 3  # Analyze every 3 seconds (good balance)
-            print(f"📊 Video duration: {duration:.1f}s, sampling every {sample_rate}s")
+            # Motion-adaptive sampling: dense during action, sparse when idle,
+            # capped at the call budget (SAMPLING_MODE=fixed restores every 3s)
+            sample_rate = 3
+            scheduler = make_scheduler(request_budget)
+            if scheduler:
+                print(f"📊 Video duration: {duration:.1f}s, motion sampling (budget {scheduler.budget} calls)")
+            else:
+                print(f"📊 Video duration: {duration:.1f}s, sampling every {sample_rate}s")
             
-            frames = extract_frames(video_file, fps=1/sample_rate)
-            total_frames = len(frames)
-            print(f"✅ Got {total_frames} frames to analyze")
+            # Frames are decoded in the background while earlier ones are analyzed
+            frames = FrameStream(video_file, fps=1/sample_rate, profile=profile, scheduler=scheduler)
+            total_frames = frames.expected_count
+            print(f"✅ Streaming {total_frames} frames to analyze")
             
             if total_frames == 0:
                 error_msg = "No frames extracted from video"
                 print(f"❌ {error_msg}")
-                yield f"data: {json.dumps({'type': 'error', 'message': error_msg})}\n\n"
+                yield {'type': 'error', 'message': error_msg}
                 return
             
-            # Process frames sequentially but with optimizations
-            # (Parallel processing would require refactoring SSE streaming)
+            # Rekognition + interpretation run on a bounded thread pool, keeping
+            # several frames in flight; results come back in timestamp order so
+            # progress/detection events are emitted exactly as before
             frame_context = []  # Store recent frames for context awareness
+            labeled_frames = []  # (timestamp, labels_data) for the label store
+            deduper = FrameDeduper()
             
-            for idx, (timestamp, frame_bytes) in enumerate(frames):
-                # Send progress
-                print(f"🎬 Processing frame {idx + 1}/{total_frames} at {timestamp:.1f}s")
-                yield f"data: {json.dumps({'type': 'progress', 'frame': idx + 1, 'total': total_frames, 'timestamp': timestamp})}\n\n"
+            def analyze_frame(frame):
+                """Rekognition labels + interpretation for one frame (runs on the worker pool)"""
+                timestamp, frame_bytes = frame
+                person_count = 0
                 
-                try:
-                    # Use Rekognition to get labels (optimized with fewer labels and higher confidence)
-                    rek_response = rek_client.detect_labels(
-                        Image={'Bytes': frame_bytes},
-                        MaxLabels=10,  # Reduced from 15 for speed
-                        MinConfidence=70  # Increased from 60 for accuracy
-                    )
+                # Use Rekognition to get labels (optimized with fewer labels and higher confidence)
+                # Near-identical consecutive frames reuse the previous labels
+                rek_response = deduper.detect(frame_bytes, lambda: analyze_frame_with_rekognition(
+                    frame_bytes, rek_client, profile,
+                    max_labels=10,  # Reduced from 15 for speed
+                    min_confidence=70  # Increased from 60 for accuracy
+                ))
+                
+                # Get labels with confidence and instances
+                labels_data = rekognition_labels_data(rek_response)
+                
+                # Detect people/faces in frame
+                recognized_people = []
+                has_person_in_frame = False
+                
+                # Check for Person label (fast)
+                for label in labels_data:
+                    if label['name'].lower() in ['person', 'people', 'human']:
+                        has_person_in_frame = True
+                        # Count how many people
+                        person_count = label['instances'] if label['instances'] > 0 else 1
+                        print(f"👤 {person_count} person(s) detected in frame")
+                        break
+                
+                # Combine labels and recognized people
+                labels_text = ', '.join([f"{l['name']} ({l['instances']} instances)" if l['instances'] > 0 else l['name'] for l in labels_data])
+                
+                if recognized_people:
+                    labels_text = f"Recognized: {', '.join(recognized_people)}. Labels: {labels_text}"
+                
+                # Use AI to interpret labels
+                count = 0
+                answer = "No"
+                
+                # Compiled rules decide most frames locally, Bedrock only sees the ambiguous ones
+                rule_result = label_rules.evaluate(rules, labels_data) if rules else None
+                if rule_result:
+                    with rule_stats_lock:
+                        rule_stats[rule_result['decision']] += 1
+                
+                if rule_result and rule_result['decision'] != 'ambiguous':
+                    count = rule_result['count']
+                    answer = label_rules.rule_answer(rule_result, mode)
+                    print(f"📐 Rule decision: {answer}")
+                elif bedrock_client:
+                    # Shared across requests and workers: same query + same labels = same answer
+                    interpretation_cache = get_interpretation_cache() if INTERPRETATION_CACHE_ENABLED else None
+                    cache_key = InterpretationCache.make_key(query, labels_data, ','.join(recognized_people))
+                    ai_answer = interpretation_cache.get(cache_key) if interpretation_cache else None
                     
-                    # Get labels with confidence and instances
-                    labels_data = []
-                    for label in rek_response.get('Labels', []):
-                        instances = label.get('Instances', [])
-                        labels_data.append({
-                            'name': label['Name'],
-                            'confidence': label['Confidence'],
-                            'instances': len(instances)
-                        })
+                    if ai_answer is not None:
+                        print(f"💨 Using cached response for: {labels_text[:30]}...")
+                    else:
+                        # Use AI to interpret the labels intelligently
+                        # (batched with other frames in flight, see interpretation.py)
+                        if is_backflip_query:
+                            frame_text = f"Labels: {labels_text}\nPerson in frame: {has_person_in_frame}"
+                        else:
+                            frame_text = f"Labels: {labels_text}"
+                        
+                        try:
+                            ai_answer = interpreter.ask(frame_text)
+                            
+                            # Cache the response for similar frames
+                            if interpretation_cache:
+                                interpretation_cache.put(cache_key, ai_answer)
+                                print(f"💾 Cached response for: {labels_text[:30]}...")
+                            
+                        except Exception as e:
+                            print(f"⚠️ AI interpretation failed: {e}, falling back to label matching")
+                            # Fallback to simple label matching
+                            count, answer = fallback_label_matching(labels_data, query)
+                            ai_answer = answer
                     
-                    # Detect people/faces in frame
-                    recognized_people = []
-                    has_person_in_frame = False
+                    # Extract count from AI response
+                    numbers = re.findall(r'\d+', ai_answer)
+                    if numbers:
+                        count = int(numbers[0])
+                    elif 'yes' in ai_answer.lower():
+                        count = 1
                     
-                    # Check for Person label (fast)
-                    for label in labels_data:
-                        if label['name'].lower() in ['person', 'people', 'human']:
-                            has_person_in_frame = True
-                            # Count how many people
-                            person_count = label['instances'] if label['instances'] > 0 else 1
-                            print(f"👤 {person_count} person(s) detected in frame")
-                            break
+                    answer = ai_answer
+                    print(f"🤖 AI interpretation: {ai_answer}")
+                else:
+                    # No Bedrock available, use simple matching
+                    count, answer = fallback_label_matching(labels_data, query)
+                
+                return {
+                    'labels_data': labels_data,
+                    'labels_text': labels_text,
+                    'recognized_people': recognized_people,
+                    'has_person_in_frame': has_person_in_frame,
+                    'person_count': person_count,
+                    'answer': answer,
+                    'count': count
+                }
+            
+            refine_stats = {'windows': 0, 'frames': 0}
+            
+            def is_refine_candidate(analysis):
+                try:
+                    labels_data = analysis.result()['labels_data']
+                except Exception:
+                    return False  # Re-raised when the main loop reads the result
+                return 'refine' in label_matcher.classify_frame([l['name'] for l in labels_data])
+            
+            def search():
+                """
+                Coarse pass, with each action candidate expanded into its refined window
+                Yields (timestamp, frame_bytes, future) in timestamp order
+                """
+                nonlocal window_reader
+                previous_timestamp = None
+                refined_until = -1.0
+                
+                # Duplicates are decided in frame order, not worker finish order,
+                # so the same frames keep their own call as in the prewarm pass
+                coarse = ordered_map(
+                    analyze_frame, deduper.sequence(frames),
+                    workers=STREAM_COUNTER_CONCURRENCY,
+                    window=STREAM_COUNTER_REORDER_WINDOW
+                )
+                for (timestamp, frame_bytes), analysis in coarse:
+                    gap = timestamp - previous_timestamp if previous_timestamp is not None else sample_rate
+                    previous_timestamp = timestamp
                     
-                    # Combine labels and recognized people
-                    labels_text = ', '.join([f"{l['name']} ({l['instances']} instances)" if l['instances'] > 0 else l['name'] for l in labels_data])
+                    refine_budget = REFINE_MAX_FRAMES - refine_stats['frames']
+                    if scheduler:
+                        refine_budget = min(refine_budget, scheduler.remaining())
+                    if not (refine and refine_budget > 0 and is_refine_candidate(analysis)):
+                        yield timestamp, frame_bytes, analysis
+                        continue
                     
-                    if recognized_people:
-                        labels_text = f"Recognized: {', '.join(recognized_people)}. Labels: {labels_text}"
+                    # Decode the window around the hit from one seekable capture
+                    # (the coarse pass owns the decoder thread's handle)
+                    if window_reader is None:
+                        window_reader = offload_cpu(WindowReader, video_file, profile)
+                    half_window = min(REFINE_MAX_HALF_WINDOW, gap / 2)
+                    refined = [
+                        frame for frame in offload_cpu(
+                            window_reader.read_window,
+                            timestamp - half_window, timestamp + half_window, REFINE_FPS,
+                            skip={window_reader.frame_index(timestamp)}
+                        )
+                        if frame[0] > refined_until
+                    ][:refine_budget]
+                    if scheduler:
+                        # The coarse pass may have spent some of it since remaining() was read
+                        refined = refined[:scheduler.charge(len(refined))]
+                    refined_until = timestamp + half_window
+                    refine_stats['windows'] += 1
+                    refine_stats['frames'] += len(refined)
+                    print(f"🔬 Refining {timestamp:.1f}s ±{half_window:.1f}s: {len(refined)} extra frames")
                     
-                    # Use AI to interpret labels
-                    count = 0
-                    answer = "No"
+                    window = [((timestamp, frame_bytes), analysis)]
+                    for refined_frame, refined_analysis in ordered_map(analyze_frame, deduper.sequence(refined), workers=STREAM_COUNTER_CONCURRENCY):
+                        try:
+                            refined_analysis.result()  # Finish before the window's pool shuts down
+                        except Exception:
+                            pass
+                        window.append((refined_frame, refined_analysis))
+                    window.sort(key=lambda entry: entry[0][0])
                     
-                    if bedrock_client:
-                        # Create cache key from top 3 labels for speed
-                        cache_key = ','.join(sorted([l['name'] for l in labels_data[:3]]))
-                        
-                        # Check cache first
-                        if cache_key in ai_response_cache:
-                            ai_answer = ai_response_cache[cache_key]
-                            print(f"💨 Using cached response for: {cache_key[:30]}...")
-                        else:
-                            # Use AI to interpret the labels intelligently
-                            # Special handling for backflip detection
-                            is_backflip_query = any(word in query.lower() for word in ['backflip', 'flip', 'acrobatic'])
-                            
-                            if is_backflip_query:
-                                prompt = f"""Is someone CLEARLY doing a backflip or jumping acrobatically in this frame?
-
-Labels: {labels_text}
-Person in frame: {has_person_in_frame}
-
-COUNT as YES (action keywords):
-- Jump, Jumping, Flip, Flipping, Diving, Airborne, Flying, Acrobatic, Gymnast
-
-DO NOT count alone (need action keywords too):
-- Fighting, Sport, Dancing, Activity, Exercise, Playing, Fun
-
-Rules:
-1. MUST have Person AND at least ONE action keyword (Jump/Flip/Airborne etc)
-2. Sport/Fighting/Activity alone WITHOUT Jump/Flip/Airborne → "No"
-3. Just Person/People standing → "No"
-
-Be selective. Only "Yes" if clear jumping/flipping action.
-
-Answer (Yes/No only):"""
-                            else:
-                                prompt = f"""Given these AWS Rekognition labels from a video frame:
-{labels_text}
-
-Question: {query}
-
-Respond with:
-1. A number if counting (e.g., "3" for 3 people)
-2. "Yes" or "No" for detection questions
-3. Be specific and accurate
-
-Answer:"""
-                            
-                            try:
-                                response = bedrock_client.invoke_model(
-                                    modelId='amazon.titan-text-express-v1',
-                                    body=json.dumps({
-                                        "inputText": prompt,
-                                        "textGenerationConfig": {
-                                            "maxTokenCount": 50,
-                                            "temperature": 0.1,
-                                            "topP": 0.9
-                                        }
-                                    })
-                                )
-                            
-                                response_body = json.loads(response['body'].read())
-                                ai_answer = response_body.get('results', [{}])[0].get('outputText', '').strip()
-                                
-                                # Cache the response for similar frames
-                                ai_response_cache[cache_key] = ai_answer
-                                print(f"💾 Cached response for: {cache_key[:30]}...")
-                                
-                            except Exception as e:
-                                print(f"⚠️ AI interpretation failed: {e}, falling back to label matching")
-                                # Fallback to simple label matching
-                                count, answer = fallback_label_matching(labels_data, query)
-                                ai_answer = answer
-                        
-                        # Extract count from AI response
-                        numbers = re.findall(r'\d+', ai_answer)
-                        if numbers:
-                            count = int(numbers[0])
-                        elif 'yes' in ai_answer.lower():
-                            count = 1
-                        
-                        answer = ai_answer
-                        print(f"🤖 AI interpretation: {ai_answer}")
-                    else:
-                        # No Bedrock available, use simple matching
-                        count, answer = fallback_label_matching(labels_data, query)
+                    run_open = False  # Last frame of this window was a positive
+                    for (frame_timestamp, window_bytes), window_analysis in window:
+                        # One action spans several frames of its window - count it once
+                        try:
+                            frame_analysis = window_analysis.result()
+                        except Exception:
+                            frame_analysis = None
+                        positive = frame_analysis is not None and frame_analysis['count'] > 0
+                        if positive and run_open:
+                            frame_analysis['count'] = 0
+                        run_open = positive
+                        yield frame_timestamp, window_bytes, window_analysis
+            
+            frame_errors = 0
+            for idx, (timestamp, frame_bytes, analysis) in enumerate(search()):
+                # Motion sampling and refinement only project the frame count, update it as we go
+                total_frames = max(idx + 1, frames.expected_count + refine_stats['frames'])
+                
+                # Send progress
+                print(f"🎬 Processing frame {idx + 1}/{total_frames} at {timestamp:.1f}s")
+                yield {'type': 'progress', 'frame': idx + 1, 'total': total_frames, 'timestamp': timestamp}
+                
+                try:
+                    frame_analysis = analysis.result()
+                    labels_data = frame_analysis['labels_data']
+                    labels_text = frame_analysis['labels_text']
+                    recognized_people = frame_analysis['recognized_people']
+                    has_person_in_frame = frame_analysis['has_person_in_frame']
+                    person_count = frame_analysis['person_count']
+                    answer = frame_analysis['answer']
+                    count = frame_analysis['count']
                     
                     print(f"🔍 Frame {idx}: {labels_text[:100]}... → {answer}, COUNT={count}")
+                    labeled_frames.append((timestamp, labels_data))
                     
                     # Send detection result with count and celebrities
                     result = {
@@ -955,134 +1446,187 @@ Answer:"""
                     if len(frame_context) > 3:
                         frame_context.pop(0)
                     
-                    # Generate commentary with voice every 3 frames
+                    # Commentary + voice every 3 frames, on the commentary pool -
+                    # this frame's detection goes out now, 'commentary'/'audio' follow
                     if idx % 3 == 0 and idx > 0:
-                        try:
-                            print(f"📝 Generating commentary for frame {idx}...")
-                            
-                            commentary = None
-                            
-                            # Try AI commentary with long delay to avoid rate limits
-                            if bedrock_client:
-                                try:
-                                    import time
-                                    time.sleep(2)  # 2 second delay between AI calls
-                                    
-                                    extra_info = ""
-                                    if has_person_in_frame:
-                                        extra_info = f"Person count: {person_count}. "
-                                    
-                                    commentary = generate_commentary(
-                                        extra_info + labels_text, 
-                                        recognized_people, 
-                                        answer, 
-                                        timestamp, 
-                                        query,
-                                        frame_context[:-1],
-                                        None
-                                    )
-                                except Exception as e:
-                                    print(f"⚠️ AI commentary failed: {e}, using simple fallback")
-                                    commentary = None
-                            
-                            # Fallback: Smart natural behavior narration
-                            if not commentary:
-                                import random
-                                
-                                # Get clean scene description (avoid raw labels like "Person", "Adult")
-                                scene_labels = [l['name'].lower() for l in labels_data if l['name'].lower() not in ['person', 'people', 'adult', 'male', 'man', 'human', 'face', 'head', 'clothing']]
-                                scene = scene_labels[0] if scene_labels else "venue"
-                                
-                                # Map generic labels to better descriptions
-                                scene_map = {
-                                    'fun': 'theme park',
-                                    'amusement park': 'theme park',
-                                    'theme park': 'theme park',
-                                    'sport': 'sports venue',
-                                    'fighting': 'action area',
-                                    'basketball': 'basketball court',
-                                    'people': 'venue'
-                                }
-                                scene = scene_map.get(scene, scene)
-                                
-                                if has_person_in_frame:
-                                    if 'yes' in answer.lower():
-                                        # Action detected - short exciting commentary
-                                        patterns = [
-                                            f"There's the launch - body rotating through the air",
-                                            f"Nice flip here - good form on the rotation",
-                                            f"Up he goes with the backflip attempt",
-                                            f"Launching into the flip - crowd's loving it",
-                                            f"Here comes another acrobatic move",
-                                            f"Perfect rotation on that flip"
-                                        ]
-                                        commentary = random.choice(patterns)
-                                    else:
-                                        # No action - short natural commentary
-                                        if person_count == 1:
-                                            patterns = [
-                                                f"The athlete at the {scene} preparing for the next move",
-                                                f"Moving solo through the {scene} setting up position",
-                                                f"One athlete working the {scene} here"
-                                            ]
-                                        elif person_count < 5:
-                                            patterns = [
-                                                f"Small group at the {scene} getting ready",
-                                                f"A few athletes gathering at the {scene}",
-                                                f"The {scene} with a handful of people setting up"
-                                            ]
-                                        else:
-                                            patterns = [
-                                                f"Crowd building at the {scene} waiting for action",
-                                                f"Packed {scene} with everyone watching closely",
-                                                f"Lots of energy in the {scene} crowd right now"
-                                            ]
-                                        commentary = random.choice(patterns)
-                                else:
-                                    commentary = f"The camera captures the {scene} scene right now, with the atmosphere building as we await the next moment of action"
-                                print(f"📝 Using smart natural commentary")
-                            
-                            result['commentary'] = commentary
-                            print(f"🎙️ Commentary: {commentary}")
-                            
-                            # Generate voice
-                            if elevenlabs_client:
-                                audio_url = text_to_speech(commentary, timestamp)
-                                if audio_url:
-                                    result['audio_url'] = audio_url
-                                    print(f"✅ Voice generated: {audio_url}")
-                                else:
-                                    print(f"❌ Voice generation failed")
-                            else:
-                                print(f"⚠️ ElevenLabs not initialized - no voice")
-                        except Exception as e:
-                            print(f"⚠️ Commentary failed: {e}")
-                            import traceback
-                            traceback.print_exc()
+                        narrator.submit(
+                            timestamp,
+                            query=query,
+                            labels_data=labels_data,
+                            labels_text=labels_text,
+                            recognized_people=recognized_people,
+                            has_person_in_frame=has_person_in_frame,
+                            person_count=person_count,
+                            answer=answer,
+                            frame_context=frame_context[:-1],
+                            video_path=video_file
+                        )
                     
-                    yield f"data: {json.dumps(result)}\n\n"
+                    yield result
                     
                 except Exception as e:
                     print(f"❌ Error analyzing frame {idx}: {e}")
                     import traceback
                     traceback.print_exc()
                     # Don't send error to client, just continue
-                    continue
+                    frame_errors += 1
+                
+                # Commentary/audio for earlier frames that finished in the meantime
+                for event in narrator.drain():
+                    yield event
+            
+            for event in narrator.finish():
+                yield event
+            
+            # Later queries on this video skip Rekognition entirely (/api/requery)
+            save_labels(content_hash(video_file), 'stream_counter', labeled_frames)
             
             # Send completion
-            yield f"data: {json.dumps({'type': 'complete'})}\n\n"
+            dedup_stats = deduper.stats()
+            print(f"♻️ Dedup saved {dedup_stats['rekognition_calls_saved']}/{dedup_stats['frames']} Rekognition calls")
+            sampling_stats = scheduler.stats() if scheduler else {'mode': 'fixed', 'interval': sample_rate}
+            if refine:
+                sampling_stats['refine'] = refine_stats
+            complete = {'type': 'complete', 'dedup': dedup_stats, 'sampling': sampling_stats}
+            if frame_errors:
+                # Shared runs with dropped frames aren't replayed to later viewers
+                complete['partial'] = True
+                complete['frame_errors'] = frame_errors
+            if rules:
+                complete['rules'] = rule_stats
+            if interpreter:
+                complete['interpretation'] = interpreter.stats()
+            complete['commentary'] = narrator.stats()
+            speech_stats = transcription_stats(video_file) if whisper_enabled() else None
+            if speech_stats:
+                complete['transcription'] = speech_stats
+            yield complete
             
         except Exception as e:
             print(f"❌ Stream error: {e}")
             traceback.print_exc()
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield {'type': 'error', 'message': str(e)}
+        finally:
+            # Stops the decoder thread if the client disconnected mid-stream
+            narrator.close()
+            if frames:
+                frames.close()
+            if window_reader:
+                window_reader.close()
+            if pinned_video:
+                storage.release(pinned_video)
+    
+    # Viewers of the same video + query + parameters share one analysis run
+    # (analysis_jobs.py); only the first one pays for Rekognition/Bedrock/TTS
+    # EventSource sends Last-Event-ID when it reconnects - resume after it
+    # from the same run's history or event log instead of starting over
+    resume = parse_event_id(request.headers.get('Last-Event-ID', request.args.get('last_event_id')))
+    job = None
+    if ANALYSIS_JOBS_ENABLED and video_file:
+        key = job_key(offload_cpu(content_hash, video_file), query, {
+            'endpoint': 'stream_counter',
+            'profile': profile,
+            'budget': request_budget,
+            'refine': refine,
+            'mode': mode,
+            'rules': rules
+        })
+        events, created = analysis_jobs.subscribe(key, generate, resume)
+        if events is None:
+            # Already sent everything - 204 tells EventSource to stop reconnecting
+            return Response(status=204)
+        job = key
+        if resume is not None:
+            print(f"🔁 Resuming analysis job {key[:8]} after event {resume[1]} of run {resume[0]}")
+        else:
+            print(f"📡 {'Started' if created else 'Joined'} analysis job {key[:8]}")
+    else:
+        events = numbered_events(generate(), resume)
     
-    response = Response(generate(), mimetype='text/event-stream')
+    response = Response(sse_stream(events), mimetype='text/event-stream')
+    if job:
+        response.headers['X-Analysis-Job'] = job
     response.headers['Cache-Control'] = 'no-cache'
     response.headers['X-Accel-Buffering'] = 'no'
     response.headers['Connection'] = 'keep-alive'
     return response
 
+@app.route('/api/requery')
+def requery_labels():
+    """
+    Answer a new query from a video's stored labels (label_store.py), no
+    Rekognition calls. Frames the rules can't decide come back 'ambiguous'
+    (the stream counter would ask Bedrock about those).
+    """
+    video_path = request.args.get('video_path', '')
+    query = request.args.get('query', 'What do you see?')
+    mode = request.args.get('mode', 'Detection')
+    analysis_pass = request.args.get('pass', 'stream_counter')
+    if analysis_pass not in PREWARM_PASSES:
+        return jsonify({'success': False, 'error': f"Unknown pass. Use one of: {', '.join(PREWARM_PASSES)}"}), 400
+    
+    video_file, _ = find_video(video_path)
+    if not video_file:
+        return jsonify({'success': False, 'error': 'Video not found'}), 404
+    
+    # Rules from /api/configure-detection, or compiled from its target - the
+    # query text alone can't be turned into rules (see label_rules.compile_rules)
+    target = request.args.get('target', '')
+    try:
+        rules = label_rules.normalize_program(json.loads(request.args.get('rules', 'null')))
+    except ValueError:
+        rules = None
+    if not rules and not target:
+        return jsonify({'success': False, 'error': 'Pass rules (from /api/configure-detection) or a target'}), 400
+    rules = rules or label_rules.compile_rules({'target': target})
+    
+    started = time.perf_counter()
+    store = get_label_store(offload_cpu(content_hash, video_file), analysis_pass)
+    if store is None:
+        # Label it now; the client asks again once it's done
+        prewarm = prewarmer.submit(video_file, PRIORITY_WAITING) if PREWARM_ENABLED and rek_client else 'disabled'
+        return jsonify({
+            'success': False,
+            'error': 'Video has not been labeled yet',
+            'prewarm': prewarm
+        }), 202 if prewarm in ('queued', 'running') else 404
+    
+    decisions, counts = store.evaluate(rules)
+    frames = []
+    for i, timestamp in enumerate(store.timestamps):
+        if decisions[i] == YES:
+            answer = label_rules.rule_answer(
+                {'decision': 'yes', 'count': int(counts[i]), 'matched': store.matched(rules, i)}, mode
+            )
+        else:
+            answer = 'No' if decisions[i] == NO else None
+        frames.append({
+            'timestamp': float(timestamp),
+            'decision': DECISIONS[decisions[i]],
+            'count': int(counts[i]),
+            'answer': answer
+        })
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"🗃️ Requery '{query}' over {len(store)} stored frames in {elapsed_ms:.1f}ms")
+    
+    return jsonify({
+        'success': True,
+        'video_path': video_path,
+        'query': query,
+        'pass': analysis_pass,
+        'rules': rules,
+        'frames': frames,
+        'summary': {
+            'frames': len(store),
+            'yes': int((decisions == YES).sum()),
+            'no': int((decisions == NO).sum()),
+            'ambiguous': int(len(store) - (decisions == YES).sum() - (decisions == NO).sum()),
+            'max_count': int(counts.max()) if len(store) else 0,
+            'total_count': int(counts.sum())
+        },
+        'elapsed_ms': round(elapsed_ms, 2)
+    })
+
 @app.route('/player')
 def player():
     """Serve the enhanced video player demo"""
@@ -1109,9 +1653,43 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'StreamBet Recognition API',
-        'version': '1.0.0-hackathon'
+        'version': '1.0.0-hackathon',
+        'serving': serving.stats()
+    })
+
+@app.route('/api/analysis-stats', methods=['GET'])
+def get_analysis_stats():
+    """Bytes-per-frame and Rekognition latency for each analysis profile"""
+    return jsonify({
+        'profiles': ANALYSIS_PROFILES,
+        'endpoints': ENDPOINT_PROFILES,
+        'stats': analysis_stats.summary()
     })
 
+@app.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters for the shared analysis caches"""
+    return jsonify({
+        'labels': get_label_cache().stats(),
+        'interpretations': get_interpretation_cache().stats(),
+        'tts': get_tts_cache(AUDIO_FOLDER).stats()
+    })
+
+@app.route('/api/job-stats', methods=['GET'])
+def get_job_stats():
+    """Shared analysis jobs: runs started vs. viewers served"""
+    return jsonify(analysis_jobs.stats())
+
+@app.route('/api/prewarm-stats', methods=['GET'])
+def get_prewarm_stats():
+    """Background analysis of uploads: queued, running and finished jobs"""
+    return jsonify(prewarmer.stats())
+
+@app.route('/api/storage-stats', methods=['GET'])
+def get_storage_stats():
+    """Disk usage of uploads/ and audio_commentary/ against the storage budget"""
+    return jsonify(storage.stats())
+
 @app.route('/upload', methods=['POST'])
 def upload_video():
     """Upload video file with size limit (10MB max, recommended < 1 min)"""
@@ -1155,16 +1733,25 @@ def upload_video():
         filename = f"{int(time.time())}_{secure_filename(file.filename)}"
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         file.save(filepath)
+        storage.touch(filepath)
         
         file_path = f'/uploads/{filename}'
         
+        # Probe once here so analysis requests never re-parse the header
+        metadata = get_metadata(filepath)
+        
+        # Start labeling frames now, so the first stream replays cached labels
+        prewarm = prewarmer.submit(filepath) if PREWARM_ENABLED and rek_client else 'disabled'
+        
         print(f"✅ Video uploaded successfully: {filename} ({file_size / (1024 * 1024):.2f}MB)")
         
         return jsonify({
             'success': True,
             'file_path': file_path,
             'filename': filename,
-            'size_mb': round(file_size / (1024 * 1024), 2)
+            'size_mb': round(file_size / (1024 * 1024), 2),
+            'metadata': metadata,
+            'prewarm': prewarm
         })
         
     except Exception as e:
@@ -1179,11 +1766,13 @@ def upload_video():
 @app.route('/uploads/<filename>')
 def serve_upload(filename):
     """Serve uploaded files (screenshots)"""
+    storage.touch(os.path.join(UPLOAD_FOLDER, secure_filename(filename)))
     return send_from_directory(UPLOAD_FOLDER, filename)
 
 @app.route('/audio/<filename>')
 def serve_audio(filename):
     """Serve audio commentary files"""
+    storage.touch(os.path.join(AUDIO_FOLDER, secure_filename(filename)))
     return send_from_directory(AUDIO_FOLDER, filename)
 
 @app.route('/api/bets', methods=['GET'])
@@ -1209,7 +1798,12 @@ def analyze_video_stream():
     if not os.path.exists(filepath):
         return jsonify({'error': 'Video file not found'}), 404
     
+    profile = endpoint_profile('analyze_video_stream')
+    scheduler = make_scheduler(request.args.get('budget', type=int))
+    
     def generate():
+        frames = None
+        storage.acquire(filepath)
         try:
             import sys
             
@@ -1217,16 +1811,19 @@ def analyze_video_stream():
             yield f"data: {json.dumps({'type': 'start', 'message': '🎬 Starting analysis...', 'commentary': 'Initializing AI detection system'})}\n\n"
             sys.stdout.flush()
             
-            # Extract frames
+            # Stream frames - analysis starts as soon as the first one is decoded
             print("🎬 SSE: Extracting frames")
-            frames = extract_frames(filepath, fps=1)
-            if not frames:
+            frames = FrameStream(filepath, fps=1, profile=profile, scheduler=scheduler)
+            frame_iter = iter(frames)
+            first_frame = next(frame_iter, None)
+            if first_frame is None:
                 print("❌ SSE: No frames extracted")
                 yield f"data: {json.dumps({'type': 'error', 'message': 'Could not extract frames'})}\n\n"
                 return
             
-            print(f"✅ SSE: Extracted {len(frames)} frames")
-            yield f"data: {json.dumps({'type': 'info', 'message': f'📹 Extracted {len(frames)} frames', 'commentary': f'Analyzing {len(frames)} seconds of footage'})}\n\n"
+            expected_frames = frames.expected_count
+            print(f"✅ SSE: Streaming {expected_frames} frames")
+            yield f"data: {json.dumps({'type': 'info', 'message': f'📹 Extracted {expected_frames} frames', 'commentary': f'Analyzing {expected_frames} key moments of footage'})}\n\n"
             sys.stdout.flush()
             time.sleep(0.1)  # Small delay to ensure client receives
             
@@ -1234,8 +1831,7 @@ def analyze_video_stream():
             backflips = []
             
             # Multi-signal detection (not just keywords!)
-            backflip_indicators = ['jump', 'jumping', 'flip', 'flipping', 'backflip', 'acrobatics', 'floating', 'airborne', 'fighting']  # MOVED fighting here!
-            weak_indicators = ['sport', 'activity', 'exercise']  # Weak signals
+            # Strong/weak signals: 'stream_backflip' / 'stream_weak' in keyword_matcher.py
             
             DEBOUNCE_SECONDS = 3.0
             SKIP_SECONDS = 3.0
@@ -1245,21 +1841,23 @@ def analyze_video_stream():
             frame_history = []  # Track last few frames
             person_detected_frames = []  # Where we see IShowSpeed
             
-            i = 0
+            frames_seen = 0
             frames_analyzed = 0
-            frames_skipped = 0
+            frames_skipped = 0  # Frames whose labels were reused from an identical-looking frame
+            deduper = FrameDeduper()
+            in_static_run = False
             
             yield f"data: {json.dumps({'type': 'info', 'message': '🧠 Context-aware mode: Tracking IShowSpeed movements', 'commentary': 'Multi-signal analysis with frame context'})}\n\n"
             sys.stdout.flush()
             
             # Warmup: Analyze first frame to establish AWS connection
-            if len(frames) > 0:
+            if first_frame:
                 yield f"data: {json.dumps({'type': 'info', 'message': '🔥 Warming up AWS connection...', 'commentary': 'First call takes longer, establishing connection'})}\n\n"
                 sys.stdout.flush()
                 
-                _, warmup_frame = frames[0]
+                _, warmup_frame = first_frame
                 try:
-                    _ = analyze_frame_with_rekognition(warmup_frame, rek_client)
+                    _ = analyze_frame_with_rekognition(warmup_frame, rek_client, profile)
                     yield f"data: {json.dumps({'type': 'info', 'message': '✅ AWS connection ready!', 'commentary': 'Subsequent frames will be faster'})}\n\n"
                     sys.stdout.flush()
                 except Exception as e:
@@ -1267,25 +1865,39 @@ def analyze_video_stream():
             
             time.sleep(0.1)
             
-            while i < len(frames):
-                timestamp, frame_bytes = frames[i]
+            for timestamp, frame_bytes in itertools.chain([first_frame], frame_iter):
+                frames_seen += 1
                 
                 yield f"data: {json.dumps({'type': 'progress', 'message': f'⏳ Analyzing {timestamp:.1f}s', 'commentary': 'Sending frame to AWS...', 'timestamp': timestamp, 'frames_analyzed': frames_analyzed})}\n\n"
                 sys.stdout.flush()
                 
                 try:
-                    print(f"📊 SSE: Analyzing frame {i+1}/{len(frames)} at {timestamp:.2f}s")
+                    print(f"📊 SSE: Analyzing frame {frames_seen}/{expected_frames} at {timestamp:.2f}s")
                     
                     # Send heartbeat during analysis
                     yield f"data: {json.dumps({'type': 'heartbeat', 'message': f'🔄 AWS analyzing {timestamp:.1f}s...', 'commentary': 'Waiting for AI response...'})}\n\n"
                     sys.stdout.flush()
                     
-                    frame_result = analyze_frame_with_rekognition(frame_bytes, rek_client)
+                    saved_before = deduper.calls_saved
+                    frame_result = deduper.detect(
+                        frame_bytes,
+                        lambda: analyze_frame_with_rekognition(frame_bytes, rek_client, profile)
+                    )
                     # AWS returns 'Labels' (capital L)
                     labels = frame_result.get('Labels', [])
                     num_labels = len(labels)
-                    print(f"✅ SSE: Got {num_labels} labels")
-                    frames_analyzed += 1
+                    
+                    if deduper.calls_saved > saved_before:
+                        frames_skipped += 1
+                        print(f"♻️ SSE: Same scene - reused {num_labels} labels")
+                        if not in_static_run:
+                            in_static_run = True
+                            yield f"data: {json.dumps({'type': 'skip', 'message': '⚡ Static scene', 'commentary': 'Nothing changed, reusing the last analysis'})}\n\n"
+                            sys.stdout.flush()
+                    else:
+                        in_static_run = False
+                        frames_analyzed += 1
+                        print(f"✅ SSE: Got {num_labels} labels")
                     
                     yield f"data: {json.dumps({'type': 'heartbeat', 'message': f'✅ Received {num_labels} labels', 'commentary': 'Processing results...'})}\n\n"
                     sys.stdout.flush()
@@ -1294,7 +1906,6 @@ def analyze_video_stream():
                     print(f"❌ SSE: Error analyzing frame: {e}")
                     yield f"data: {json.dumps({'type': 'error', 'message': f'Error at {timestamp:.1f}s', 'commentary': str(e)})}\n\n"
                     sys.stdout.flush()
-                    i += 1
                     continue
                 
                 # Multi-signal analysis
@@ -1308,19 +1919,20 @@ def analyze_video_stream():
                     label_name = label['Name'].lower()
                     confidence = label['Confidence']
                     labels_found.append((label_name, confidence))
+                    label_classes = classify(label_name)
                     
                     # Check for person
-                    if 'person' in label_name or 'human' in label_name:
+                    if 'person' in label_classes:
                         has_person = True
                         person_detected_frames.append(timestamp)
                     
                     # Check for strong backflip indicators
-                    if any(ind in label_name for ind in backflip_indicators):
+                    if 'stream_backflip' in label_classes:
                         has_strong_activity = True
                         confidence_score = max(confidence_score, confidence)  # Full weight!
                     
                     # Check for weak activity signals
-                    elif any(ind in label_name for ind in weak_indicators):
+                    elif 'stream_weak' in label_classes:
                         has_weak_activity = True
                         confidence_score = max(confidence_score, confidence * 0.7)  # Lower weight
                 
@@ -1349,7 +1961,7 @@ def analyze_video_stream():
                     # Strong indicator with high confidence
                     # Find which label triggered it
                     for label_name, conf in labels_found:
-                        if any(ind in label_name for ind in backflip_indicators):
+                        if has_class(label_name, 'stream_backflip'):
                             detected_label = label_name.title()
                             break
                     
@@ -1389,35 +2001,9 @@ def analyze_video_stream():
                     else:
                         yield f"data: {json.dumps({'type': 'duplicate', 'message': f'⏭️ Same backflip', 'commentary': 'Continuation of same movement', 'timestamp': timestamp})}\n\n"
                         sys.stdout.flush()
-                
-                # Decide next step - CAREFUL SKIPPING (don't miss action!)
-                if has_strong_activity:
-                    # Strong activity - keep analyzing frame by frame
-                    print(f"🎯 Strong activity - continuing frame by frame")
-                    i += 1
-                elif has_weak_activity and confidence_score > 50:
-                    # Weak activity with decent confidence - check next frame
-                    print(f"⚠️  Weak activity - checking next frame")
-                    i += 1
-                elif has_person:
-                    # Person present - check EVERY frame (action could start anytime!)
-                    # DON'T SKIP when person is detected
-                    print(f"👤 Person present - checking next frame")
-                    i += 1
-                else:
-                    # No person - skip 3 seconds
-                    skip_frames = 3
-                    if i + skip_frames < len(frames):
-                        frames_skipped += skip_frames
-                        i += skip_frames + 1
-                        print(f"💤 No person - skipping {skip_frames}s")
-                        yield f"data: {json.dumps({'type': 'skip', 'message': f'⚡ Skipped {skip_frames}s', 'commentary': 'Empty scene, jumping ahead'})}\n\n"
-                        sys.stdout.flush()
-                    else:
-                        i += 1
             
             # Final results
-            speed_gain = int((frames_skipped / len(frames)) * 100) if len(frames) > 0 else 0
+            speed_gain = int((frames_skipped / frames_seen) * 100) if frames_seen > 0 else 0
             
             final_commentary = ''
             if len(backflips) == 0:
@@ -1427,10 +2013,14 @@ def analyze_video_stream():
             else:
                 final_commentary = f'Unbelievable! {len(backflips)} backflips detected! IShowSpeed is on fire today! 🔥'
             
-            yield f"data: {json.dumps({'type': 'complete', 'message': '✅ Analysis complete!', 'commentary': final_commentary, 'data': {'backflips': backflips, 'count': len(backflips), 'frames_analyzed': frames_analyzed, 'frames_skipped': frames_skipped, 'total_frames': len(frames), 'speed_gain_percent': speed_gain}})}\n\n"
+            yield f"data: {json.dumps({'type': 'complete', 'message': '✅ Analysis complete!', 'commentary': final_commentary, 'data': {'backflips': backflips, 'count': len(backflips), 'frames_analyzed': frames_analyzed, 'frames_skipped': frames_skipped, 'total_frames': frames_seen, 'speed_gain_percent': speed_gain, 'sampling': scheduler.stats() if scheduler else {'mode': 'fixed', 'interval': 1}}})}\n\n"
             
         except Exception as e:
             yield f"data: {json.dumps({'type': 'error', 'message': f'❌ Error: {str(e)}', 'commentary': 'Something went wrong with the analysis'})}\n\n"
+        finally:
+            if frames:
+                frames.close()
+            storage.release(filepath)
     
     return Response(stream_with_context(generate()), content_type='text/event-stream')
 
@@ -1453,111 +2043,101 @@ def analyze_video_simple():
     if not os.path.exists(filepath):
         return jsonify({'error': 'Video file not found'}), 404
     
+    # Rekognition call budget for motion sampling, a positive whole number
+    budget = data.get('budget')
+    if budget is not None:
+        if isinstance(budget, str) and budget.strip().isdigit():
+            budget = int(budget)
+        if isinstance(budget, bool) or not isinstance(budget, int) or budget < 1:
+            return jsonify({'error': 'budget must be a positive integer'}), 400
+    
+    storage.acquire(filepath)
     try:
         print(f"🔍 Analyzing video: {filepath}")
+        profile = endpoint_profile('analyze_video')
         
-        # Extract frames (1 per second)
-        frames = extract_frames(filepath, fps=1)
+        # Motion-adaptive sampling picks the frames worth a Rekognition call
+        scheduler = make_scheduler(budget)
+        frames = offload_cpu(extract_frames, filepath, fps=1, profile=profile, scheduler=scheduler)
         
         if not frames:
             return jsonify({'error': 'Could not extract frames'}), 500
         
-        # Analyze frames for backflips with smart windowing
+        # Analyze frames for backflips
+        # (signals: 'video_backflip' class in keyword_matcher.py)
         backflips = []
-        backflip_keywords = ['jump', 'jumping', 'flip', 'flipping', 'backflip', 'acrobatics', 
-                            'floating', 'airborne', 'fighting', 'sport', 'activity']
         
-        # Define action window - NEVER skip frames here
-        ACTION_WINDOW_START = 15.0  # Start looking at 15s
-        ACTION_WINDOW_END = 25.0    # Stop at 25s
+        if scheduler:
+            # Every scheduled frame is already a high-motion or budgeted sample
+            selected = frames
+            frames_skipped = scheduler.scanned - len(frames)
+        else:
+            # SAMPLING_MODE=fixed: legacy action window around the 20s mark
+            ACTION_WINDOW_START = 15.0
+            ACTION_WINDOW_END = 25.0
+            selected = [f for f in frames if ACTION_WINDOW_START - 2.0 <= f[0] <= ACTION_WINDOW_END]
+            frames_skipped = len(frames) - len(selected)
         
         # Debouncing - only count as new backflip if 3+ seconds from last
         DEBOUNCE_SECONDS = 3.0
         last_detection_time = -999  # Start way in the past
         
-        i = 0
         frames_analyzed = 0
-        frames_skipped = 0
+        deduper = FrameDeduper()
         
-        while i < len(frames):
-            timestamp, frame_bytes = frames[i]
+        for i, (timestamp, frame_bytes) in enumerate(selected):
+            frames_analyzed += 1
+            print(f"⏳ Frame {i+1}/{len(selected)} at {timestamp:.2f}s...", end='\r')
             
-            # Check if we're approaching or in the action window
-            in_action_window = ACTION_WINDOW_START <= timestamp <= ACTION_WINDOW_END
-            approaching_window = timestamp < ACTION_WINDOW_START and timestamp >= ACTION_WINDOW_START - 2.0
-            past_window = timestamp > ACTION_WINDOW_END
+            frame_result = deduper.detect(
+                frame_bytes,
+                lambda: analyze_frame_with_rekognition(frame_bytes, rek_client, profile)
+            )
             
-            if in_action_window or approaching_window:
-                # ALWAYS analyze frames in or near action window
-                frames_analyzed += 1
-                if in_action_window:
-                    print(f"⏳ [ACTION] Frame {i+1}/{len(frames)} at {timestamp:.2f}s...", end='\r')
-                else:
-                    print(f"⏳ Frame {i+1}/{len(frames)} at {timestamp:.2f}s...", end='\r')
-                
-                frame_result = analyze_frame_with_rekognition(frame_bytes, rek_client)
-                
-                # Check for backflip indicators
-                for label in frame_result['labels']:
-                    label_name = label['Name'].lower()
-                    confidence = label['Confidence']
-                    
-                    if any(keyword in label_name for keyword in backflip_keywords):
-                        if confidence > 70:
-                            # Debounce: only count if 3+ seconds from last detection
-                            if timestamp - last_detection_time >= DEBOUNCE_SECONDS:
-                                backflips.append({
-                                    'timestamp': timestamp,
-                                    'label': label['Name'],
-                                    'confidence': confidence / 100,
-                                    'time': f"{int(timestamp // 60)}:{int(timestamp % 60):02d}"
-                                })
-                                last_detection_time = timestamp
-                                print(f"\n🎪 BACKFLIP at {timestamp:.2f}s: {label['Name']} ({confidence:.1f}%)")
-                            else:
-                                print(f"\r⏭️  Skipping duplicate at {timestamp:.2f}s (within {DEBOUNCE_SECONDS}s)...", end='\r')
-                            break
-                
-                i += 1  # Move to next frame
+            # Check for backflip indicators
+            for label in frame_result.get('Labels', []):
+                label_name = label['Name'].lower()
+                confidence = label['Confidence']
                 
-            else:
-                # Outside action window - calculate smart skip
-                if past_window:
-                    # After action window - skip remaining frames
-                    skip_count = len(frames) - i - 1
-                else:
-                    # Before action window - skip but don't overshoot
-                    frames_until_window = 0
-                    for j in range(i, len(frames)):
-                        if frames[j][0] >= ACTION_WINDOW_START - 2.0:
-                            break
-                        frames_until_window += 1
-                    skip_count = min(10, frames_until_window) if frames_until_window > 0 else 0
-                
-                if skip_count > 0:
-                    frames_skipped += skip_count
-                    i += skip_count + 1
-                    print(f"\r⚡ Skipping {skip_count} frames...", end='\r')
-                else:
-                    i += 1
+                if has_class(label_name, 'video_backflip'):
+                    if confidence > 70:
+                        # Debounce: only count if 3+ seconds from last detection
+                        if timestamp - last_detection_time >= DEBOUNCE_SECONDS:
+                            backflips.append({
+                                'timestamp': timestamp,
+                                'label': label['Name'],
+                                'confidence': confidence / 100,
+                                'time': f"{int(timestamp // 60)}:{int(timestamp % 60):02d}"
+                            })
+                            last_detection_time = timestamp
+                            print(f"\n🎪 BACKFLIP at {timestamp:.2f}s: {label['Name']} ({confidence:.1f}%)")
+                        else:
+                            print(f"\r⏭️  Skipping duplicate at {timestamp:.2f}s (within {DEBOUNCE_SECONDS}s)...", end='\r')
+                        break
+        
+        total_frames = frames_analyzed + frames_skipped
         
         print(f"\n✅ Analysis complete! Found {len(backflips)} backflips")
         print(f"⚡ Performance: Analyzed {frames_analyzed} frames, skipped {frames_skipped} frames")
-        print(f"🚀 Speed gain: {int((frames_skipped / len(frames)) * 100)}% faster!")
+        print(f"🚀 Speed gain: {int((frames_skipped / total_frames) * 100)}% faster!")
         
         return jsonify({
             'backflips': backflips,
             'count': len(backflips),
             'frames_analyzed': frames_analyzed,
             'frames_skipped': frames_skipped,
-            'total_frames': len(frames),
-            'speed_gain_percent': int((frames_skipped / len(frames)) * 100) if len(frames) > 0 else 0,
+            'total_frames': total_frames,
+            'speed_gain_percent': int((frames_skipped / total_frames) * 100) if total_frames > 0 else 0,
+            'rekognition_calls_saved': deduper.calls_saved,
+            'sampling': scheduler.stats() if scheduler else {'mode': 'fixed', 'interval': 1},
             'video_duration': frames[-1][0] if frames else 0
         })
         
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         return jsonify({'error': str(e)}), 500
+    finally:
+        storage.release(filepath)
 
 @app.route('/api/analyze-frames', methods=['POST'])
 def analyze_video_frames():
@@ -1576,11 +2156,13 @@ def analyze_video_frames():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Invalid file type. Use MP4, MOV, or AVI'}), 400
     
+    filepath = None
     try:
         # Save file locally
         filename = f"{int(time.time())}_{secure_filename(file.filename)}"
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         file.save(filepath)
+        storage.acquire(filepath)
         
         print(f"📹 Processing video: {filename}")
         
@@ -1589,7 +2171,8 @@ def analyze_video_frames():
         print(f"🎬 Video playable at: http://localhost:5000{video_url}")
         
         # Extract frames (1 per second)
-        frames = extract_frames(filepath, fps=1)
+        profile = endpoint_profile('analyze_frames')
+        frames = offload_cpu(extract_frames, filepath, fps=1, profile=profile)
         
         if not frames:
             return jsonify({'error': 'Could not extract frames from video'}), 500
@@ -1602,16 +2185,18 @@ def analyze_video_frames():
         screenshots = []  # Store key frames with streamer
         backflip_indicators = []  # Track backflip-related detections
         
-        # Backflip keywords to look for (includes action/movement indicators)
-        backflip_keywords = ['jump', 'jumping', 'leap', 'leaping', 'airborne', 'flying', 'float', 
-                            'floating', 'flip', 'flipping', 'acrobatics', 'gymnastics', 'backflip',
-                            'fighting', 'action', 'motion', 'movement', 'sport', 'activity']
+        # Backflip keywords to look for (includes action/movement indicators):
+        # 'frames_backflip' class in keyword_matcher.py
         
+        deduper = FrameDeduper()
         for i, (timestamp, frame_bytes) in enumerate(frames):
             progress = int((i + 1) / len(frames) * 100)
             print(f"⏳ Frame {i+1}/{len(frames)} (t={timestamp:.2f}s) - {progress}%...", end='\r')
             
-            frame_result = analyze_frame_with_rekognition(frame_bytes, rek_client)
+            frame_result = deduper.detect(
+                frame_bytes,
+                lambda: analyze_frame_with_rekognition(frame_bytes, rek_client, profile)
+            )
             
             # Aggregate labels
             for label in frame_result['labels']:
@@ -1630,7 +2215,7 @@ def analyze_video_frames():
                 all_labels[label_name]['timestamps'].append(timestamp)
                 
                 # Check for backflip indicators (especially around 20s mark)
-                if any(keyword in label_name.lower() for keyword in backflip_keywords):
+                if has_class(label_name, 'frames_backflip'):
                     backflip_indicators.append({
                         'timestamp': timestamp,
                         'label': label_name,
@@ -1756,7 +2341,8 @@ def analyze_video_frames():
             },
             'video_metadata': {
                 'duration_seconds': frames[-1][0] if frames else 0,
-                'frames_analyzed': len(frames)
+                'frames_analyzed': len(frames),
+                'rekognition_calls_saved': deduper.calls_saved
             }
         })
         
@@ -1765,6 +2351,9 @@ def analyze_video_frames():
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
+    finally:
+        if filepath:
+            storage.release(filepath)
 
 
 @app.route('/api/analyze', methods=['POST'])
@@ -1974,8 +2563,7 @@ def analyze_with_rekognition(s3_key):
             labels.append(label_data)
             
             # Flag activity-related labels
-            activity_keywords = ['jumping', 'running', 'exercise', 'sport', 'game', 'playing']
-            if any(keyword in label_name.lower() for keyword in activity_keywords):
+            if has_class(label_name, 'movement_activity'):
                 activity_labels.append(label_data)
         
         # Analyze person movement for backflip detection
@@ -2012,57 +2600,15 @@ def analyze_with_rekognition(s3_key):
     except Exception as e:
         return {'error': f"Unexpected error: {str(e)}"}
 
-def extract_frames(video_path, fps=1):
-    """
-    Extract frames from video at specified FPS
-    Returns list of (timestamp, frame_data) tuples
-    """
-    frames = []
-    cap = cv2.VideoCapture(video_path)
-    
-    if not cap.isOpened():
-        print("⚠️  Could not open video file")
-        return frames
-    
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_frames / video_fps if video_fps > 0 else 0
-    
-    print(f"📹 Video: {video_fps} fps, {total_frames} frames, {duration:.2f}s")
-    print(f"🎬 Extracting 1 frame per {1/fps} second(s)...")
-    
-    frame_interval = int(video_fps / fps) if video_fps > 0 else 1
-    frame_count = 0
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        if frame_count % frame_interval == 0:
-            timestamp = frame_count / video_fps if video_fps > 0 else frame_count
-            
-            # Convert frame to JPEG bytes
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame_bytes = buffer.tobytes()
-            
-            frames.append((timestamp, frame_bytes))
-            
-        frame_count += 1
-    
-    cap.release()
-    print(f"✅ Extracted {len(frames)} frames")
-    return frames
-
-
-def analyze_frame_with_rekognition(frame_bytes, rek_client):
-    """Analyze a single frame with AWS Rekognition"""
-    response = rek_client.detect_labels(
-        Image={'Bytes': frame_bytes},
-        MaxLabels=15,
-        MinConfidence=70
+def analyze_frame_with_rekognition(frame_bytes, rek_client, profile=None, max_labels=15, min_confidence=70):
+    """Analyze a single frame with AWS Rekognition (served from the label cache when possible)"""
+    return detect_labels_cached(
+        rek_client,
+        frame_bytes,
+        max_labels=max_labels,
+        min_confidence=min_confidence,
+        on_remote_call=lambda seconds: analysis_stats.record(profile, len(frame_bytes), seconds)
     )
-    return response
 
 
 def analyze_face_matches(face_result):
@@ -2186,16 +2732,7 @@ def count_backflips(labels):
     Count potential backflips based on detected labels and timestamps
     Looks for rotation, acrobatics, jumping patterns
     """
-    backflip_indicators = [
-        'acrobatics', 'gymnastics', 'flip', 'somersault', 'rotation',
-        'jumping', 'tumbling', 'aerial', 'trick', 'sport', 'basketball',
-        'playing', 'exercise', 'fitness', 'athlete', 'training', 'jump',
-        'leap', 'airborne', 'flying'
-    ]
-    
-    # Priority indicators (more likely to be backflips)
-    high_priority = ['acrobatics', 'gymnastics', 'flip', 'somersault', 'tumbling']
-    
+    # Indicators: 'video_trick' class in keyword_matcher.py
     backflip_count = 0
     backflip_timestamps = []
     confidence_scores = []
@@ -2204,20 +2741,18 @@ def count_backflips(labels):
         label_name = label['label'].lower()
         
         # Check if label indicates backflip-like activity
-        for indicator in backflip_indicators:
-            if indicator in label_name:
-                # Count timestamps as potential backflips
-                timestamps = label.get('timestamps', [])
-                if timestamps:
-                    # Group timestamps that are close together (within 2 seconds)
-                    grouped_timestamps = []
-                    for ts in timestamps:
-                        if not grouped_timestamps or ts - grouped_timestamps[-1] > 2.0:
-                            grouped_timestamps.append(ts)
-                            backflip_count += 1
-                            backflip_timestamps.append(ts)
-                            confidence_scores.append(label['confidence'])
-                break
+        if has_class(label_name, 'video_trick'):
+            # Count timestamps as potential backflips
+            timestamps = label.get('timestamps', [])
+            if timestamps:
+                # Group timestamps that are close together (within 2 seconds)
+                grouped_timestamps = []
+                for ts in timestamps:
+                    if not grouped_timestamps or ts - grouped_timestamps[-1] > 2.0:
+                        grouped_timestamps.append(ts)
+                        backflip_count += 1
+                        backflip_timestamps.append(ts)
+                        confidence_scores.append(label['confidence'])
     
     return {
         'count': backflip_count,
@@ -2351,12 +2886,21 @@ def resolve_bet():
         'payout_triggered': False
     })
 
+# Fill the TTS cache with the fallback phrase bank in the background
+# (offline instead: python app.py --prerender-tts)
+if os.getenv('TTS_PRERENDER_ON_STARTUP', 'false').lower() == 'true' and elevenlabs_client:
+    threading.Thread(target=prerender_commentary_audio, name='tts-prerender', daemon=True).start()
+
 if __name__ == '__main__':
     # Create required folders
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(AUDIO_FOLDER, exist_ok=True)
     os.makedirs('templates', exist_ok=True)
     
+    if '--prerender-tts' in sys.argv:
+        result = prerender_commentary_audio()
+        sys.exit(1 if result['failed'] else 0)
+    
     print("\n" + "="*60)
     print("🎮 StreamBet Recognition API")
     print("="*60)
@@ -0,0 +1,152 @@
+"""
+In-memory PCM index of a video's audio track for StreamBet
+The audio is demuxed once per video - one ffmpeg pipe to 16 kHz mono
+16-bit PCM - into a numpy array. Transcription segments are then slices of
+that array (no copy), and WAV payloads are built in memory instead of
+through temp files. Decoded tracks are also saved as .npy under
+AUDIO_INDEX_DIR and memory-mapped by later requests and other workers;
+the storage janitor evicts them like uploads and they're demuxed again.
+"""
+
+import io
+import os
+import wave
+import hashlib
+import threading
+import subprocess
+from collections import OrderedDict
+
+import numpy as np
+import imageio_ffmpeg
+
+from video_meta import file_signature
+
+AUDIO_SAMPLE_RATE = 16000  # What Whisper expects
+
+# Empty to keep decoded tracks in memory only
+AUDIO_INDEX_DIR = os.getenv('AUDIO_INDEX_DIR', os.path.join('cache', 'audio_pcm'))
+
+# Tracks kept open per process (a minute of audio is ~2 MB)
+AUDIO_INDEX_MAX_TRACKS = int(os.getenv('AUDIO_INDEX_MAX_TRACKS', '8'))
+
+AUDIO_DEMUX_TIMEOUT = float(os.getenv('AUDIO_DEMUX_TIMEOUT', '300'))
+
+
+def demux_pcm(video_path, sample_rate=AUDIO_SAMPLE_RATE):
+    """
+    Whole audio track as int16 mono samples, one ffmpeg process
+    Returns None if the video has no audio stream
+    """
+    command = [
+        imageio_ffmpeg.get_ffmpeg_exe(), '-v', 'error', '-nostdin',
+        '-i', video_path,
+        '-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', '-acodec', 'pcm_s16le', 'pipe:1'
+    ]
+    result = subprocess.run(command, capture_output=True, timeout=AUDIO_DEMUX_TIMEOUT)
+    if result.returncode != 0:
+        error = result.stderr.decode(errors='replace').strip()
+        if 'does not contain any stream' in error or 'matches no streams' in error:
+            return None
+        raise RuntimeError(f"ffmpeg audio demux failed: {error[-300:]}")
+    if not result.stdout:
+        return None
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def wav_bytes(samples, sample_rate=AUDIO_SAMPLE_RATE):
+    """RIFF/WAV file bytes for int16 mono samples, built in memory"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+    return buffer.getvalue()
+
+
+class AudioTrack:
+    """A decoded mono track; segments are views into one buffer"""
+
+    def __init__(self, samples, sample_rate=AUDIO_SAMPLE_RATE):
+        self.samples = samples
+        self.sample_rate = sample_rate
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    def index(self, seconds):
+        return min(len(self.samples), max(0, int(round(seconds * self.sample_rate))))
+
+    def segment(self, start, end):
+        """Samples between start and end seconds (a view, not a copy)"""
+        return self.samples[self.index(start):self.index(end)]
+
+    def segment_around(self, timestamp, duration=5):
+        """Window of `duration` seconds centred on timestamp, clipped to the track"""
+        return self.segment(timestamp - duration / 2, timestamp + duration / 2)
+
+    def wav(self, start, end):
+        return wav_bytes(self.segment(start, end), self.sample_rate)
+
+
+def _pcm_path(video_path, signature, sample_rate):
+    raw = f"{os.path.abspath(video_path)}|{signature[0]}|{signature[1]}|{sample_rate}"
+    return os.path.join(AUDIO_INDEX_DIR, f"{hashlib.sha1(raw.encode()).hexdigest()}.npy")
+
+
+_tracks = OrderedDict()  # (abspath, signature, sample_rate) -> AudioTrack, or None for silent videos
+_tracks_lock = threading.Lock()
+_demux_locks = {}
+
+
+def get_audio_track(video_path, sample_rate=AUDIO_SAMPLE_RATE):
+    """
+    Decoded audio for a video, demuxing it only the first time it's seen
+    (or after it changed on disk). Returns None if there's no audio track.
+    """
+    signature = file_signature(video_path)
+    key = (os.path.abspath(video_path), signature, sample_rate)
+
+    with _tracks_lock:
+        if key in _tracks:
+            _tracks.move_to_end(key)
+            return _tracks[key]
+        demux_lock = _demux_locks.setdefault(key, threading.Lock())
+
+    # One demux per video even when several requests ask at once
+    with demux_lock:
+        with _tracks_lock:
+            if key in _tracks:
+                return _tracks[key]
+
+        track = None
+        stored = _pcm_path(video_path, signature, sample_rate) if AUDIO_INDEX_DIR else None
+        if stored and os.path.exists(stored):
+            try:
+                track = AudioTrack(np.load(stored, mmap_mode='r'), sample_rate)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not map stored audio: {e}")
+
+        if track is None:
+            samples = demux_pcm(video_path, sample_rate)
+            if samples is not None:
+                track = AudioTrack(samples, sample_rate)
+                print(f"🎧 Demuxed {track.duration:.1f}s of audio from {os.path.basename(video_path)}")
+                if stored:
+                    try:
+                        os.makedirs(AUDIO_INDEX_DIR, exist_ok=True)
+                        # Ends in .tmp so the storage janitor leaves it alone mid-write
+                        temp_path = f"{stored}.{os.getpid()}.{threading.get_ident()}.tmp"
+                        with open(temp_path, 'wb') as f:
+                            np.save(f, samples)
+                        os.replace(temp_path, stored)
+                    except OSError as e:
+                        print(f"⚠️ Could not save decoded audio: {e}")
+
+        with _tracks_lock:
+            _tracks[key] = track
+            while len(_tracks) > AUDIO_INDEX_MAX_TRACKS:
+                _tracks.popitem(last=False)
+            _demux_locks.pop(key, None)
+        return track
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the StreamBet analysis pipeline
+Run without a video to benchmark against a generated test clip
+
+    python benchmark.py frames [video.mp4] [--fps 0.333]
+    python benchmark.py profiles [video.mp4] [--rekognition]
+    python benchmark.py parallel [video.mp4] [--workers 1 2 4 8]
+    python benchmark.py keywords [--frames 10000]
+    python benchmark.py audio [video.mp4] [--segments 10]
+    python benchmark.py requery [--frames 3600]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+import video_frames
+import parallel_decode
+import keyword_matcher
+import audio_index
+import label_rules
+import label_store
+from video_meta import get_metadata
+
+
+def make_test_video(path, seconds=30, fps=60, width=1280, height=720):
+    """Write a synthetic clip with a moving shape so the encoder has real work"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(int(seconds * fps)):
+        frame = np.full((height, width, 3), 40, dtype=np.uint8)
+        x = int((i * 7) % width)
+        cv2.circle(frame, (x, height // 2), 60, (0, 200, 255), -1)
+        cv2.putText(frame, f"{i / fps:6.2f}s", (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def resolve_video(args):
+    """Use the given video or generate a temporary test clip"""
+    if args.video:
+        return args.video
+    path = os.path.join(tempfile.gettempdir(), 'streambet_benchmark.mp4')
+    if not os.path.exists(path):
+        print(f"🎬 Generating test clip: {path}")
+        make_test_video(path)
+    return path
+
+
+def bench_frames(args):
+    """Decode time per sampled frame: dense read loop vs sparse grab/seek"""
+    video_path = resolve_video(args)
+    print(f"\n📊 Frame extraction benchmark - {video_path} @ {args.fps} fps sample rate")
+    print("=" * 60)
+
+    results = {}
+    for mode in ('dense', 'sparse'):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            frames = video_frames.extract_frames(video_path, fps=args.fps, mode=mode)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[mode] = (best, frames)
+
+    dense_time, dense_frames = results['dense']
+    sparse_time, sparse_frames = results['sparse']
+
+    print("=" * 60)
+    for mode, (elapsed, frames) in results.items():
+        per_frame = elapsed / len(frames) * 1000 if frames else 0
+        print(f"{mode:>8}: {len(frames)} frames in {elapsed:.3f}s → {per_frame:.1f} ms/sampled frame")
+
+    if sparse_time > 0:
+        print(f"🚀 Sparse speedup: {dense_time / sparse_time:.1f}x")
+    if [t for t, _ in dense_frames] != [t for t, _ in sparse_frames]:
+        print("⚠️  Timestamps differ between modes")
+
+
+def bench_profiles(args):
+    """Bytes per frame and encode time for each analysis profile, optionally Rekognition latency"""
+    video_path = resolve_video(args)
+    cap, video_fps, total_frames = video_frames.open_video(video_path)
+    if cap is None:
+        return 1
+    indices = video_frames.sample_indices(total_frames, video_frames.frame_interval_for(video_fps, args.fps))
+    raw_frames = [frame for _, frame in video_frames.read_sparse(cap, indices)]
+    cap.release()
+
+    rek_client = None
+    if args.rekognition:
+        import boto3
+        rek_client = boto3.client('rekognition', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+
+    height, width = raw_frames[0].shape[:2]
+    print(f"\n📊 Analysis profile benchmark - {len(raw_frames)} frames at {width}x{height}")
+    print("=" * 60)
+
+    reference_labels = None
+    for name in video_frames.ANALYSIS_PROFILES:
+        start = time.perf_counter()
+        encoded = [video_frames.encode_frame(frame, name) for frame in raw_frames]
+        encode_ms = (time.perf_counter() - start) / len(encoded) * 1000
+        avg_kb = sum(len(b) for b in encoded) / len(encoded) / 1024
+        line = f"{name:>9}: {avg_kb:7.1f} KB/frame, encode {encode_ms:5.1f} ms"
+
+        if rek_client:
+            latencies = []
+            labels = []
+            for frame_bytes in encoded:
+                call_start = time.perf_counter()
+                response = rek_client.detect_labels(Image={'Bytes': frame_bytes}, MaxLabels=10, MinConfidence=70)
+                latencies.append(time.perf_counter() - call_start)
+                labels.append({l['Name'] for l in response.get('Labels', [])})
+            if reference_labels is None:
+                reference_labels = labels
+            overlap = sum(len(a & b) / max(1, len(a | b)) for a, b in zip(labels, reference_labels)) / len(labels)
+            line += f", Rekognition {sum(latencies) / len(latencies) * 1000:6.1f} ms avg, labels {overlap * 100:.0f}% same as 'full'"
+        print(line)
+
+
+def bench_parallel(args):
+    """Extraction wall time with 1..N decoder processes"""
+    video_path = resolve_video(args)
+    workers_list = args.workers or sorted({1, 2, 4, os.cpu_count() or 1})
+    print(f"\n📊 Parallel decode benchmark - {video_path} @ {args.fps} fps, {os.cpu_count()} cores")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    baseline_frames = video_frames.extract_frames(video_path, fps=args.fps, parallel=False)
+    baseline = time.perf_counter() - start
+
+    results = []
+    for workers in workers_list:
+        # First run spawns the pool, time the warm runs only
+        parallel_decode.extract_frames_parallel(video_path, fps=args.fps, workers=workers)
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            frames = parallel_decode.extract_frames_parallel(video_path, fps=args.fps, workers=workers)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if [t for t, _ in frames] != [t for t, _ in baseline_frames]:
+            print(f"⚠️  Timestamps differ with {workers} workers")
+        results.append((workers, best))
+
+    print("=" * 60)
+    print(f"{'serial':>10}: {len(baseline_frames)} frames in {baseline:.3f}s")
+    for workers, elapsed in results:
+        print(f"{workers:>3} procs: {elapsed:.3f}s → {baseline / elapsed:.2f}x vs serial")
+
+
+# Typical detect_labels names for stream footage
+SAMPLE_LABELS = [
+    'Person', 'Adult', 'Male', 'Man', 'Face', 'Head', 'Clothing', 'Shorts', 'Sport', 'Jumping', 'Acrobatic',
+    'Gymnastics', 'Flip', 'Airborne', 'Outdoors', 'Nature', 'Grass', 'Park', 'Roller Coaster', 'Amusement Park',
+    'Fun', 'Theme Park', 'Crowd', 'People', 'Fighting', 'Dancing', 'Leisure Activities', 'Exercise',
+    'Fitness', 'Running', 'Trampoline', 'Building', 'City', 'Street', 'Car', 'Vehicle', 'Electronics',
+    'Computer', 'Screen', 'Gaming', 'Basketball', 'Skateboard', 'Parkour', 'Diving', 'Swimming', 'Water'
+]
+
+
+def nested_loop_classify(label_names, classes):
+    """The old pattern: any(k in label for k in KEYWORDS) per class per label"""
+    result = {}
+    for index, name in enumerate(label_names):
+        label_lower = name.lower()
+        for class_name, keywords in classes.items():
+            if any(k in label_lower for k in keywords):
+                result.setdefault(class_name, []).append(index)
+    return result
+
+
+def bench_keywords(args):
+    """Label classification: nested keyword loops vs the compiled matcher"""
+    import random
+    rng = random.Random(0)
+    frames = [rng.sample(SAMPLE_LABELS, rng.randint(5, 15)) for _ in range(args.frames)]
+    classes = keyword_matcher.LABEL_CLASSES
+    matcher = keyword_matcher.KeywordMatcher(classes)
+    print(f"\n📊 Keyword matcher benchmark - {args.frames} frames, {len(classes)} classes, "
+          f"{sum(len(k) for k in classes.values())} keywords")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    expected = [nested_loop_classify(labels, classes) for labels in frames]
+    nested = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single_pass = [matcher.classify_frame(labels) for labels in frames]
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for labels in frames:
+        for name in labels:
+            matcher.classify(name)
+    cached = time.perf_counter() - start
+
+    if single_pass != expected:
+        print("⚠️  Matcher results differ from the nested loops")
+
+    per_frame = lambda seconds: seconds / args.frames * 1e6
+    print(f"{'nested':>12}: {per_frame(nested):7.1f} µs/frame")
+    print(f"{'single pass':>12}: {per_frame(scan):7.1f} µs/frame → {nested / scan:.1f}x")
+    print(f"{'cached':>12}: {per_frame(cached):7.1f} µs/frame → {nested / cached:.1f}x")
+
+
+def make_test_audio_video(path, seconds=60):
+    """Small clip with a tone track (the OpenCV test clip has no audio)"""
+    import subprocess
+    import imageio_ffmpeg
+    subprocess.run([
+        imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=duration={seconds}:size=640x360:rate=30',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+        '-shortest', '-c:v', 'libx264', '-c:a', 'aac', path
+    ], check=True)
+    return path
+
+
+def moviepy_segment(video_path, start_time, duration=5):
+    """The old extract_audio_segment: open the clip, write a temp WAV, read it back"""
+    from moviepy.editor import VideoFileClip
+    with VideoFileClip(video_path) as video:
+        audio_start = max(0, start_time - duration / 2)
+        audio_end = min(video.duration, start_time + duration / 2)
+        audio_clip = video.subclip(audio_start, audio_end).audio
+        temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+        audio_clip.write_audiofile(temp_audio.name, fps=16000, verbose=False, logger=None)
+    with open(temp_audio.name, 'rb') as f:
+        data = f.read()
+    os.unlink(temp_audio.name)
+    return data
+
+
+def bench_audio(args):
+    """Transcription segment extraction: moviepy per segment vs one demux + slices"""
+    video_path = args.video
+    if not video_path:
+        video_path = os.path.join(tempfile.gettempdir(), 'streambet_benchmark_audio.mp4')
+        if not os.path.exists(video_path):
+            print(f"🎬 Generating test clip with audio: {video_path}")
+            make_test_audio_video(video_path)
+
+    metadata = get_metadata(video_path)
+    duration = metadata['duration'] if metadata else 60
+    timestamps = [duration * (i + 0.5) / args.segments for i in range(args.segments)]
+    print(f"\n📊 Audio segment benchmark - {os.path.basename(video_path)}, {args.segments} x 5s segments")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    for ts in timestamps:
+        moviepy_segment(video_path, ts)
+    old = time.perf_counter() - start
+
+    audio_index.AUDIO_INDEX_DIR = ''  # Measure a real demux, not a mapped .npy
+    audio_index._tracks.clear()
+    start = time.perf_counter()
+    track = audio_index.get_audio_track(video_path)
+    demux = time.perf_counter() - start
+    if track is None:
+        print("⚠️  Video has no audio track")
+        return 1
+
+    start = time.perf_counter()
+    for ts in timestamps:
+        audio_index.wav_bytes(track.segment_around(ts))
+    sliced = time.perf_counter() - start
+
+    print(f"{'moviepy':>12}: {old / args.segments * 1000:9.2f} ms/segment")
+    print(f"{'demux once':>12}: {demux * 1000:9.2f} ms ({track.duration:.0f}s of audio)")
+    print(f"{'slice + wav':>12}: {sliced / args.segments * 1e6:9.1f} µs/segment")
+    print(f"{'total':>12}: {old:.2f}s → {demux + sliced:.3f}s ({old / (demux + sliced):.0f}x)")
+
+
+REQUERY_TARGETS = ['Backflips', 'People Count', 'Roller Coasters', 'Dancing']
+
+
+def bench_requery(args):
+    """New query on a labeled video: per-frame label_rules.evaluate vs the columnar store"""
+    import random
+    rng = random.Random(0)
+    frames = [
+        (i * 0.5, [{'name': name, 'confidence': rng.uniform(55, 99.9), 'instances': rng.choice([0, 0, 1, 2])}
+                   for name in rng.sample(SAMPLE_LABELS, rng.randint(5, 15))])
+        for i in range(args.frames)
+    ]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'labels.npz')
+        label_store.LabelStore.from_frames(frames).save(path)
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        store = label_store.LabelStore.load(path)
+        load = time.perf_counter() - start
+
+    print(f"\n📊 Requery benchmark - {args.frames} frames, {len(store.label_ids)} labels, "
+          f"{size / 1024:.0f} KB on disk (loaded in {load * 1000:.1f}ms)")
+    print("=" * 60)
+    for target in REQUERY_TARGETS:
+        program = label_rules.compile_rules({'target': target})
+        start = time.perf_counter()
+        expected = [label_rules.evaluate(program, labels)['decision'] for _, labels in frames]
+        per_frame = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decisions, _ = store.evaluate(program)
+        columnar = time.perf_counter() - start
+
+        if [label_store.DECISIONS[d] for d in decisions] != expected:
+            print(f"⚠️  Columnar decisions differ for '{target}'")
+        print(f"{target[:28]:>28}: {per_frame * 1000:7.1f}ms → {columnar * 1000:6.2f}ms "
+              f"({per_frame / columnar:.0f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='StreamBet performance benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    frames_parser = subparsers.add_parser('frames', help='Frame extraction decode cost')
+    frames_parser.add_argument('video', nargs='?', help='Video file (default: generated 60fps clip)')
+    frames_parser.add_argument('--fps', type=float, default=1 / 3, help='Sample rate in frames per second')
+    frames_parser.add_argument('--repeat', type=int, default=3, help='Runs per mode (best is reported)')
+    frames_parser.set_defaults(func=bench_frames)
+
+    profiles_parser = subparsers.add_parser('profiles', help='Payload size per analysis profile')
+    profiles_parser.add_argument('video', nargs='?', help='Video file (default: generated 60fps clip)')
+    profiles_parser.add_argument('--fps', type=float, default=1 / 3, help='Sample rate in frames per second')
+    profiles_parser.add_argument('--rekognition', action='store_true', help='Also measure detect_labels latency (uses AWS credits)')
+    profiles_parser.set_defaults(func=bench_profiles)
+
+    parallel_parser = subparsers.add_parser('parallel', help='Multi-process decode scaling')
+    parallel_parser.add_argument('video', nargs='?', help='Video file (default: generated 60fps clip)')
+    parallel_parser.add_argument('--fps', type=float, default=1, help='Sample rate in frames per second')
+    parallel_parser.add_argument('--workers', type=int, nargs='+', help='Process counts to try (default: 1 2 4 cores)')
+    parallel_parser.add_argument('--repeat', type=int, default=2, help='Runs per process count (best is reported)')
+    parallel_parser.set_defaults(func=bench_parallel)
+
+    keywords_parser = subparsers.add_parser('keywords', help='Label keyword classification cost')
+    keywords_parser.add_argument('--frames', type=int, default=10000, help='Synthetic frames to classify')
+    keywords_parser.set_defaults(func=bench_keywords)
+
+    audio_parser = subparsers.add_parser('audio', help='Transcription segment extraction cost')
+    audio_parser.add_argument('video', nargs='?', help='Video file with audio (default: generated clip)')
+    audio_parser.add_argument('--segments', type=int, default=10, help='Segments to extract')
+    audio_parser.set_defaults(func=bench_audio)
+
+    requery_parser = subparsers.add_parser('requery', help='Re-query stored labels without Rekognition')
+    requery_parser.add_argument('--frames', type=int, default=3600, help='Synthetic labeled frames')
+    requery_parser.set_defaults(func=bench_requery)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Off-thread commentary + voice pipeline for StreamBet
+Commentary text (Bedrock) and TTS (ElevenLabs) run on a shared worker pool,
+so a stream's detection events never wait on them. Finished work comes back
+as follow-up SSE events ('commentary', then 'audio') the stream drains
+between frames.
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by all streams, also bounds concurrent Bedrock/ElevenLabs calls
+COMMENTARY_WORKERS = int(os.getenv('COMMENTARY_WORKERS', '2'))
+
+# Per stream: frames are skipped while this many commentaries are still in the works
+COMMENTARY_MAX_PENDING = int(os.getenv('COMMENTARY_MAX_PENDING', '2'))
+
+# How long a finished analysis waits for outstanding commentary before completing
+COMMENTARY_DRAIN_TIMEOUT = float(os.getenv('COMMENTARY_DRAIN_TIMEOUT', '15'))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_commentary_executor():
+    """Process-wide commentary worker pool (started on first use)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=COMMENTARY_WORKERS, thread_name_prefix='commentary')
+        return _executor
+
+
+class CommentaryPipeline:
+    """
+    One stream's commentary jobs on the shared pool
+    compose(**context) returns the commentary text, speak(text, timestamp)
+    returns an audio URL (or None). Results are queued as SSE payloads.
+    """
+
+    def __init__(self, compose, speak=None, max_pending=COMMENTARY_MAX_PENDING):
+        self.compose = compose
+        self.speak = speak
+        self.max_pending = max_pending
+        self.submitted = 0
+        self.skipped = 0
+        self.failed = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._events = queue.Queue()
+        self._closed = False
+
+    def submit(self, timestamp, **context):
+        """Queue commentary for a frame, False if the stream is too far behind"""
+        with self._lock:
+            if self._closed or self._pending >= self.max_pending:
+                self.skipped += 1
+                return False
+            self._pending += 1
+            self.submitted += 1
+        get_commentary_executor().submit(self._run, timestamp, context)
+        return True
+
+    def _run(self, timestamp, context):
+        try:
+            if self._closed:
+                return
+            text = self.compose(timestamp=timestamp, **context)
+            if not text:
+                return
+            self._events.put({'type': 'commentary', 'timestamp': timestamp, 'commentary': text})
+            print(f"🎙️ Commentary: {text}")
+
+            if self.speak and not self._closed:
+                audio_url = self.speak(text, timestamp)
+                if audio_url:
+                    self._events.put({'type': 'audio', 'timestamp': timestamp, 'audio_url': audio_url})
+                    print(f"✅ Voice generated: {audio_url}")
+        except Exception as e:
+            print(f"⚠️ Commentary failed: {e}")
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def drain(self):
+        """Follow-up events that are ready now (never blocks)"""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def finish(self, timeout=COMMENTARY_DRAIN_TIMEOUT):
+        """Yield follow-up events until every submitted job is done or timeout passes"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pending = self._pending
+            if not pending and self._events.empty():
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"⏱️ Gave up waiting for {pending} commentary job(s)")
+                return
+            try:
+                yield self._events.get(timeout=min(remaining, 0.2))
+            except queue.Empty:
+                continue
+
+    def close(self):
+        """Stop starting new work for a disconnected stream"""
+        with self._lock:
+            self._closed = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'submitted': self.submitted,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'pending': self._pending
+            }
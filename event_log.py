@@ -0,0 +1,158 @@
+"""
+Append-only event log for StreamBet analyses
+Every event of a shared analysis (analysis_jobs.py) is appended to one file
+per analysis as a length-prefixed JSON record:
+
+    [4-byte big-endian length][run id]        header, the run that wrote the log
+    [4-byte big-endian length][UTF-8 JSON]    one per event
+    [4 zero bytes]                            analysis finished
+
+The run id and a record's position make up its SSE id, so an EventSource
+reconnecting with Last-Event-ID is replayed from the log - by this worker
+or another one - and continues live without anything being analyzed again.
+"""
+
+import os
+import time
+import struct
+
+# Empty to keep events in memory only (no resume across workers/restarts)
+EVENT_LOG_DIR = os.getenv('EVENT_LOG_DIR', os.path.join('cache', 'event_logs'))
+
+# An unfinished log nobody has appended to for this long belongs to a dead run
+EVENT_LOG_STALE_SECONDS = float(os.getenv('EVENT_LOG_STALE_SECONDS', '60'))
+
+# How often a reader following another worker's live log checks for new events
+EVENT_LOG_POLL_SECONDS = float(os.getenv('EVENT_LOG_POLL_SECONDS', '0.25'))
+
+_HEADER = struct.Struct('>I')
+_END = _HEADER.pack(0)  # JSON never contains NUL bytes, so this can't end a record
+
+
+def log_path(key):
+    return os.path.join(EVENT_LOG_DIR, f"{key}.log")
+
+
+def log_state(path):
+    """'missing', 'finished', 'live' (being written) or 'stale' (writer gone)"""
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            if stat.st_size >= _HEADER.size:
+                f.seek(-_HEADER.size, os.SEEK_END)
+                if f.read() == _END:
+                    return 'finished'
+    except FileNotFoundError:
+        return 'missing'
+    if time.time() - stat.st_mtime > EVENT_LOG_STALE_SECONDS:
+        return 'stale'
+    return 'live'
+
+
+def _record(text):
+    data = text.encode('utf-8')
+    return _HEADER.pack(len(data)) + data
+
+
+class EventLogWriter:
+    """Appends one analysis' events; the file is created exclusively so only one run writes it"""
+
+    def __init__(self, path, run_id):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        # Written aside and linked into place, so a log is never seen without its run id
+        temp_path = f"{path}.{os.getpid()}.{id(self)}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(_record(run_id))
+        try:
+            os.link(temp_path, path)  # FileExistsError if another run owns it
+        finally:
+            os.remove(temp_path)
+        self._file = open(path, 'ab')
+
+    def append(self, payload):
+        self._file.write(_record(payload))
+        self._file.flush()  # Readers in other workers follow the file
+
+    def finish(self):
+        self._file.write(_END)
+        self._file.close()
+
+    def discard(self):
+        """Cancelled or failed run: remove the partial log so the next viewer starts fresh"""
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def read_log(path, start=0, follow=False):
+    """
+    (index, payload) for every event from index start
+    With follow, waits for events a live writer is still appending and stops
+    at the end marker (or when the writer has gone quiet for too long or
+    discarded the log).
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        index = -1  # The run id header is skipped like any event before start
+        while True:
+            position = f.tell()
+            header = f.read(_HEADER.size)
+            length = _HEADER.unpack(header)[0] if len(header) == _HEADER.size else None
+            if length == 0:
+                return  # Finished
+            if length is not None:
+                if index < start:
+                    # Skip without decoding, but only past a complete record
+                    if os.fstat(f.fileno()).st_size >= position + _HEADER.size + length:
+                        f.seek(length, os.SEEK_CUR)
+                        index += 1
+                        continue
+                else:
+                    data = f.read(length)
+                    if len(data) == length:
+                        yield index, data.decode('utf-8')
+                        index += 1
+                        continue
+
+            # End of what's been written so far
+            if not follow:
+                return
+            try:
+                stat = os.fstat(f.fileno())
+                if stat.st_nlink == 0 or time.time() - stat.st_mtime > EVENT_LOG_STALE_SECONDS:
+                    return
+            except OSError:
+                return
+            f.seek(position)
+            time.sleep(EVENT_LOG_POLL_SECONDS)
+
+
+def log_run(path):
+    """Run id from a log's header, None if there's no readable log"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return None
+            data = f.read(_HEADER.unpack(header)[0])
+    except FileNotFoundError:
+        return None
+    return data.decode('utf-8', 'replace') or None
+
+
+def log_length(path):
+    """Number of events in a finished log"""
+    count = -1  # Header
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size or _HEADER.unpack(header)[0] == 0:
+                return max(count, 0)
+            f.seek(_HEADER.unpack(header)[0], os.SEEK_CUR)
+            count += 1
@@ -0,0 +1,119 @@
+"""
+Perceptual-hash frame dedup for StreamBet
+Static stretches of a stream produce long runs of near-identical frames;
+those reuse the previous frame's labels instead of calling Rekognition again
+"""
+
+import os
+import threading
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() == 'true'
+
+# Max differing bits (out of 64) for two frames to count as the same scene
+DEDUP_MAX_DISTANCE = int(os.getenv('DEDUP_MAX_DISTANCE', '5'))
+
+
+def dhash(frame_bytes, hash_size=8):
+    """
+    Difference hash of a JPEG frame
+    Decodes at 1/8 scale in grayscale, so it costs far less than a full decode
+    """
+    image = cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).tobytes().hex(), 16)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class FrameDeduper:
+    """
+    Per-video dedup stage in front of the label call
+    Each frame is compared with the last frame that was actually sent to
+    Rekognition; within DEDUP_MAX_DISTANCE its labels are reused. Thread-safe,
+    so it can sit inside the concurrent stream-counter workers. Frames fed
+    through sequence() are compared in input order, so which frame of a run
+    of duplicates keeps its own call doesn't depend on worker timing.
+    """
+
+    def __init__(self, max_distance=DEDUP_MAX_DISTANCE, enabled=DEDUP_ENABLED):
+        self.max_distance = max_distance
+        self.enabled = enabled
+        self.frames = 0
+        self.calls_made = 0
+        self.calls_saved = 0
+        self._reference = None  # (hash, Future of the reference frame's labels)
+        self._planned = {}  # id(frame_bytes) -> (frame_bytes, future, is_duplicate), from sequence()
+        self._lock = threading.Lock()
+
+    def _decide(self, frame_bytes):
+        """(future, is_duplicate) for the next frame, moving the reference to it if it's a new scene"""
+        frame_hash = dhash(frame_bytes) if self.enabled else None
+
+        with self._lock:
+            self.frames += 1
+            reference = self._reference
+            if (frame_hash is not None and reference is not None
+                    and hamming_distance(frame_hash, reference[0]) <= self.max_distance):
+                self.calls_saved += 1
+                return reference[1], True
+            future = Future()
+            if frame_hash is not None:
+                self._reference = (frame_hash, future)
+            self.calls_made += 1
+            return future, False
+
+    def sequence(self, frames):
+        """
+        Pass (timestamp, frame_bytes) tuples through unchanged, deciding
+        duplicates as they're read; detect() on those frames uses the decision
+        """
+        for frame in frames:
+            frame_bytes = frame[1]
+            future, is_duplicate = self._decide(frame_bytes)
+            with self._lock:
+                # The entry holds frame_bytes, so its id can't be reused before detect() pops it
+                self._planned[id(frame_bytes)] = (frame_bytes, future, is_duplicate)
+            yield frame
+
+    def detect(self, frame_bytes, fetch):
+        """Return fetch() for a new scene, or the reference frame's result for a duplicate"""
+        with self._lock:
+            planned = self._planned.pop(id(frame_bytes), None)
+        if planned:
+            _, future, is_duplicate = planned
+        else:
+            future, is_duplicate = self._decide(frame_bytes)
+
+        if is_duplicate:
+            try:
+                return future.result()
+            except Exception:
+                # Reference call failed - this frame gets its own attempt
+                with self._lock:
+                    self.calls_saved -= 1
+                    self.calls_made += 1
+                return fetch()
+
+        try:
+            result = fetch()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'rekognition_calls': self.calls_made,
+            'rekognition_calls_saved': self.calls_saved
+        }
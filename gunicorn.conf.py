@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for StreamBet
+SERVING_MODE=gevent (default) runs each request - and each open SSE
+stream - as a greenlet, so a worker holds WORKER_CONNECTIONS streams
+instead of one. SERVING_MODE=sync restores the old one-request-per-worker setup.
+"""
+
+import os
+
+SERVING_MODE = os.getenv('SERVING_MODE', 'gevent')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+timeout = 120
+
+if SERVING_MODE == 'gevent':
+    worker_class = 'gevent'
+    # Open EventSource clients per worker (each is a greenlet, mostly idle)
+    worker_connections = int(os.getenv('WORKER_CONNECTIONS', '4000'))
+    # SSE responses are long-lived, keep idle keep-alive sockets short
+    keepalive = 5
+else:
+    worker_class = 'sync'
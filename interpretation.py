@@ -0,0 +1,180 @@
+"""
+Batched Bedrock label interpretation for StreamBet
+Frames that need an AI answer at about the same time are asked about in
+one Titan prompt, and answers are parsed back out per frame. ThrottlingException
+is retried with exponential backoff instead of failing the frame.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import threading
+from concurrent.futures import Future
+
+from botocore.exceptions import ClientError
+
+BEDROCK_TEXT_MODEL = os.getenv('BEDROCK_TEXT_MODEL', 'amazon.titan-text-express-v1')
+
+# Flush a batch at this many frames, or after the first frame waited this long
+BEDROCK_BATCH_SIZE = int(os.getenv('BEDROCK_BATCH_SIZE', '4'))
+BEDROCK_BATCH_WAIT_MS = float(os.getenv('BEDROCK_BATCH_WAIT_MS', '250'))
+
+# Throttling retries: 0.5s, 1s, 2s, ... (+ jitter)
+BEDROCK_MAX_RETRIES = int(os.getenv('BEDROCK_MAX_RETRIES', '5'))
+BEDROCK_BACKOFF_BASE = 0.5
+
+THROTTLE_CODES = ('ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException')
+
+ANSWER_LINE = re.compile(r'^\s*\**\s*frame\s*(\d+)\s*\**\s*[:.)\-]\s*(.+?)\s*$', re.IGNORECASE)
+
+
+def invoke_titan(client, prompt, max_tokens=50, temperature=0.1, on_throttle=None):
+    """invoke_model on a Titan text model, backing off on throttling; returns the output text"""
+    body = json.dumps({
+        "inputText": prompt,
+        "textGenerationConfig": {
+            "maxTokenCount": max_tokens,
+            "temperature": temperature,
+            "topP": 0.9
+        }
+    })
+    for attempt in range(BEDROCK_MAX_RETRIES + 1):
+        try:
+            response = client.invoke_model(modelId=BEDROCK_TEXT_MODEL, body=body)
+            break
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code not in THROTTLE_CODES or attempt == BEDROCK_MAX_RETRIES:
+                raise
+            delay = BEDROCK_BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+            print(f"⏳ Bedrock throttled, retrying in {delay:.1f}s")
+            if on_throttle:
+                on_throttle()
+            time.sleep(delay)
+
+    response_body = json.loads(response['body'].read())
+    return response_body.get('results', [{}])[0].get('outputText', '').strip()
+
+
+def build_batch_prompt(instructions, frame_texts):
+    """One prompt asking `instructions` about every frame, answers on numbered lines"""
+    frames = '\n\n'.join(f"Frame {i}:\n{text}" for i, text in enumerate(frame_texts, 1))
+    example = '\n'.join(f"Frame {i}: <answer>" for i in range(1, min(len(frame_texts), 2) + 1))
+    return f"""{instructions}
+
+{frames}
+
+Answer every frame separately, one line per frame, in this exact format:
+{example}
+
+Answers:"""
+
+
+def parse_batch_answers(text, count):
+    """Per-frame answers from a batch completion, {frame_number: answer}"""
+    answers = {}
+    for line in text.splitlines():
+        match = ANSWER_LINE.match(line)
+        if match:
+            number = int(match.group(1))
+            if 1 <= number <= count and number not in answers:
+                answers[number] = match.group(2)
+    return answers
+
+
+class InterpretationBatcher:
+    """
+    Micro-batches per-frame interpretation requests from concurrent workers
+    ask() blocks until its frame's answer is in. The first caller of a batch
+    waits up to max_wait_ms for others to join; the caller that fills the
+    batch (or the first one, on timeout) makes the Bedrock call for all.
+    """
+
+    def __init__(self, client, instructions, batch_size=BEDROCK_BATCH_SIZE,
+                 max_wait_ms=BEDROCK_BATCH_WAIT_MS, tokens_per_frame=20):
+        self.client = client
+        self.instructions = instructions
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.tokens_per_frame = tokens_per_frame
+        self.frames = 0
+        self.calls = 0
+        self.throttles = 0
+        self._pending = []
+        self._cond = threading.Condition()
+
+    def ask(self, frame_text):
+        future = Future()
+        batch = None
+        with self._cond:
+            self.frames += 1
+            self._pending.append((frame_text, future))
+            if len(self._pending) >= self.batch_size:
+                batch = self._take()
+            elif len(self._pending) == 1:
+                # First in: wait for the batch to fill up or time out
+                deadline = time.monotonic() + self.max_wait
+                while self._is_pending(future) and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._is_pending(future):
+                    batch = self._take()
+
+        if batch:
+            self._run(batch)
+        return future.result()
+
+    def _is_pending(self, future):
+        return any(pending is future for _, pending in self._pending)
+
+    def _take(self):
+        batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        self._cond.notify_all()
+        return batch
+
+    def _count_throttle(self):
+        with self._cond:
+            self.throttles += 1
+
+    def _invoke(self, prompt, max_tokens):
+        with self._cond:
+            self.calls += 1
+        return invoke_titan(self.client, prompt, max_tokens=max_tokens, on_throttle=self._count_throttle)
+
+    def _ask_single(self, frame_text):
+        return self._invoke(f"{self.instructions}\n\n{frame_text}\n\nAnswer:", 50)
+
+    def _run(self, batch):
+        try:
+            if len(batch) == 1:
+                text, future = batch[0]
+                future.set_result(self._ask_single(text))
+                return
+
+            prompt = build_batch_prompt(self.instructions, [text for text, _ in batch])
+            output = self._invoke(prompt, self.tokens_per_frame * len(batch) + 20)
+            answers = parse_batch_answers(output, len(batch))
+            if len(answers) < len(batch):
+                print(f"⚠️ Batch answer covered {len(answers)}/{len(batch)} frames, asking the rest one by one")
+
+            for number, (text, future) in enumerate(batch, 1):
+                if number in answers:
+                    future.set_result(answers[number])
+                else:
+                    future.set_result(self._ask_single(text))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'bedrock_calls': self.calls,
+            'throttled': self.throttles,
+            'batch_size': self.batch_size
+        }
@@ -0,0 +1,150 @@
+"""
+Shared cache of Bedrock label interpretations for StreamBet
+Keyed by the normalized query + the frame's full label set, so a popular
+bet query answered on one stream is reused on every other stream (and by
+every gunicorn worker when the SQLite tier is on)
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+INTERPRETATION_CACHE_ENABLED = os.getenv('INTERPRETATION_CACHE_ENABLED', 'true').lower() == 'true'
+INTERPRETATION_CACHE_SIZE = int(os.getenv('INTERPRETATION_CACHE_SIZE', '5000'))
+INTERPRETATION_CACHE_TTL = float(os.getenv('INTERPRETATION_CACHE_TTL', '86400'))
+
+# Cross-worker tier, empty to keep the cache in process memory only
+INTERPRETATION_CACHE_PATH = os.getenv('INTERPRETATION_CACHE_PATH', os.path.join('cache', 'interpretations.sqlite3'))
+
+# Label confidences are bucketed so 91.2% and 93.8% share an entry
+CONFIDENCE_BUCKET = float(os.getenv('INTERPRETATION_CONFIDENCE_BUCKET', '10'))
+
+
+def normalize_query(query):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', query.lower()).split())
+
+
+class InterpretationCache:
+    """
+    In-memory LRU with per-entry TTL, optionally backed by SQLite
+    Memory hits never touch the database; shared hits are promoted to memory
+    """
+
+    def __init__(self, max_entries=INTERPRETATION_CACHE_SIZE, ttl=INTERPRETATION_CACHE_TTL,
+                 path=INTERPRETATION_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (answer, expires_at)
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS interpretations ('
+                'key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(query, labels_data, extra=None):
+        """
+        Normalized query + every label as name:confidence bucket:instances
+        labels_data is the stream-counter list of {'name', 'confidence', 'instances'}
+        """
+        labels = sorted(
+            f"{l['name'].lower()}:{int(l['confidence'] // CONFIDENCE_BUCKET)}:{l.get('instances', 0)}"
+            for l in labels_data
+        )
+        raw = '|'.join([normalize_query(query), ','.join(labels), extra or ''])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+                self.expired += 1
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    'SELECT answer, expires_at FROM interpretations WHERE key = ?', (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    self._remember(key, row[0], row[1])
+                    self.shared_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, answer):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, answer, expires_at)
+            if self._conn is not None:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO interpretations (key, answer, expires_at) VALUES (?, ?, ?)',
+                    (key, answer, expires_at)
+                )
+                self._conn.execute('DELETE FROM interpretations WHERE expires_at <= ?', (time.time(),))
+                self._conn.commit()
+
+    def _remember(self, key, answer, expires_at):
+        self._entries[key] = (answer, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            shared_entries = None
+            if self._conn is not None:
+                shared_entries = self._conn.execute('SELECT COUNT(*) FROM interpretations').fetchone()[0]
+            memory_entries = len(self._entries)
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            'enabled': INTERPRETATION_CACHE_ENABLED,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.shared_hits) / lookups, 3) if lookups else 0,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'entries': memory_entries,
+            'shared_entries': shared_entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_interpretation_cache():
+    """Process-wide cache instance (opened on first use)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = InterpretationCache()
+        return _cache
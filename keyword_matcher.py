@@ -0,0 +1,113 @@
+"""
+Shared keyword classification for Rekognition labels
+Every keyword list used to classify labels lives here as a named class.
+All classes are compiled into one regex, so a frame's labels are classified
+in a single scan instead of one `k in label` test per keyword per label.
+"""
+
+import re
+import bisect
+from functools import lru_cache
+
+# Named keyword classes (matched as lowercase substrings, like the old loops)
+LABEL_CLASSES = {
+    'person': ['person', 'human', 'people'],
+    # Clear jump/flip action, enough on its own (with a person) to count
+    'action': ['jump', 'flip', 'diving', 'acrobatic', 'gymnastics', 'floating', 'airborne', 'midair', 'flying'],
+    # Suggests activity but never enough alone
+    'weak': ['fighting', 'sport', 'dancing', 'activity', 'exercise', 'playing', 'fun'],
+    'coaster': ['roller coaster', 'coaster', 'ride', 'amusement'],
+    # Triggers coarse-to-fine refinement in stream-counter
+    'refine': ['jump', 'flip', 'diving', 'acrobatic', 'gymnast', 'floating', 'airborne', 'midair', 'flying',
+               'trampoline', 'parkour'],
+    # analyze-video-stream signals
+    'stream_backflip': ['jump', 'flip', 'acrobatics', 'floating', 'airborne', 'fighting'],
+    'stream_weak': ['sport', 'activity', 'exercise'],
+    # analyze-video backflip signals
+    'video_backflip': ['jump', 'flip', 'acrobatics', 'floating', 'airborne', 'fighting', 'sport', 'activity'],
+    # analyze-frames action/movement indicators
+    'frames_backflip': ['jump', 'leap', 'airborne', 'flying', 'float', 'flip', 'acrobatics', 'gymnastics',
+                        'fighting', 'action', 'motion', 'movement', 'sport', 'activity'],
+    # Rekognition Video label aggregation (count_backflips)
+    'video_trick': ['acrobatics', 'gymnastics', 'flip', 'somersault', 'rotation', 'jumping', 'tumbling', 'aerial',
+                    'trick', 'sport', 'basketball', 'playing', 'exercise', 'fitness', 'athlete', 'training', 'jump',
+                    'leap', 'airborne', 'flying'],
+    # Person movement activity (analyze_person_movement)
+    'movement_activity': ['jumping', 'running', 'exercise', 'sport', 'game', 'playing'],
+}
+
+# Joins a frame's labels for the single-pass scan, never part of a keyword
+SEPARATOR = '\n'
+
+
+class KeywordMatcher:
+    """
+    Multi-pattern substring matcher over named keyword classes
+    One compiled alternation (longest keyword first) inside a lookahead finds
+    the longest keyword starting at every position, overlaps included. Each
+    keyword maps to the classes of every keyword it contains, so the shorter
+    keywords hidden behind a longer match at the same position still count.
+    """
+
+    def __init__(self, classes):
+        self.classes = {name: [k.lower() for k in keywords] for name, keywords in classes.items()}
+        owners = {}
+        for name, keywords in self.classes.items():
+            for keyword in keywords:
+                owners.setdefault(keyword, set()).add(name)
+
+        # Substring closure: 'jumping' also carries every class of 'jump'
+        self._keyword_classes = {
+            keyword: frozenset().union(*(owners[other] for other in owners if other in keyword))
+            for keyword in owners
+        }
+        alternation = '|'.join(re.escape(k) for k in sorted(owners, key=len, reverse=True))
+        self._pattern = re.compile(f'(?=({alternation}))') if owners else None
+        self.classify = lru_cache(maxsize=4096)(self._classify)
+
+    def _classify(self, label_name):
+        """Frozen set of class names whose keywords occur in label_name"""
+        if self._pattern is None:
+            return frozenset()
+        found = set()
+        for match in self._pattern.finditer(label_name.lower()):
+            found |= self._keyword_classes[match.group(1)]
+        return frozenset(found)
+
+    def has(self, label_name, class_name):
+        return class_name in self.classify(label_name)
+
+    def classify_frame(self, label_names):
+        """
+        Classify all labels of a frame in one scan
+        Returns {class_name: [indices of matching labels]}
+        """
+        result = {}
+        if self._pattern is None or not label_names:
+            return result
+        text = SEPARATOR.join(label_names).lower()
+        starts = []
+        offset = 0
+        for name in label_names:
+            starts.append(offset)
+            offset += len(name) + len(SEPARATOR)
+
+        for match in self._pattern.finditer(text):
+            index = bisect.bisect_right(starts, match.start()) - 1
+            for class_name in self._keyword_classes[match.group(1)]:
+                indices = result.setdefault(class_name, [])
+                if not indices or indices[-1] != index:
+                    indices.append(index)
+        return result
+
+
+label_matcher = KeywordMatcher(LABEL_CLASSES)
+
+
+def classify(label_name):
+    """Classes of one label name under the shared LABEL_CLASSES"""
+    return label_matcher.classify(label_name)
+
+
+def has_class(label_name, class_name):
+    return label_matcher.has(label_name, class_name)
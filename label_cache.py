@@ -0,0 +1,186 @@
+"""
+Persistent cache for AWS Rekognition detect_labels results
+Keyed by frame content hash + request parameters, so re-analyzing the
+same upload (e.g. /counter then /player) costs zero API calls
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+LABEL_CACHE_ENABLED = os.getenv('LABEL_CACHE_ENABLED', 'true').lower() == 'true'
+LABEL_CACHE_PATH = os.getenv('LABEL_CACHE_PATH', os.path.join('cache', 'labels.sqlite3'))
+LABEL_CACHE_MAX_BYTES = int(float(os.getenv('LABEL_CACHE_MAX_MB', '200')) * 1024 * 1024)
+
+# Check the size cap every N writes instead of on every insert
+EVICTION_CHECK_INTERVAL = 32
+
+# Longest a lookup waits for the same frame's in-flight Rekognition call
+LABEL_INFLIGHT_WAIT = float(os.getenv('LABEL_INFLIGHT_WAIT', '30'))
+
+
+class LabelCache:
+    """
+    SQLite-backed LRU cache of detect_labels responses
+    Safe to share between threads and between gunicorn workers (WAL mode)
+    """
+
+    def __init__(self, path=LABEL_CACHE_PATH, max_bytes=LABEL_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS labels ('
+            'key TEXT PRIMARY KEY, response TEXT NOT NULL, '
+            'size INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS labels_last_access ON labels (last_access)')
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(frame_bytes, max_labels, min_confidence=None, features=None):
+        """Content hash of the frame plus every parameter that changes the response"""
+        digest = hashlib.sha256(frame_bytes).hexdigest()
+        features_key = ','.join(sorted(features)) if features else ''
+        return f"{digest}:{max_labels}:{min_confidence}:{features_key}"
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT response FROM labels WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute('UPDATE labels SET last_access = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        payload = json.dumps(response)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO labels (key, response, size, last_access) VALUES (?, ?, ?, ?)',
+                (key, payload, len(payload), time.time())
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % EVICTION_CHECK_INTERVAL == 0:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its cap"""
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM labels').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute('SELECT key, size FROM labels ORDER BY last_access').fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany('DELETE FROM labels WHERE key = ?', doomed)
+        self._conn.commit()
+        self.evictions += len(doomed)
+        print(f"🧹 Label cache evicted {len(doomed)} entries")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM labels'
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'enabled': LABEL_CACHE_ENABLED,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'size_bytes': size,
+            'max_bytes': self.max_bytes
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+_inflight = {}  # cache key -> Event set when its detect_labels call finishes
+_inflight_lock = threading.Lock()
+
+
+def get_label_cache():
+    """Process-wide cache instance (opened on first use)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LabelCache()
+        return _cache
+
+
+def detect_labels_cached(client, frame_bytes, max_labels=10, min_confidence=None, features=None,
+                         on_remote_call=None):
+    """
+    Drop-in for client.detect_labels(Image={'Bytes': frame_bytes}, ...)
+    Returns the cached response for identical frames + parameters,
+    on_remote_call(seconds) is called only when Rekognition is actually hit
+    """
+    params = {'Image': {'Bytes': frame_bytes}, 'MaxLabels': max_labels}
+    if min_confidence is not None:
+        params['MinConfidence'] = min_confidence
+    if features:
+        params['Features'] = features
+
+    if not LABEL_CACHE_ENABLED:
+        start = time.perf_counter()
+        response = client.detect_labels(**params)
+        if on_remote_call:
+            on_remote_call(time.perf_counter() - start)
+        return response
+
+    cache = get_label_cache()
+    key = cache.make_key(frame_bytes, max_labels, min_confidence, features)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Single flight: a stream reaching a frame the upload prewarm is labeling
+    # right now waits for that call instead of making its own
+    with _inflight_lock:
+        done = _inflight.get(key)
+        leader = done is None
+        if leader:
+            done = _inflight[key] = threading.Event()
+    if not leader:
+        done.wait(LABEL_INFLIGHT_WAIT)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        start = time.perf_counter()
+        response = client.detect_labels(**params)
+        if on_remote_call:
+            on_remote_call(time.perf_counter() - start)
+
+        # ResponseMetadata is per-call noise, only the labels are worth keeping
+        cache.put(key, {'Labels': response.get('Labels', []), 'LabelModelVersion': response.get('LabelModelVersion')})
+        return response
+    finally:
+        if leader:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            done.set()
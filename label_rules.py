@@ -0,0 +1,180 @@
+"""
+Compiled label rules for StreamBet detection configs
+A detection config (target / query / mode) is compiled once into a small
+rule program that is evaluated locally against each frame's Rekognition
+labels. Only frames the rules can't decide go to Bedrock.
+
+Program format (plain JSON, so it can travel in the config):
+    required              list of keyword groups, every group needs a matching label (any keyword)
+    forbidden             keywords that veto a detection (→ no)
+    weak                  keywords that suggest the target without proving it (→ ambiguous)
+    min_confidence        label confidence (0-100) needed to count as a match
+    ambiguity_margin      matches within this many points above min_confidence are ambiguous
+    count_from_instances  count = instances of the labels matching the last required group
+    strict                False: a "no" is handed to Bedrock instead
+"""
+
+import os
+import json
+from functools import lru_cache
+
+from keyword_matcher import KeywordMatcher
+
+RULES_MIN_CONFIDENCE = float(os.getenv('RULES_MIN_CONFIDENCE', '70'))
+RULES_AMBIGUITY_MARGIN = float(os.getenv('RULES_AMBIGUITY_MARGIN', '10'))
+
+PERSON_KEYWORDS = ['person', 'human', 'people']
+
+# Hand-tuned programs for the targets /api/configure-detection emits,
+# looked up by the config's exact target name
+RULE_TEMPLATES = {
+    # Rekognition has no colour attributes or game UI - always ask Bedrock
+    'red shirts': {},
+    'game kills': {},
+    'backflips': {
+        'required': [PERSON_KEYWORDS,
+                     ['jump', 'flip', 'diving', 'acrobatic', 'gymnastics', 'floating', 'airborne', 'midair', 'flying']],
+        'weak': ['fighting', 'sport', 'dancing', 'activity', 'exercise', 'playing', 'fun'],
+        'count_from_instances': True,
+        'strict': True
+    },
+    'roller coasters': {
+        'required': [['roller coaster', 'coaster']],
+        'weak': ['ride', 'amusement', 'theme park'],
+        'count_from_instances': True,
+        'strict': True
+    },
+    'dancing': {
+        'required': [PERSON_KEYWORDS, ['dance', 'dancing']],
+        'weak': ['party', 'music', 'concert', 'performer', 'leisure activities'],
+        'count_from_instances': False,
+        'strict': True
+    },
+    'people count': {
+        'required': [PERSON_KEYWORDS],
+        'count_from_instances': True,
+        'strict': True
+    },
+}
+
+
+def make_program(required=None, forbidden=None, weak=None, min_confidence=None,
+                 ambiguity_margin=None, count_from_instances=False, strict=False):
+    return {
+        'required': [[k.lower() for k in group] for group in (required or []) if group],
+        'forbidden': [k.lower() for k in (forbidden or [])],
+        'weak': [k.lower() for k in (weak or [])],
+        'min_confidence': RULES_MIN_CONFIDENCE if min_confidence is None else float(min_confidence),
+        'ambiguity_margin': RULES_AMBIGUITY_MARGIN if ambiguity_margin is None else float(ambiguity_margin),
+        'count_from_instances': bool(count_from_instances),
+        'strict': bool(strict)
+    }
+
+
+def compile_rules(config):
+    """
+    Rule program for a detection config's target
+    Only targets with a template get local answers; anything else (a free-text
+    query) compiles to an empty program, so every frame goes to Bedrock -
+    words guessed from a question can't tell "eating" from "person".
+    """
+    template = RULE_TEMPLATES.get(str(config.get('target') or '').strip().lower())
+    return make_program(**(template or {}))
+
+
+def normalize_program(program):
+    """Validate a program from the AI or a client, None if it isn't usable"""
+    if not isinstance(program, dict):
+        return None
+    try:
+        required = program.get('required') or []
+        # Accept a flat list as a single any-of group
+        if required and all(isinstance(k, str) for k in required):
+            required = [required]
+        if not all(isinstance(group, list) and all(isinstance(k, str) for k in group) for group in required):
+            return None
+        for key in ('forbidden', 'weak'):
+            if not all(isinstance(k, str) for k in program.get(key) or []):
+                return None
+        return make_program(
+            required=required,
+            forbidden=program.get('forbidden'),
+            weak=program.get('weak'),
+            min_confidence=program.get('min_confidence'),
+            ambiguity_margin=program.get('ambiguity_margin'),
+            count_from_instances=program.get('count_from_instances', False),
+            strict=program.get('strict', False)
+        )
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+@lru_cache(maxsize=256)
+def _compiled(program_key):
+    program = json.loads(program_key)
+    classes = {f"required{i}": group for i, group in enumerate(program['required'])}
+    classes['forbidden'] = program['forbidden']
+    classes['weak'] = program['weak']
+    return KeywordMatcher(classes)
+
+
+def program_matcher(program):
+    """Keyword matcher for a program's groups (compiled once per distinct program)"""
+    return _compiled(json.dumps(program, sort_keys=True))
+
+
+def evaluate(program, labels_data):
+    """
+    Run a program over one frame's labels ({'name', 'confidence', 'instances'} dicts)
+    Returns {'decision': 'yes' | 'no' | 'ambiguous', 'count', 'matched'}
+    """
+    min_confidence = program['min_confidence']
+    sure_confidence = min_confidence + program['ambiguity_margin']
+
+    if not program['required']:
+        return {'decision': 'ambiguous', 'count': 0, 'matched': []}
+
+    # One scan over all labels, then per-class index lists
+    classified = program_matcher(program).classify_frame([l['name'] for l in labels_data])
+
+    def confident(class_name):
+        return [labels_data[i] for i in classified.get(class_name, [])
+                if labels_data[i]['confidence'] >= min_confidence]
+
+    forbidden = [l['name'] for l in confident('forbidden')]
+    weak = classified.get('weak')
+
+    group_matches = []
+    borderline = False
+    for i in range(len(program['required'])):
+        hits = [(l['name'], l['confidence'], l.get('instances', 0)) for l in confident(f"required{i}")]
+        group_matches.append(hits)
+        if hits and max(confidence for _, confidence, _ in hits) < sure_confidence:
+            borderline = True
+
+    matched = [name for hits in group_matches for name, _, _ in hits]
+
+    if forbidden:
+        return {'decision': 'no', 'count': 0, 'matched': forbidden}
+
+    if all(group_matches):
+        if borderline:
+            return {'decision': 'ambiguous', 'count': 0, 'matched': matched}
+        if program['count_from_instances']:
+            count = sum(max(instances, 1) for _, _, instances in group_matches[-1])
+        else:
+            count = 1
+        return {'decision': 'yes', 'count': count, 'matched': matched}
+
+    if weak or not program['strict']:
+        return {'decision': 'ambiguous', 'count': 0, 'matched': matched}
+    return {'decision': 'no', 'count': 0, 'matched': matched}
+
+
+def rule_answer(result, mode='Detection'):
+    """Answer text in the same style as the Bedrock/fallback answers"""
+    if result['decision'] == 'yes':
+        if mode == 'Counting':
+            return f"{result['count']} ({', '.join(result['matched'])})"
+        return f"Yes - {', '.join(result['matched'])} detected"
+    return "No"
@@ -0,0 +1,248 @@
+"""
+Columnar per-frame label store for StreamBet
+Every analysis pass saves the Rekognition labels it saw for a video as
+NumPy columns in one .npz per (video content, pass):
+
+    timestamps     float64 (frames,)        frame times in seconds
+    offsets        int32   (frames + 1,)    frame i's labels are rows offsets[i]:offsets[i+1]
+    label_ids      int32   (rows,)          index into vocabulary
+    confidences    float32 (rows,)
+    instances      int32   (rows,)
+    vocabulary     str     (labels,)        distinct label names
+
+evaluate() runs a label_rules program over every frame at once: keywords
+are matched against the vocabulary (a few hundred names) instead of every
+label of every frame, and the per-frame decisions are array reductions.
+A new query on an already-labeled video costs no Rekognition calls.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are only serialized within a process
+    fcntl = None
+
+import numpy as np
+
+import label_rules
+
+LABEL_STORE_DIR = os.getenv('LABEL_STORE_DIR', os.path.join('cache', 'label_store'))
+
+# Stores kept loaded per process
+LABEL_STORE_MAX_VIDEOS = int(os.getenv('LABEL_STORE_MAX_VIDEOS', '32'))
+
+NO, YES, AMBIGUOUS = 0, 1, 2
+DECISIONS = ('no', 'yes', 'ambiguous')
+
+
+class LabelStore:
+    """One video's labels as columns; see the module docstring for the layout"""
+
+    def __init__(self, timestamps, offsets, label_ids, confidences, instances, vocabulary):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.label_ids = np.asarray(label_ids, dtype=np.int32)
+        self.confidences = np.asarray(confidences, dtype=np.float32)
+        self.instances = np.asarray(instances, dtype=np.int32)
+        self.vocabulary = [str(name) for name in vocabulary]
+        # Frame index of every label row, for per-frame reductions
+        self.row_frames = np.repeat(np.arange(len(self.timestamps)), np.diff(self.offsets))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Build from [(timestamp, labels_data)] with labels_data as in stream_counter"""
+        frames = sorted(frames, key=lambda frame: frame[0])
+        vocabulary, index = [], {}
+        offsets, label_ids, confidences, instances = [0], [], [], []
+        for _, labels_data in frames:
+            for label in labels_data:
+                if label['name'] not in index:
+                    index[label['name']] = len(vocabulary)
+                    vocabulary.append(label['name'])
+                label_ids.append(index[label['name']])
+                confidences.append(label['confidence'])
+                instances.append(label.get('instances', 0))
+            offsets.append(len(label_ids))
+        return cls([t for t, _ in frames], offsets, label_ids, confidences, instances, vocabulary)
+
+    def frames(self):
+        """[(timestamp, labels_data)] back out of the columns"""
+        result = []
+        for i, timestamp in enumerate(self.timestamps):
+            rows = range(self.offsets[i], self.offsets[i + 1])
+            result.append((float(timestamp), [{
+                'name': self.vocabulary[self.label_ids[r]],
+                'confidence': float(self.confidences[r]),
+                'instances': int(self.instances[r])
+            } for r in rows]))
+        return result
+
+    def merged(self, other):
+        """This store plus other's frames; other wins where both have a timestamp"""
+        frames = {round(t, 3): (t, labels) for t, labels in self.frames()}
+        frames.update({round(t, 3): (t, labels) for t, labels in other.frames()})
+        return LabelStore.from_frames(list(frames.values()))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(
+                f,
+                timestamps=self.timestamps, offsets=self.offsets, label_ids=self.label_ids,
+                confidences=self.confidences, instances=self.instances,
+                vocabulary=np.array(self.vocabulary, dtype=str)
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['timestamps'], data['offsets'], data['label_ids'],
+                       data['confidences'], data['instances'], data['vocabulary'])
+
+    def _per_frame(self, rows, weights=None):
+        return np.bincount(self.row_frames[rows], weights=None if weights is None else weights[rows],
+                           minlength=len(self))
+
+    def evaluate(self, program):
+        """
+        label_rules.evaluate over every frame at once
+        Returns (decisions, counts): int8 NO/YES/AMBIGUOUS and int32 arrays per frame
+        """
+        n = len(self)
+        decisions = np.full(n, AMBIGUOUS, dtype=np.int8)
+        counts = np.zeros(n, dtype=np.int32)
+        if not program['required'] or not n:
+            return decisions, counts
+
+        min_confidence = program['min_confidence']
+        sure_confidence = min_confidence + program['ambiguity_margin']
+        confident = self.confidences >= min_confidence
+
+        # Keyword matching once per distinct label name, then looked up per row
+        classified = label_rules.program_matcher(program).classify_frame(self.vocabulary)
+
+        def rows_in(class_name):
+            in_class = np.zeros(len(self.vocabulary), dtype=bool)
+            in_class[classified.get(class_name, [])] = True
+            return in_class[self.label_ids]
+
+        forbidden = self._per_frame(rows_in('forbidden') & confident) > 0
+        weak = self._per_frame(rows_in('weak')) > 0
+
+        all_groups = np.ones(n, dtype=bool)
+        borderline = np.zeros(n, dtype=bool)
+        last_group = None
+        for i in range(len(program['required'])):
+            hits = rows_in(f"required{i}") & confident
+            has = self._per_frame(hits) > 0
+            best = np.full(n, -np.inf)
+            np.maximum.at(best, self.row_frames[hits], self.confidences[hits])
+            borderline |= has & (best < sure_confidence)
+            all_groups &= has
+            last_group = hits
+
+        yes = all_groups & ~borderline
+        if program['count_from_instances']:
+            instance_counts = np.maximum(self.instances, 1).astype(np.float64)
+            counts[yes] = self._per_frame(last_group, instance_counts)[yes].astype(np.int32)
+        else:
+            counts[yes] = 1
+
+        decisions[:] = NO if program['strict'] else AMBIGUOUS
+        decisions[weak] = AMBIGUOUS
+        decisions[all_groups & borderline] = AMBIGUOUS
+        decisions[yes] = YES
+        decisions[forbidden] = NO
+        counts[forbidden] = 0
+        return decisions, counts
+
+    def matched(self, program, frame):
+        """Label names behind a 'yes' frame, in label_rules.evaluate's order"""
+        names = [self.vocabulary[i] for i in self.label_ids[self.offsets[frame]:self.offsets[frame + 1]]]
+        confidences = self.confidences[self.offsets[frame]:self.offsets[frame + 1]]
+        classified = label_rules.program_matcher(program).classify_frame(names)
+        return [names[j] for i in range(len(program['required']))
+                for j in classified.get(f"required{i}", []) if confidences[j] >= program['min_confidence']]
+
+
+def store_path(content_hash, analysis_pass):
+    return os.path.join(LABEL_STORE_DIR, f"{content_hash}_{analysis_pass}.npz")
+
+
+_stores = OrderedDict()  # path -> (mtime, LabelStore)
+_stores_lock = threading.Lock()
+_save_locks = {}  # path -> lock held across a save's load/merge/replace
+
+
+@contextmanager
+def _saving(path):
+    """
+    One load/merge/save per store at a time - otherwise the prewarm and a
+    stream finishing together each merge into the old file and the last
+    os.replace drops the other's frames. The directory flock covers workers.
+    """
+    with _stores_lock:
+        lock = _save_locks.setdefault(path, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+
+def get_label_store(content_hash, analysis_pass):
+    """Saved store for a video + pass, None if it hasn't been labeled"""
+    path = store_path(content_hash, analysis_pass)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _stores_lock:
+        entry = _stores.get(path)
+        if entry and entry[0] == mtime:
+            _stores.move_to_end(path)
+            return entry[1]
+    try:
+        store = LabelStore.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Could not load label store: {e}")
+        return None
+    with _stores_lock:
+        _stores[path] = (mtime, store)
+        while len(_stores) > LABEL_STORE_MAX_VIDEOS:
+            _stores.popitem(last=False)
+    return store
+
+
+def save_labels(content_hash, analysis_pass, frames):
+    """Add a pass's [(timestamp, labels_data)] to the video's store"""
+    if not LABEL_STORE_DIR or not frames:
+        return None
+    store = LabelStore.from_frames(frames)
+    path = store_path(content_hash, analysis_pass)
+    try:
+        with _saving(path):
+            existing = get_label_store(content_hash, analysis_pass)
+            if existing is not None:
+                store = existing.merged(store)
+            store.save(path)
+    except OSError as e:
+        print(f"⚠️ Could not save label store: {e}")
+        return None
+    print(f"🗃️ Label store: {len(store)} frames, {len(store.vocabulary)} distinct labels")
+    return store
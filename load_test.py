@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Concurrent SSE load test for StreamBet
+Opens many EventSource-style connections at once (raw HTTP over asyncio,
+no client library per stream) and reports how many the server held open,
+time to first event, and how many ran to completion.
+
+    python load_test.py --streams 1000
+    python load_test.py --url http://localhost:5000 --path "/api/stream-counter?video_path=/uploads/x.mp4&query=people"
+    python load_test.py --streams 2000 --ramp 10 --hold 60
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+
+DEFAULT_PATH = '/api/stream-counter?video_path=/uploads/test.mp4&query=How+many+people%3F&refine=false'
+
+
+class StreamResult:
+    def __init__(self):
+        self.connected_at = None
+        self.first_event_at = None
+        self.events = 0
+        self.completed = False
+        self.error = None
+
+
+async def run_stream(host, port, path, started, hold, result, open_streams, peak):
+    """One SSE client: send the request, count data: events until complete/hold/EOF"""
+    writer = None
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            f"Accept: text/event-stream\r\n"
+            f"Cache-Control: no-cache\r\n"
+            f"Connection: close\r\n\r\n"
+        )
+        writer.write(request.encode())
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if b' 200 ' not in status_line:
+            result.error = status_line.decode(errors='replace').strip() or 'no response'
+            return
+        result.connected_at = time.perf_counter() - started
+        open_streams[0] += 1
+        peak[0] = max(peak[0], open_streams[0])
+
+        deadline = time.perf_counter() + hold
+        try:
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                line = await asyncio.wait_for(reader.readline(), timeout=remaining)
+                if not line:
+                    break
+                # Chunked transfer framing lines are skipped, only SSE payloads count
+                if line.startswith(b'data: '):
+                    result.events += 1
+                    if result.first_event_at is None:
+                        result.first_event_at = time.perf_counter() - started
+                    try:
+                        event = json.loads(line[6:])
+                    except ValueError:
+                        continue
+                    if event.get('type') == 'complete':
+                        result.completed = True
+                        break
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            open_streams[0] -= 1
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    finally:
+        if writer:
+            writer.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def load_test(args):
+    parts = urlsplit(args.url)
+    host, port = parts.hostname, parts.port or 80
+    results = [StreamResult() for _ in range(args.streams)]
+    open_streams, peak = [0], [0]
+    started = time.perf_counter()
+
+    tasks = []
+    for i, result in enumerate(results):
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.streams)
+        tasks.append(asyncio.create_task(
+            run_stream(host, port, args.path, started, args.hold, result, open_streams, peak)
+        ))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    connected = [r for r in results if r.connected_at is not None]
+    first_events = [r.first_event_at - r.connected_at for r in connected if r.first_event_at is not None]
+    errors = {}
+    for r in results:
+        if r.error:
+            errors[r.error] = errors.get(r.error, 0) + 1
+
+    print(f"\n📊 SSE load test - {args.streams} streams → {args.url}{args.path[:60]}")
+    print("=" * 60)
+    print(f"{'connected':>18}: {len(connected)}/{args.streams}")
+    print(f"{'peak concurrent':>18}: {peak[0]}")
+    print(f"{'got first event':>18}: {len(first_events)}")
+    print(f"{'completed':>18}: {sum(r.completed for r in results)}")
+    print(f"{'events':>18}: {sum(r.events for r in results)}")
+    if first_events:
+        print(f"{'first event p50':>18}: {percentile(first_events, 0.5) * 1000:.0f} ms")
+        print(f"{'first event p95':>18}: {percentile(first_events, 0.95) * 1000:.0f} ms")
+        print(f"{'first event max':>18}: {max(first_events) * 1000:.0f} ms")
+    print(f"{'wall time':>18}: {elapsed:.1f}s")
+    for error, count in sorted(errors.items(), key=lambda e: -e[1])[:5]:
+        print(f"⚠️  {count} x {error}")
+    return 0 if len(connected) == args.streams else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='StreamBet concurrent SSE load test')
+    parser.add_argument('--url', default='http://localhost:5000', help='Server base URL')
+    parser.add_argument('--path', default=DEFAULT_PATH, help='SSE endpoint path + query')
+    parser.add_argument('--streams', type=int, default=500, help='Concurrent EventSource clients')
+    parser.add_argument('--ramp', type=float, default=0, help='Seconds to spread connection opens over')
+    parser.add_argument('--hold', type=float, default=30, help='Seconds to keep each stream open at most')
+    args = parser.parse_args()
+    return asyncio.run(load_test(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Multi-process video decode for StreamBet
+Splits the sampled frame indices into contiguous time segments, decodes each
+segment in its own process (own VideoCapture, one seek to the segment start)
+and hands the JPEGs back through shared memory instead of pickling them
+"""
+
+import os
+import bisect
+import threading
+from multiprocessing import get_context, shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+from video_frames import open_video, read_sparse, encode_frame, frame_interval_for, sample_indices
+from video_meta import get_metadata, get_keyframes
+
+# Worker processes (default: one per core)
+PARALLEL_DECODE_WORKERS = int(os.getenv('PARALLEL_DECODE_WORKERS', '0')) or os.cpu_count() or 1
+
+# extract_frames only goes parallel for videos at least this long
+PARALLEL_DECODE_MIN_SECONDS = float(os.getenv('PARALLEL_DECODE_MIN_SECONDS', '120'))
+
+# Segments per worker, so one slow segment doesn't leave the others idle
+SEGMENTS_PER_WORKER = 2
+
+
+def decode_segment(video_path, indices, profile=None):
+    """
+    Worker: decode + encode one segment's frames into a new shared memory block
+    Returns (block name, [(frame_index, offset, length), ...]), the caller unlinks the block
+    """
+    cap, _, _ = open_video(video_path)
+    if cap is None:
+        return None, []
+
+    encoded = []
+    try:
+        # position=None: the first read seeks straight to the segment start
+        for frame_index, frame in read_sparse(cap, indices, position=None):
+            encoded.append((frame_index, encode_frame(frame, profile)))
+    finally:
+        cap.release()
+
+    total = sum(len(data) for _, data in encoded)
+    if not total:
+        return None, []
+
+    block = shared_memory.SharedMemory(create=True, size=total)
+    layout = []
+    offset = 0
+    for frame_index, data in encoded:
+        block.buf[offset:offset + len(data)] = data
+        layout.append((frame_index, offset, len(data)))
+        offset += len(data)
+    name = block.name
+    block.close()
+    return name, layout
+
+
+def split_segments(indices, segments, keyframes=None):
+    """
+    Cut a list of frame indices into up to `segments` contiguous chunks
+    With keyframe frame numbers, each cut moves (by less than half a chunk) to
+    the first sample after a keyframe, so a worker's opening seek decodes
+    from that keyframe instead of through frames before its segment.
+    """
+    segments = max(1, min(segments, len(indices)))
+    size = -(-len(indices) // segments)
+    cuts = list(range(size, len(indices), size))
+    if keyframes:
+        # Positions whose sample is the first one at or after a keyframe
+        aligned = sorted({bisect.bisect_left(indices, k) for k in keyframes} - {0, len(indices)})
+        for i, cut in enumerate(cuts):
+            nearest = bisect.bisect_left(aligned, cut)
+            options = [p for p in aligned[max(0, nearest - 1):nearest + 1] if abs(p - cut) < size / 2]
+            if options:
+                cuts[i] = min(options, key=lambda p: abs(p - cut))
+    bounds = [0] + sorted(set(cuts)) + [len(indices)]
+    return [indices[start:end] for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers):
+    """Process pool shared across requests (spawned once, OpenCV isn't fork-safe)"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+
+def extract_frames_parallel(video_path, fps=1, profile=None, workers=None):
+    """
+    Same output as video_frames.extract_frames, decoded across processes
+    Returns list of (timestamp, frame_data) tuples in timestamp order
+    """
+    workers = workers or PARALLEL_DECODE_WORKERS
+    metadata = get_metadata(video_path)
+    if metadata is None:
+        return []
+    video_fps = metadata['fps']
+    total_frames = metadata['frame_count']
+    if video_fps <= 0 or total_frames <= 0:
+        return []
+
+    indices = list(sample_indices(total_frames, frame_interval_for(video_fps, fps)))
+    keyframes = get_keyframes(video_path)
+    segments = split_segments(indices, workers * SEGMENTS_PER_WORKER,
+                              [int(round(t * video_fps)) for t in keyframes] if keyframes else None)
+    print(f"🎬 Decoding {len(indices)} frames in {len(segments)} segments on {workers} processes...")
+
+    executor = get_executor(workers)
+    futures = [executor.submit(decode_segment, video_path, segment, profile) for segment in segments]
+
+    frames = []
+    error = None
+    for future in futures:
+        try:
+            name, layout = future.result()
+        except Exception as e:
+            # Keep draining so the other segments' blocks still get unlinked
+            error = error or e
+            continue
+        if name is None:
+            continue
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            if error is None:
+                for frame_index, offset, length in layout:
+                    frames.append((frame_index / video_fps, bytes(block.buf[offset:offset + length])))
+        finally:
+            block.close()
+            block.unlink()
+
+    if error:
+        raise error
+    return frames
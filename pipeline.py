@@ -0,0 +1,33 @@
+"""
+Concurrency helpers for the StreamBet analysis pipeline
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def ordered_map(func, items, workers=4, window=None):
+    """
+    Run func over items on a bounded thread pool, keeping up to `window`
+    calls in flight, and yield (item, future) pairs in input order.
+
+    The caller reads future.result() (which re-raises the worker's
+    exception), so per-item error handling stays in the consuming loop.
+    At most `window` items are pulled from the source ahead of the
+    consumer, so a lazy frame source is never drained eagerly.
+    """
+    workers = max(1, workers)
+    window = max(workers, window or workers)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+
+    try:
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= window:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+    finally:
+        # Client disconnected or loop finished - drop queued work
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,153 @@
+"""
+Eager background analysis for StreamBet uploads
+/upload enqueues a prewarm job that probes the video, decodes it with the
+sampling /api/stream-counter uses and sends every frame to Rekognition
+through the label cache. By the time a viewer opens the stream its labels
+are cached, so results come back without waiting on AWS.
+
+Jobs run on PREWARM_WORKERS background threads from a bounded priority
+queue: uploads are served in arrival order, a video somebody is already
+streaming moves to the front (promote), and uploads arriving while
+PREWARM_QUEUE_MAX jobs are waiting are skipped - their stream analyzes
+them as before.
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+
+PREWARM_ENABLED = os.getenv('PREWARM_ENABLED', 'true').lower() == 'true'
+PREWARM_WORKERS = int(os.getenv('PREWARM_WORKERS', '1'))
+
+# Rekognition calls in flight per prewarm job
+PREWARM_CONCURRENCY = int(os.getenv('PREWARM_CONCURRENCY', '4'))
+
+PREWARM_QUEUE_MAX = int(os.getenv('PREWARM_QUEUE_MAX', '32'))
+
+# Lower runs first
+PRIORITY_WAITING = 0  # A viewer is streaming this video right now
+PRIORITY_UPLOAD = 10
+
+
+class Prewarmer:
+    """
+    Bounded priority queue of videos to analyze ahead of time
+    warm(path) does the work; entries are [priority, seq, path] and a
+    promoted entry is re-pushed with the old one blanked (lazy deletion).
+    """
+
+    def __init__(self, warm, workers=PREWARM_WORKERS, max_queued=PREWARM_QUEUE_MAX):
+        self.warm = warm
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self._heap = []
+        self._queued = {}  # abspath -> heap entry
+        self._running = set()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self.submitted = 0
+        self.skipped = 0
+        self.promoted = 0
+        self.completed = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    def _start(self):
+        """Start the workers on first use (caller holds _cond)"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._loop, name=f"prewarm-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, path, priority=PRIORITY_UPLOAD):
+        """Queue a video; 'queued', 'running' (already) or 'skipped' (queue full)"""
+        key = os.path.abspath(path)
+        with self._cond:
+            if key in self._running:
+                return 'running'
+            if key in self._queued:
+                return 'queued'
+            if len(self._queued) >= self.max_queued:
+                self.skipped += 1
+                print(f"⚠️ Prewarm queue full, skipping {os.path.basename(path)}")
+                return 'skipped'
+            entry = [priority, next(self._seq), path]
+            self._queued[key] = entry
+            heapq.heappush(self._heap, entry)
+            self.submitted += 1
+            self._start()
+            self._cond.notify()
+        return 'queued'
+
+    def promote(self, path):
+        """Move a still-queued video to the front, True if it was waiting"""
+        key = os.path.abspath(path)
+        with self._cond:
+            entry = self._queued.get(key)
+            if entry is None or entry[0] <= PRIORITY_WAITING:
+                return False
+            entry[2] = None
+            promoted = [PRIORITY_WAITING, next(self._seq), path]
+            self._queued[key] = promoted
+            heapq.heappush(self._heap, promoted)
+            self.promoted += 1
+            self._cond.notify()
+        return True
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, path = heapq.heappop(self._heap)
+                if path is None:
+                    continue  # Superseded by a promoted entry
+                key = os.path.abspath(path)
+                self._queued.pop(key, None)
+                self._running.add(key)
+
+            started = time.perf_counter()
+            try:
+                self.warm(path)
+                ok = True
+            except Exception as e:
+                print(f"❌ Prewarm failed for {os.path.basename(path)}: {e}")
+                ok = False
+            with self._cond:
+                self._running.discard(key)
+                self.seconds += time.perf_counter() - started
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'enabled': PREWARM_ENABLED,
+                'workers': self.workers,
+                'queued': len(self._queued),
+                'running': len(self._running),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'promoted': self.promoted,
+                'seconds': round(self.seconds, 2)
+            }
+
+
+_prewarmer = None
+_prewarmer_lock = threading.Lock()
+
+
+def get_prewarmer(warm):
+    """Process-wide prewarmer (warm is fixed by the first call)"""
+    global _prewarmer
+    with _prewarmer_lock:
+        if _prewarmer is None:
+            _prewarmer = Prewarmer(warm)
+        return _prewarmer
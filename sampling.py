@@ -0,0 +1,154 @@
+"""
+Motion-adaptive frame sampling for StreamBet
+Scores cheap low-res frames by frame-difference energy and picks which
+ones to send to Rekognition: dense during action, sparse when idle
+"""
+
+import os
+import math
+
+import cv2
+
+from video_frames import read_sparse, read_dense, frame_interval_for, sample_indices, encode_frame
+
+# 'motion' uses MotionScheduler, 'fixed' keeps each endpoint's old fixed rate
+SAMPLING_MODE = os.getenv('SAMPLING_MODE', 'motion').lower()
+
+# Rate at which low-res frames are scored for motion (never sent anywhere)
+MOTION_SCAN_FPS = float(os.getenv('MOTION_SCAN_FPS', '4'))
+MOTION_THUMB_WIDTH = 160
+
+# Sampling interval range in seconds: MIN during high motion, MAX when idle
+MOTION_MIN_INTERVAL = float(os.getenv('MOTION_MIN_INTERVAL', '0.5'))
+MOTION_MAX_INTERVAL = float(os.getenv('MOTION_MAX_INTERVAL', '5'))
+
+# Mean absolute pixel difference (0-255) between scanned thumbnails
+MOTION_LOW = float(os.getenv('MOTION_LOW', '2'))
+MOTION_HIGH = float(os.getenv('MOTION_HIGH', '12'))
+
+# Max Rekognition calls per video
+SAMPLING_CALL_BUDGET = int(os.getenv('SAMPLING_CALL_BUDGET', '60'))
+
+
+def thumbnail(frame):
+    """Small grayscale copy of a frame for motion scoring"""
+    height, width = frame.shape[:2]
+    size = (MOTION_THUMB_WIDTH, max(1, int(height * MOTION_THUMB_WIDTH / width)))
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+def motion_energy(previous, current):
+    """Mean absolute difference between two thumbnails"""
+    if previous is None:
+        return 0.0
+    return float(cv2.absdiff(previous, current).mean())
+
+
+class MotionScheduler:
+    """
+    Decides which scanned frames get a remote label call
+    The interval shrinks from max_interval to min_interval as motion energy
+    rises, and is stretched whenever the remaining budget would not cover
+    the rest of the video at the idle rate. Calls made outside the coarse
+    pass (stream-counter refinement) are charged to the same budget.
+    """
+
+    def __init__(self, budget=SAMPLING_CALL_BUDGET, min_interval=MOTION_MIN_INTERVAL,
+                 max_interval=MOTION_MAX_INTERVAL, scan_fps=MOTION_SCAN_FPS):
+        self.budget = max(1, budget)
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.scan_fps = scan_fps
+        self.duration = 0
+        self.scanned = 0
+        self.samples = 0
+        self.charged = 0  # Extra calls charged from another thread (charge())
+        self.last_sample = None
+        self.peak_energy = 0.0
+
+    def interval_for(self, energy, timestamp):
+        """Seconds to wait after the last sample, given the current motion"""
+        level = min(1.0, max(0.0, (energy - MOTION_LOW) / max(1e-6, MOTION_HIGH - MOTION_LOW)))
+        interval = self.max_interval - level * (self.max_interval - self.min_interval)
+
+        # Keep enough budget to cover the rest of the video at the idle rate
+        remaining_budget = self.remaining()
+        remaining_time = max(0.0, self.duration - timestamp)
+        if remaining_budget > 0 and remaining_budget < remaining_time / self.max_interval:
+            interval = max(interval, remaining_time / remaining_budget)
+        return interval
+
+    def should_sample(self, timestamp, energy):
+        self.scanned += 1
+        self.peak_energy = max(self.peak_energy, energy)
+        if self.remaining() <= 0:
+            return False
+        if self.last_sample is None or timestamp - self.last_sample >= self.interval_for(energy, timestamp):
+            self.samples += 1
+            self.last_sample = timestamp
+            return True
+        return False
+
+    def remaining(self):
+        """Calls left in the budget"""
+        return self.budget - self.samples - self.charged
+
+    def charge(self, calls):
+        """Take up to calls from the remaining budget, returns how many were granted"""
+        granted = max(0, min(calls, self.remaining()))
+        self.charged += granted
+        return granted
+
+    def expected_count(self):
+        """Projected number of samples, for progress reporting"""
+        if not self.duration:
+            # Unknown length (no duration in the metadata): the budget is the most it can be
+            return max(self.samples, self.budget)
+        if self.last_sample is None:
+            projected = self.duration / self.max_interval
+        else:
+            average_interval = max(self.min_interval, self.last_sample / max(1, self.samples - 1))
+            projected = self.samples + (self.duration - self.last_sample) / average_interval
+        return max(self.samples, min(self.budget, int(math.ceil(projected))))
+
+    def iter_frames(self, cap, video_fps, total_frames, profile=None):
+        """
+        Single decode pass: scan at scan_fps, score motion on thumbnails,
+        encode only the frames the scheduler picks
+        Yields (timestamp, frame_data) tuples
+        """
+        self.duration = total_frames / video_fps if video_fps > 0 else 0
+        scan_interval = frame_interval_for(video_fps, self.scan_fps)
+        previous = None
+
+        if total_frames > 0:
+            source = read_sparse(cap, sample_indices(total_frames, scan_interval))
+        else:
+            source = read_dense(cap, scan_interval)
+
+        for frame_index, frame in source:
+            timestamp = frame_index / video_fps if video_fps > 0 else frame_index
+            current = thumbnail(frame)
+            energy = motion_energy(previous, current)
+            previous = current
+
+            if self.should_sample(timestamp, energy):
+                yield timestamp, encode_frame(frame, profile)
+
+    def stats(self):
+        return {
+            'mode': 'motion',
+            'budget': self.budget,
+            'rekognition_calls': self.samples + self.charged,
+            'charged_calls': self.charged,
+            'frames_scanned': self.scanned,
+            'peak_motion': round(self.peak_energy, 2)
+        }
+
+
+def make_scheduler(budget=None):
+    """Scheduler for one video, or None when SAMPLING_MODE=fixed"""
+    if SAMPLING_MODE != 'motion':
+        return None
+    return MotionScheduler(budget=budget or SAMPLING_CALL_BUDGET)
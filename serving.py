@@ -0,0 +1,100 @@
+"""
+Cooperative serving support for StreamBet (gunicorn gevent workers)
+Under SERVING_MODE=gevent (see gunicorn.conf.py) every open EventSource is
+a greenlet instead of a whole sync worker, so one process can hold
+thousands of mostly idle streams. Two bounded executors keep the event
+loop responsive:
+
+    offload_io   AWS / HTTP calls, on a pool of AWS_EXECUTOR_WORKERS greenlets
+    offload_cpu  OpenCV decode + JPEG encode, on CPU_EXECUTOR_WORKERS native threads
+
+With sync workers (no monkey patching) both are plain function calls.
+"""
+
+import os
+import threading
+
+AWS_EXECUTOR_WORKERS = int(os.getenv('AWS_EXECUTOR_WORKERS', '64'))
+CPU_EXECUTOR_WORKERS = int(os.getenv('CPU_EXECUTOR_WORKERS', str(os.cpu_count() or 2)))
+
+_pools = {}
+_pools_lock = threading.Lock()
+_counters = {'io_calls': 0, 'cpu_calls': 0}
+
+
+def cooperative():
+    """True when running inside a gevent-patched worker"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def _pool(kind):
+    with _pools_lock:
+        if kind not in _pools:
+            if kind == 'io':
+                from gevent.pool import Pool
+                _pools[kind] = Pool(AWS_EXECUTOR_WORKERS)
+            else:
+                from gevent.threadpool import ThreadPool
+                _pools[kind] = ThreadPool(CPU_EXECUTOR_WORKERS)
+        return _pools[kind]
+
+
+def offload_io(fn, *args, **kwargs):
+    """Run a network call on the bounded I/O pool (waits for a free slot)"""
+    if not cooperative():
+        return fn(*args, **kwargs)
+    _counters['io_calls'] += 1
+    return _pool('io').apply(fn, args, kwargs)
+
+
+def offload_cpu(fn, *args, **kwargs):
+    """Run blocking C code (decode, encode) on a native thread, yielding to other greenlets"""
+    if not cooperative():
+        return fn(*args, **kwargs)
+    _counters['cpu_calls'] += 1
+    return _pool('cpu').apply(fn, args, kwargs)
+
+
+class BoundedClient:
+    """
+    Wraps a boto3 (or any SDK) client so every method call goes through
+    offload_io. Attributes that aren't callables pass straight through.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+
+        def call(*args, **kwargs):
+            return offload_io(attribute, *args, **kwargs)
+        return call
+
+
+def bounded(client):
+    return BoundedClient(client) if client is not None else None
+
+
+def stats():
+    """Serving mode and executor load for /api/health-style reporting"""
+    result = {'mode': 'gevent' if cooperative() else 'sync'}
+    if result['mode'] == 'gevent':
+        with _pools_lock:
+            pools = dict(_pools)
+        io_pool, cpu_pool = pools.get('io'), pools.get('cpu')
+        result.update({
+            'io_workers': AWS_EXECUTOR_WORKERS,
+            'io_in_flight': len(io_pool) if io_pool is not None else 0,
+            'cpu_workers': CPU_EXECUTOR_WORKERS,
+            'cpu_queued': len(cpu_pool) if cpu_pool is not None else 0,
+            'io_calls': _counters['io_calls'],
+            'cpu_calls': _counters['cpu_calls']
+        })
+    return result
@@ -0,0 +1,268 @@
+"""
+Disk budget for StreamBet's upload and audio folders
+Uploads, screenshots and commentary mp3s are evicted least-recently-used
+first once the folders grow past STORAGE_BUDGET_BYTES. Access times and
+reference counts live in a small SQLite file, so every gunicorn worker sees
+the same LRU order and nobody deletes a video another worker is analyzing.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+STORAGE_JANITOR_ENABLED = os.getenv('STORAGE_JANITOR_ENABLED', 'true').lower() == 'true'
+STORAGE_BUDGET_BYTES = int(float(os.getenv('STORAGE_BUDGET_MB', '2048')) * 1024 * 1024)
+
+# Evict down to this fraction of the budget, so sweeps don't run on every new file
+STORAGE_LOW_WATERMARK = float(os.getenv('STORAGE_LOW_WATERMARK', '0.9'))
+
+STORAGE_SWEEP_INTERVAL = float(os.getenv('STORAGE_SWEEP_INTERVAL', '60'))
+
+# Files younger than this are never evicted (just written, not referenced yet)
+STORAGE_MIN_AGE = float(os.getenv('STORAGE_MIN_AGE', '300'))
+
+# Access times are recorded at most this often per file
+STORAGE_TOUCH_RESOLUTION = float(os.getenv('STORAGE_TOUCH_RESOLUTION', '30'))
+
+STORAGE_DB_PATH = os.getenv('STORAGE_DB_PATH', os.path.join('cache', 'storage.sqlite3'))
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class StorageJanitor:
+    """
+    LRU-by-access eviction over a set of directories
+    touch() records a use, acquire()/release() (or in_use()) pin a file
+    while an analysis reads it, sweep() evicts until under budget.
+    """
+
+    def __init__(self, roots, budget_bytes=STORAGE_BUDGET_BYTES, db_path=STORAGE_DB_PATH,
+                 low_watermark=STORAGE_LOW_WATERMARK, min_age=STORAGE_MIN_AGE):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.budget_bytes = budget_bytes
+        self.low_watermark = low_watermark
+        self.min_age = min_age
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.sweeps = 0
+        self.last_sweep = None
+        self._refs = {}  # path -> count held by this process
+        self._touched = {}  # path -> last recorded access (throttles writes)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS access (path TEXT PRIMARY KEY, last_access REAL NOT NULL)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS refs ('
+            'path TEXT NOT NULL, pid INTEGER NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (path, pid))'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    def touch(self, path):
+        """Record a use of path (upload, serve, cache hit)"""
+        key = self._key(path)
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(key, 0) < STORAGE_TOUCH_RESOLUTION:
+                return
+            self._touched[key] = now
+            self._conn.execute('INSERT OR REPLACE INTO access (path, last_access) VALUES (?, ?)', (key, now))
+            self._conn.commit()
+
+    def acquire(self, path):
+        """Pin path until the matching release()"""
+        key = self._key(path)
+        with self._lock:
+            self._refs[key] = self._refs.get(key, 0) + 1
+            self._conn.execute(
+                'INSERT OR REPLACE INTO refs (path, pid, count) VALUES (?, ?, ?)', (key, os.getpid(), self._refs[key])
+            )
+            self._conn.commit()
+        self.touch(path)
+
+    def release(self, path):
+        key = self._key(path)
+        with self._lock:
+            count = self._refs.get(key, 0) - 1
+            if count > 0:
+                self._refs[key] = count
+                self._conn.execute('UPDATE refs SET count = ? WHERE path = ? AND pid = ?', (count, key, os.getpid()))
+            else:
+                self._refs.pop(key, None)
+                self._conn.execute('DELETE FROM refs WHERE path = ? AND pid = ?', (key, os.getpid()))
+            self._conn.commit()
+
+    @contextmanager
+    def in_use(self, path):
+        self.acquire(path)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def _referenced(self):
+        """Paths pinned by any live process (rows of dead workers are dropped)"""
+        rows = self._conn.execute('SELECT path, pid FROM refs').fetchall()
+        dead = {pid for _, pid in rows if not pid_alive(pid)}
+        if dead:
+            self._conn.executemany('DELETE FROM refs WHERE pid = ?', [(pid,) for pid in dead])
+            self._conn.commit()
+        return {path for path, pid in rows if pid not in dead}
+
+    def scan(self):
+        """[(path, size, mtime)] for every file under the roots"""
+        files = []
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    if filename.endswith('.tmp'):
+                        continue  # Being written right now
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((path, stat.st_size, stat.st_mtime))
+        return files
+
+    def sweep(self):
+        """Evict least recently used files until usage is under the low watermark"""
+        started = time.time()
+        files = self.scan()
+        used = sum(size for _, size, _ in files)
+        evicted = []
+        pinned = 0
+
+        if used > self.budget_bytes:
+            target = self.budget_bytes * self.low_watermark
+            with self._lock:
+                access = dict(self._conn.execute('SELECT path, last_access FROM access').fetchall())
+                referenced = self._referenced() | set(self._refs)
+
+            # Never-touched files count as used when they were written
+            def last_used(entry):
+                return max(entry[2], access.get(entry[0], 0))
+
+            for entry in sorted(files, key=last_used):
+                path, size, _ = entry
+                if used <= target:
+                    break
+                if path in referenced:
+                    pinned += 1
+                    continue
+                if started - last_used(entry) < self.min_age:
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"⚠️ Could not evict {path}: {e}")
+                    continue
+                used -= size
+                evicted.append((path, size))
+
+            with self._lock:
+                if evicted:
+                    self._conn.executemany('DELETE FROM access WHERE path = ?', [(path,) for path, _ in evicted])
+                    self._conn.commit()
+                for path, _ in evicted:
+                    self._touched.pop(path, None)
+                self.evicted_files += len(evicted)
+                self.evicted_bytes += sum(size for _, size in evicted)
+
+            freed_mb = sum(size for _, size in evicted) / 1024 / 1024
+            print(f"🧹 Storage over budget: evicted {len(evicted)} files ({freed_mb:.1f} MB), {pinned} in use")
+            if used > self.budget_bytes:
+                print(f"⚠️ Still over storage budget: {used / 1024 / 1024:.1f} MB used")
+
+        with self._lock:
+            self.sweeps += 1
+            self.last_sweep = {
+                'at': started,
+                'seconds': round(time.time() - started, 3),
+                'used_bytes': used,
+                'files': len(files) - len(evicted),
+                'evicted': len(evicted),
+                'pinned': pinned
+            }
+        return self.last_sweep
+
+    def start(self, interval=STORAGE_SWEEP_INTERVAL):
+        """Run sweep() every interval seconds on a daemon thread"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, args=(interval,), name='storage-janitor', daemon=True)
+            self._thread.start()
+
+    def _loop(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️ Storage sweep failed: {e}")
+            self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        """Disk usage per root plus eviction counters"""
+        usage = {}
+        for root in self.roots:
+            usage[root] = {'bytes': 0, 'files': 0}
+        for path, size, _ in self.scan():
+            for root in self.roots:
+                if path.startswith(root + os.sep):
+                    usage[root]['bytes'] += size
+                    usage[root]['files'] += 1
+                    break
+        used = sum(entry['bytes'] for entry in usage.values())
+        with self._lock:
+            return {
+                'enabled': STORAGE_JANITOR_ENABLED,
+                'budget_bytes': self.budget_bytes,
+                'used_bytes': used,
+                'used_percent': round(used / self.budget_bytes * 100, 1) if self.budget_bytes else 0,
+                'roots': usage,
+                'referenced_here': sum(self._refs.values()),
+                'evicted_files': self.evicted_files,
+                'evicted_bytes': self.evicted_bytes,
+                'sweeps': self.sweeps,
+                'last_sweep': self.last_sweep
+            }
+
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+
+def get_storage_janitor(roots=()):
+    """Process-wide janitor for roots (fixed by the first call)"""
+    global _janitor
+    with _janitor_lock:
+        if _janitor is None:
+            _janitor = StorageJanitor(roots)
+        return _janitor
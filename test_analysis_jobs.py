@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Tests for analysis_jobs: shared runs, slow-viewer resync and failed runs
+Run with: python -m pytest test_analysis_jobs.py
+"""
+
+import json
+import os
+import queue
+import time
+
+import pytest
+
+import analysis_jobs
+import event_log
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_log, 'EVENT_LOG_DIR', str(tmp_path))
+    monkeypatch.setattr(analysis_jobs, 'EVENT_LOG_DIR', str(tmp_path))
+    monkeypatch.setattr(analysis_jobs, '_jobs', {})
+    monkeypatch.setattr(analysis_jobs, '_counters', dict.fromkeys(analysis_jobs._counters, 0))
+
+
+def gated():
+    """A produce() whose events are pushed from the test; None ends the run"""
+    gate = queue.Queue()
+
+    def produce():
+        while True:
+            event = gate.get()
+            if event is None:
+                return
+            yield event
+    return gate, produce
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def index(event_id):
+    return int(event_id.rpartition('-')[2])
+
+
+def test_slow_viewer_resyncs_from_history(monkeypatch):
+    monkeypatch.setattr(analysis_jobs, 'JOB_SUBSCRIBER_BUFFER', 2)
+    gate, produce = gated()
+    job = analysis_jobs.AnalysisJob('slow', produce)
+    subscription = job.subscribe()
+    job.start()
+
+    for i in range(2):
+        gate.put({'n': i})
+    wait_for(lambda: len(job.history) == 2)
+    events = subscription.events()
+    assert next(events) == (0, json.dumps({'n': 0}))
+
+    # Five events while the viewer is busy overflow its buffer of two
+    for i in range(2, 7):
+        gate.put({'n': i})
+    gate.put(None)
+    wait_for(lambda: job.finished)
+    assert subscription.resyncs == 1
+
+    rest = list(events)
+    assert [index for index, _ in rest] == list(range(1, 7))
+    assert [json.loads(payload)['n'] for _, payload in rest] == list(range(1, 7))
+    assert job.stats()['subscribers'] == 0
+
+
+def test_late_joiner_replays_then_follows():
+    gate, produce = gated()
+    events, created = analysis_jobs.subscribe('late', produce)
+    assert created
+    gate.put({'n': 0})
+    assert index(next(events)[0]) == 0
+
+    late, created = analysis_jobs.subscribe('late', produce)
+    assert not created
+    gate.put({'n': 1})
+    gate.put(None)
+    assert [index(event_id) for event_id, _ in late] == [0, 1]
+    assert [index(event_id) for event_id, _ in events] == [1]
+
+
+def test_finished_job_is_replayed_without_running_again():
+    runs = []
+
+    def produce():
+        runs.append(1)
+        yield {'type': 'progress'}
+        yield {'type': 'complete'}
+
+    events, created = analysis_jobs.subscribe('done', produce)
+    assert created and len(list(events)) == 2
+    replay, created = analysis_jobs.subscribe('done', produce)
+    assert not created and len(list(replay)) == 2
+    assert len(runs) == 1
+    assert event_log.log_state(event_log.log_path('done')) == 'finished'
+
+
+@pytest.mark.parametrize('last_event', [
+    {'type': 'error', 'message': 'ThrottlingException'},
+    {'type': 'complete', 'partial': True, 'frame_errors': 3},
+    RuntimeError('decoder died'),
+])
+def test_failed_run_is_not_retained(last_event):
+    runs = []
+
+    def produce():
+        runs.append(1)
+        yield {'type': 'progress'}
+        if isinstance(last_event, Exception):
+            raise last_event
+        yield last_event
+
+    events, created = analysis_jobs.subscribe('failing', produce)
+    list(events)
+    assert 'failing' not in analysis_jobs._jobs
+    assert not os.path.exists(event_log.log_path('failing'))
+
+    retry, created = analysis_jobs.subscribe('failing', produce)
+    assert created
+    list(retry)
+    assert len(runs) == 2
+    assert analysis_jobs.stats()['jobs_failed'] == 2
+
+
+def run_to_completion(key, n=5):
+    def produce():
+        for i in range(n):
+            yield {'n': i}
+    events, _ = analysis_jobs.subscribe(key, produce)
+    return list(events)
+
+
+def test_resume_same_run_from_memory_and_log():
+    sent = run_to_completion('resume')
+    run_id = sent[0][0].rpartition('-')[0]
+
+    events, created = analysis_jobs.subscribe('resume', None, (run_id, 1))
+    assert not created
+    assert list(events) == sent[2:]
+
+    # Same run from the log once it's no longer in memory
+    analysis_jobs._jobs.clear()
+    events, created = analysis_jobs.subscribe('resume', None, (run_id, 1))
+    assert not created
+    assert list(events) == sent[2:]
+
+    # Nothing left to send
+    assert analysis_jobs.subscribe('resume', None, (run_id, 4)) == (None, False)
+
+
+def test_resume_from_another_run_is_reset():
+    sent = run_to_completion('other')
+    events = list(analysis_jobs.subscribe('other', None, ('0123456789ab', 2))[0])
+    assert events[0] == (None, analysis_jobs.RESET)
+    assert events[1:] == sent
+
+
+def test_resume_without_the_run_starts_fresh_with_reset(monkeypatch):
+    monkeypatch.setattr(analysis_jobs, 'EVENT_LOG_DIR', '')
+    sent = run_to_completion('lost')
+    analysis_jobs._jobs.clear()
+
+    def produce():
+        yield {'n': 'new'}
+
+    events = list(analysis_jobs.subscribe('lost', produce, analysis_jobs.parse_event_id(sent[3][0]))[0])
+    assert events[0] == (None, analysis_jobs.RESET)
+    assert [index(event_id) for event_id, _ in events[1:]] == [0]
+    assert events[1][0].rpartition('-')[0] != sent[0][0].rpartition('-')[0]
+
+
+def test_parse_event_id():
+    assert analysis_jobs.parse_event_id(None) is None
+    assert analysis_jobs.parse_event_id('abc123-7') == ('abc123', 7)
+    assert analysis_jobs.parse_event_id('7') == (None, -1)
+    assert analysis_jobs.parse_event_id('garbage') == (None, -1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for the label-rule paths of the analysis endpoints, with a fake Rekognition
+Run with: python -m pytest test_app.py
+"""
+
+import importlib
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+
+class PeopleRekognition:
+    """detect_labels that sees three people in every frame"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def detect_labels(self, Image, **kwargs):
+        self.calls += 1
+        return {'Labels': [{'Name': 'Person', 'Confidence': 99.0, 'Instances': [{}, {}, {}]}]}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Caches, uploads and stores are relative paths - keep them in tmp_path
+    monkeypatch.chdir(tmp_path)
+    app = importlib.import_module('app')
+    monkeypatch.setattr(app, 'rek_client', PeopleRekognition())
+    monkeypatch.setattr(app, 'bedrock_client', None)
+    monkeypatch.setattr(app, 'elevenlabs_client', None)
+    monkeypatch.setattr(app, 'ANALYSIS_JOBS_ENABLED', False)
+    return app
+
+
+@pytest.fixture
+def video(tmp_path):
+    """Six seconds of noise, so nothing is served from an earlier run's label cache"""
+    path = str(tmp_path / 'people.mp4')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 10, (160, 90))
+    rng = np.random.default_rng()
+    for _ in range(60):
+        writer.write(rng.integers(0, 255, (90, 160, 3), dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def stream_events(client, **params):
+    response = client.get('/api/stream-counter', query_string=params)
+    events = [json.loads(line[6:]) for line in response.get_data(as_text=True).split('\n')
+              if line.startswith('data: ')]
+    return [e for e in events if e['type'] == 'detection'], events[-1]
+
+
+def test_stream_target_without_rules_answers_locally(app, video):
+    detections, complete = stream_events(
+        app.app.test_client(), video_path=video, query='How many people are in this frame?', target='People Count'
+    )
+    assert complete['type'] == 'complete'
+    assert detections and all(d['count'] == 3 for d in detections)
+    assert complete['rules'] == {'yes': len(detections), 'no': 0, 'ambiguous': 0}
+
+
+def test_stream_free_text_query_has_no_rules(app, video):
+    detections, complete = stream_events(app.app.test_client(), video_path=video, query='Is the person eating?')
+    assert complete['type'] == 'complete'
+    assert detections
+    assert 'rules' not in complete
+
+
+def requery(client, video, **params):
+    response = client.get('/api/requery', query_string=dict(video_path=video, **params))
+    return response.status_code, response.get_json()
+
+
+def test_requery_without_rules(app, video):
+    client = app.app.test_client()
+    stream_events(client, video_path=video, query='How many people are in this frame?', target='People Count')
+
+    status, result = requery(client, video, query='How many people are visible?', target='People Count')
+    assert status == 200
+    assert result['rules']['required'] == [['person', 'human', 'people']]
+    assert result['summary']['yes'] == result['summary']['frames'] > 0
+    assert result['summary']['ambiguous'] == 0
+    assert all(frame['count'] == 3 for frame in result['frames'])
+
+    status, result = requery(client, video, query='How many people are visible?')
+    assert status == 400
+    assert not result['success']
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for event_log: record framing, the end marker and following a live log
+Run with: python -m pytest test_event_log.py
+"""
+
+import os
+import struct
+import threading
+
+import pytest
+
+import event_log
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'job.log')
+
+
+def write(path, payloads, finish=True, run_id='run1'):
+    log = event_log.EventLogWriter(path, run_id)
+    for payload in payloads:
+        log.append(payload)
+    if finish:
+        log.finish()
+    return log
+
+
+def test_round_trip_and_skip(path):
+    payloads = ['{"n": 0}', '{"n": 1}', '{"text": "caf\\u00e9 \\u2728"}']
+    write(path, payloads)
+    assert list(event_log.read_log(path)) == list(enumerate(payloads))
+    assert list(event_log.read_log(path, start=2)) == [(2, payloads[2])]
+    assert list(event_log.read_log(path, start=5)) == []
+    assert event_log.log_length(path) == 3
+    assert event_log.log_run(path) == 'run1'
+    assert event_log.log_state(path) == 'finished'
+
+
+def test_unfinished_and_missing(path):
+    log = write(path, ['{}'], finish=False)
+    assert event_log.log_state(path) == 'live'
+    log.discard()
+    assert event_log.log_state(path) == 'missing'
+    assert event_log.log_run(path) is None
+    assert list(event_log.read_log(path)) == []
+
+
+def test_only_one_writer(path):
+    write(path, [], finish=False)
+    with pytest.raises(FileExistsError):
+        event_log.EventLogWriter(path, 'run2')
+    assert event_log.log_run(path) == 'run1'
+    assert [name for name in os.listdir(os.path.dirname(path))] == ['job.log']
+
+
+def test_partial_record_is_not_read(path):
+    write(path, ['{"n": 0}'], finish=False)
+    with open(path, 'ab') as f:
+        f.write(struct.pack('>I', 10) + b'{"n"')
+    assert list(event_log.read_log(path)) == [(0, '{"n": 0}')]
+
+
+def test_follow_reads_live_events_until_finished(path, monkeypatch):
+    monkeypatch.setattr(event_log, 'EVENT_LOG_POLL_SECONDS', 0.01)
+    log = write(path, ['{"n": 0}'], finish=False)
+    reader = event_log.read_log(path, start=1, follow=True)
+    received = []
+    thread = threading.Thread(target=lambda: received.extend(reader))
+    thread.start()
+    log.append('{"n": 1}')
+    log.append('{"n": 2}')
+    log.finish()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert received == [(1, '{"n": 1}'), (2, '{"n": 2}')]
+
+
+def test_follow_stops_when_log_is_discarded(path, monkeypatch):
+    monkeypatch.setattr(event_log, 'EVENT_LOG_POLL_SECONDS', 0.01)
+    log = write(path, ['{"n": 0}'], finish=False)
+    reader = event_log.read_log(path, follow=True)
+    assert next(reader) == (0, '{"n": 0}')
+    log.discard()
+    assert list(reader) == []
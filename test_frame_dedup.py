@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for frame_dedup: which frames keep their own Rekognition call
+Run with: python -m pytest test_frame_dedup.py
+"""
+
+import random
+import time
+
+import pytest
+
+import frame_dedup
+from pipeline import ordered_map
+
+# Frame bytes → fake dHash: frame 1 is 3 bits from both 0 and 2, which are
+# 6 bits apart - whichever of them is the reference decides what 1 and 2 do
+HASHES = {b'0': 0b0, b'1': 0b111, b'2': 0b111111, b'3': 0b111111000, b'4': 0b111111111000}
+
+
+@pytest.fixture(autouse=True)
+def fake_dhash(monkeypatch):
+    def dhash(frame_bytes):
+        time.sleep(random.random() * 0.005)  # Workers reach the deduper in any order
+        return HASHES[frame_bytes]
+    monkeypatch.setattr(frame_dedup, 'dhash', dhash)
+
+
+def kept_frames(frames, workers):
+    deduper = frame_dedup.FrameDeduper(max_distance=5, enabled=True)
+    fetched = []
+
+    def label(frame):
+        timestamp, frame_bytes = frame
+        return deduper.detect(frame_bytes, lambda: fetched.append(timestamp) or timestamp)
+
+    results = [analysis.result() for _, analysis in ordered_map(label, deduper.sequence(frames), workers=workers)]
+    return sorted(fetched), results
+
+
+def test_sequential_keeps_first_of_each_scene():
+    frames = [(i, bytes(str(i), 'ascii')) for i in range(5)]
+    fetched, results = kept_frames(frames, workers=1)
+    assert fetched == [0, 2, 3]
+    assert results == [0, 0, 2, 3, 3]
+
+
+def test_concurrent_workers_keep_the_same_frames():
+    frames = [(i, bytes(str(i), 'ascii')) for i in range(5)]
+    expected = kept_frames(frames, workers=1)
+    for _ in range(20):
+        assert kept_frames(frames, workers=4) == expected
+
+
+def test_frames_outside_sequence_still_dedup():
+    deduper = frame_dedup.FrameDeduper(max_distance=5, enabled=True)
+    assert deduper.detect(b'0', lambda: 'a') == 'a'
+    assert deduper.detect(b'1', lambda: 'b') == 'a'
+    assert deduper.stats() == {'frames': 2, 'rekognition_calls': 1, 'rekognition_calls_saved': 1}
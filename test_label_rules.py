@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for label_rules: which configs get local answers and how frames are decided
+Run with: python -m pytest test_label_rules.py
+"""
+
+import label_rules
+
+
+def labels(*names, confidence=95.0, instances=1):
+    return [{'name': name, 'confidence': confidence, 'instances': instances} for name in names]
+
+
+def decide(program, *names, **kwargs):
+    return label_rules.evaluate(program, labels(*names, **kwargs))['decision']
+
+
+def test_free_text_queries_never_answer_locally():
+    """Queries without a configured target always go to Bedrock"""
+    cases = [
+        ('Is the person eating?', ['Person', 'Human']),
+        ('Is someone holding a dog?', ['Dog', 'Pet', 'Animal']),
+        ('Is anyone flipping a burger?', ['Person', 'Burger', 'Food']),
+        ('Is anyone flipping a burger?', ['Person', 'Jumping']),
+    ]
+    for query, frame in cases:
+        program = label_rules.compile_rules({'query': query})
+        assert decide(program, *frame) == 'ambiguous', query
+        assert decide(program) == 'ambiguous', query
+
+
+def test_query_words_do_not_pick_a_template():
+    """A 'flip' in the query or an unknown target doesn't select the backflip rules"""
+    assert label_rules.compile_rules({'query': 'Is anyone flipping a burger?'})['required'] == []
+    assert label_rules.compile_rules({'target': 'Burger Flips', 'query': 'Is anyone flipping?'})['required'] == []
+
+
+def test_configured_target_uses_template():
+    program = label_rules.compile_rules({'target': 'Backflips', 'query': 'Is anyone doing a backflip?'})
+    assert decide(program, 'Person', 'Jumping') == 'yes'
+    assert decide(program, 'Person', 'Standing') == 'no'
+    assert decide(program, 'Person', 'Sport') == 'ambiguous'
+
+
+def test_colour_targets_always_ask_bedrock():
+    program = label_rules.compile_rules({'target': 'Red Shirts'})
+    assert decide(program, 'Person', 'Clothing', 'Shirt') == 'ambiguous'
+
+
+def test_borderline_confidence_is_ambiguous():
+    program = label_rules.compile_rules({'target': 'People Count'})
+    assert decide(program, 'Person', confidence=75) == 'ambiguous'
+    assert decide(program, 'Person', confidence=60) == 'no'
+
+
+def test_count_from_instances():
+    program = label_rules.compile_rules({'target': 'People Count'})
+    result = label_rules.evaluate(program, labels('Person', instances=3))
+    assert result['decision'] == 'yes'
+    assert result['count'] == 3
+
+
+def test_forbidden_vetoes_and_non_strict_no_is_ambiguous():
+    program = label_rules.normalize_program({'required': [['dog']], 'forbidden': ['toy']})
+    assert decide(program, 'Dog', 'Toy') == 'no'
+    assert decide(program, 'Dog') == 'yes'
+    assert decide(program, 'Cat') == 'ambiguous'
+
+
+def test_normalize_program_rejects_malformed():
+    assert label_rules.normalize_program(None) is None
+    assert label_rules.normalize_program({'required': [[1, 2]]}) is None
+    assert label_rules.normalize_program({'required': ['dog', 'puppy']})['required'] == [['dog', 'puppy']]
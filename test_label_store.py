@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for label_store: the columnar evaluator against label_rules.evaluate,
+the .npz round trip and concurrent saves
+Run with: python -m pytest test_label_store.py
+"""
+
+import random
+import threading
+
+import pytest
+
+import label_rules
+import label_store
+
+LABELS = [
+    'Person', 'Human', 'Adult', 'Face', 'Clothing', 'Sport', 'Jumping', 'Acrobatic', 'Flip', 'Airborne',
+    'Outdoors', 'Roller Coaster', 'Amusement Park', 'Ride', 'Crowd', 'People', 'Fighting', 'Dancing',
+    'Dance Pose', 'Party', 'Music', 'Exercise', 'Trampoline', 'Dog', 'Toy', 'Car', 'Gaming'
+]
+
+PROGRAMS = [label_rules.compile_rules({'target': target}) for target in label_rules.RULE_TEMPLATES] + [
+    label_rules.normalize_program({'required': [['dog']], 'forbidden': ['toy'], 'weak': ['pet']}),
+    label_rules.normalize_program({'required': [['person'], ['jump', 'flip']], 'count_from_instances': True,
+                                   'min_confidence': 80, 'ambiguity_margin': 5, 'strict': True}),
+    label_rules.normalize_program({'required': [['car', 'vehicle']], 'strict': False}),
+]
+
+
+def random_frames(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        (i * 0.5, [{'name': name, 'confidence': rng.uniform(55, 99.9), 'instances': rng.choice([0, 0, 1, 2, 3])}
+                   for name in rng.sample(LABELS, rng.randint(0, 12))])
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize('program', PROGRAMS)
+def test_columnar_evaluate_matches_label_rules(program):
+    frames = random_frames(1500)
+    store = label_store.LabelStore.from_frames(frames)
+    decisions, counts = store.evaluate(program)
+
+    for i, (_, labels) in enumerate(frames):
+        expected = label_rules.evaluate(program, labels)
+        assert label_store.DECISIONS[decisions[i]] == expected['decision'], i
+        assert counts[i] == expected['count'], i
+        if expected['decision'] == 'yes':
+            assert store.matched(program, i) == expected['matched'], i
+
+
+def test_save_load_round_trip(tmp_path):
+    frames = random_frames(50)
+    path = str(tmp_path / 'labels.npz')
+    label_store.LabelStore.from_frames(frames).save(path)
+    loaded = label_store.LabelStore.load(path)
+
+    assert len(loaded) == 50
+    for (t, labels), (t2, labels2) in zip(frames, loaded.frames()):
+        assert t == t2
+        assert [l['name'] for l in labels] == [l['name'] for l in labels2]
+        assert [l['confidence'] for l in labels] == pytest.approx([l['confidence'] for l in labels2], abs=1e-4)
+
+
+def test_merged_prefers_newer_frames():
+    old = label_store.LabelStore.from_frames([(0.0, [{'name': 'Dog', 'confidence': 90}]), (1.0, [])])
+    new = label_store.LabelStore.from_frames([(1.0, [{'name': 'Cat', 'confidence': 90}]), (2.0, [])])
+    merged = old.merged(new)
+    assert [t for t, _ in merged.frames()] == [0.0, 1.0, 2.0]
+    assert [l['name'] for l in merged.frames()[1][1]] == ['Cat']
+
+
+def test_concurrent_saves_keep_every_frame(tmp_path, monkeypatch):
+    monkeypatch.setattr(label_store, 'LABEL_STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(label_store, '_stores', label_store.OrderedDict())
+    frames = random_frames(400)
+    passes = [frames[i::8] for i in range(8)]
+    barrier = threading.Barrier(len(passes))
+
+    def save(batch):
+        barrier.wait()
+        label_store.save_labels('video', 'stream_counter', batch)
+
+    threads = [threading.Thread(target=save, args=(batch,)) for batch in passes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    store = label_store.get_label_store('video', 'stream_counter')
+    assert len(store) == len(frames)
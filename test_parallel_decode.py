@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Tests for parallel_decode: splitting sampled frames into decode segments
+Run with: python -m pytest test_parallel_decode.py
+"""
+
+from parallel_decode import split_segments
+
+
+def test_even_split_covers_every_index():
+    indices = list(range(0, 1000, 10))
+    segments = split_segments(indices, 4)
+    assert len(segments) == 4
+    assert [i for segment in segments for i in segment] == indices
+
+
+def test_cuts_move_to_keyframes():
+    indices = list(range(0, 1000, 10))  # 100 samples, nominal cuts at 25/50/75
+    keyframes = [0, 231, 488, 777, 905]
+    segments = split_segments(indices, 4, keyframes)
+    assert [segment[0] for segment in segments] == [0, 240, 490, 780]
+    assert [i for segment in segments for i in segment] == indices
+
+
+def test_far_keyframes_keep_the_even_split():
+    indices = list(range(0, 1000, 10))
+    segments = split_segments(indices, 4, [0, 990])
+    assert [segment[0] for segment in segments] == [0, 250, 500, 750]
+
+
+def test_more_segments_than_indices():
+    assert split_segments([5, 6], 8, [6]) == [[5], [6]]
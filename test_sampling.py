@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests for sampling: MotionScheduler decisions and progress projection
+Run with: python -m pytest test_sampling.py
+"""
+
+import sampling
+
+
+def test_unknown_duration_projects_the_budget():
+    scheduler = sampling.MotionScheduler(budget=20)
+    assert scheduler.expected_count() == 20
+    scheduler.should_sample(0.0, 0.0)
+    assert scheduler.expected_count() == 20
+
+
+def test_idle_video_is_sampled_at_the_max_interval():
+    scheduler = sampling.MotionScheduler(budget=100, min_interval=0.5, max_interval=5)
+    scheduler.duration = 60
+    picked = [t / 4 for t in range(240) if scheduler.should_sample(t / 4, 0.0)]
+    assert picked == [0.0, 5.0, 10.0, 15.0, 20.0, 25.0, 30.0, 35.0, 40.0, 45.0, 50.0, 55.0]
+    assert scheduler.expected_count() >= len(picked)
+
+
+def test_motion_samples_densely_within_budget():
+    scheduler = sampling.MotionScheduler(budget=10, min_interval=0.5, max_interval=5)
+    scheduler.duration = 60
+    picked = [t / 4 for t in range(240) if scheduler.should_sample(t / 4, sampling.MOTION_HIGH)]
+    assert len(picked) == 10
+    # Budget is stretched over the whole video instead of spent in the first seconds
+    assert picked[-1] > 30
+
+
+def test_charged_calls_come_out_of_the_budget():
+    scheduler = sampling.MotionScheduler(budget=10, min_interval=0.5, max_interval=5)
+    scheduler.duration = 60
+    assert scheduler.should_sample(0.0, sampling.MOTION_HIGH)
+    assert scheduler.charge(6) == 6
+    assert scheduler.charge(6) == 3
+    picked = [t / 4 for t in range(4, 240) if scheduler.should_sample(t / 4, sampling.MOTION_HIGH)]
+    assert picked == []
+    assert scheduler.stats()['rekognition_calls'] == 10
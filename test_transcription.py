@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for transcription: whole-track transcripts through StubWhisperRuntime
+and how failed transcriptions are remembered
+Run with: python -m pytest test_transcription.py
+"""
+
+import numpy as np
+import pytest
+
+import transcription
+from audio_index import AudioTrack, AUDIO_SAMPLE_RATE
+
+
+def tone(seconds, amplitude=8000):
+    t = np.arange(int(seconds * AUDIO_SAMPLE_RATE)) / AUDIO_SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 200 * t)).astype(np.int16)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * AUDIO_SAMPLE_RATE), dtype=np.int16)
+
+
+@pytest.fixture
+def track():
+    """Speech at 10-12s and 50-51s of a minute of silence"""
+    return AudioTrack(np.concatenate((silence(10), tone(2), silence(38), tone(1), silence(9))))
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcription, 'TRANSCRIPT_DIR', str(tmp_path / 'transcripts'))
+    monkeypatch.setattr(transcription, '_transcripts', {})
+    monkeypatch.setattr(transcription, '_transcribe_locks', {})
+    monkeypatch.setattr(transcription, '_failures', {})
+    monkeypatch.setattr(transcription, '_background', set())
+
+
+def test_stub_transcript_with_vad(track):
+    runtime = transcription.StubWhisperRuntime()
+    invoke = transcription.whisper_invoker(runtime, transcription.STUB_ENDPOINT)
+    index = transcription.transcribe_track(track, invoke, chunk_seconds=30, use_vad=True)
+
+    assert runtime.calls == 2  # Two speech regions too far apart to share a request
+    assert index.near(11) is not None
+    assert index.near(30) is None
+    assert index.near(50.5) is not None
+    assert index.stats['requests_without_vad'] == 2
+    assert index.stats['endpoint_seconds_saved'] > 50
+
+
+def test_stub_transcript_without_vad(track):
+    runtime = transcription.StubWhisperRuntime()
+    invoke = transcription.whisper_invoker(runtime, transcription.STUB_ENDPOINT)
+    index = transcription.transcribe_track(track, invoke, chunk_seconds=30, use_vad=False)
+
+    assert runtime.calls == 2
+    assert [round(s['start']) for s in index.segments] == [10, 11, 50]
+    assert transcription.TranscriptIndex.from_json(index.to_json()).segments == index.segments
+
+
+def test_failure_is_remembered(track, tmp_path, monkeypatch):
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'not really a video')
+    monkeypatch.setattr(transcription, 'get_audio_track', lambda path: track)
+    calls = []
+
+    def failing(audio_bytes):
+        calls.append(1)
+        raise RuntimeError('endpoint down')
+
+    with pytest.raises(RuntimeError):
+        transcription.get_transcript(str(video), failing)
+    attempted = len(calls)
+    assert transcription.get_transcript(str(video), failing) is None
+    assert not transcription.start_transcript(str(video), failing)
+    assert len(calls) == attempted
+
+    # Retried once the failure has aged out
+    monkeypatch.setattr(transcription, 'TRANSCRIPT_RETRY_SECONDS', 0)
+    runtime = transcription.StubWhisperRuntime()
+    index = transcription.get_transcript(str(video), transcription.whisper_invoker(runtime, transcription.STUB_ENDPOINT))
+    assert index is not None and len(index)
+    assert transcription.peek_transcript(str(video)) is index
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Tests for tts_cache: rendering once per phrase and cleaning up after failures
+Run with: python -m pytest test_tts_cache.py
+"""
+
+import os
+
+import pytest
+
+from tts_cache import TTSCache
+
+
+def test_renders_once_then_hits(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    renders = []
+
+    def synthesize():
+        renders.append(1)
+        return [b'mp3', b'data']
+
+    name = cache.get_or_render('abc', synthesize)
+    assert cache.get_or_render('abc', synthesize) == name
+    assert len(renders) == 1
+    assert (tmp_path / name).read_bytes() == b'mp3data'
+    assert cache.stats()['hits'] == 1
+
+
+def test_failed_render_leaves_no_file_or_lock(tmp_path):
+    cache = TTSCache(str(tmp_path))
+
+    def synthesize():
+        yield b'partial'
+        raise RuntimeError('quota exceeded')
+
+    for key in ('one', 'two'):
+        with pytest.raises(RuntimeError):
+            cache.get_or_render(key, synthesize)
+    assert os.listdir(tmp_path) == []
+    assert cache._key_locks == {}
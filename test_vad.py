@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for vad: speech regions from synthetic PCM
+Run with: python -m pytest test_vad.py
+"""
+
+import numpy as np
+
+import vad
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds, freq=200, amplitude=8000):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16)
+
+
+def test_lone_click_is_not_speech():
+    samples = np.concatenate((silence(0.99), tone(0.03), silence(3.98)))
+    assert vad.speech_regions(samples, SAMPLE_RATE) == []
+    assert not vad.has_speech(samples, SAMPLE_RATE)
+
+
+def test_voiced_stretch_is_speech():
+    samples = np.concatenate((silence(1), tone(0.6), silence(3.4)))
+    regions = vad.speech_regions(samples, SAMPLE_RATE)
+    assert len(regions) == 1
+    start, end = regions[0]
+    assert 0.7 <= start <= 1.0
+    assert 1.6 <= end <= 2.2
+    assert vad.has_speech(samples, SAMPLE_RATE)
+
+
+def test_silence_has_no_speech():
+    assert vad.speech_regions(silence(5), SAMPLE_RATE) == []
+
+
+def test_pack_regions_splits_and_merges():
+    assert vad.pack_regions([(0, 2), (4, 6)], max_seconds=30) == [(0, 6)]
+    assert vad.pack_regions([(0, 2), (20, 22)], max_seconds=30) == [(0, 2), (20, 22)]
+    assert vad.pack_regions([(0, 70)], max_seconds=30) == [(0, 30), (30, 60), (60, 70)]
+
+
+def test_window_of_quiet_speech_is_speech():
+    """A window with no pauses has no noise floor of its own"""
+    window = tone(5, amplitude=500)  # About -39 dBFS, under VAD_LOUD_DBFS
+    assert vad.has_speech(window, SAMPLE_RATE)
+    track = np.concatenate((silence(10), window, silence(10)))
+    assert vad.has_speech(window, SAMPLE_RATE, vad.noise_floor(track, SAMPLE_RATE))
+
+
+def test_short_runs_dropped_long_runs_kept():
+    mask = np.array([1, 0, 1, 1, 1, 0, 0, 1, 1, 0, 1, 1, 1, 1], dtype=bool)
+    kept = vad._drop_short_runs(mask, 3)
+    assert kept.tolist() == [0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 1, 1, 1, 1]
@@ -0,0 +1,330 @@
+"""
+Whole-track Whisper transcription for StreamBet
+The audio track (audio_index.py) is cut into fixed chunks that are sent to
+the Whisper endpoint in parallel with return_timestamps on. The timed
+segments go into a TranscriptIndex, so commentary can look up the speech
+around any timestamp with a binary search instead of transcribing a new
+5s window per frame.
+"""
+
+import io
+import os
+import json
+import time
+import wave
+import base64
+import bisect
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_index import get_audio_track, wav_bytes
+from vad import speech_regions, pack_regions, VAD_ENABLED
+from video_meta import file_signature
+
+# Whisper's native window is 30s
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv('TRANSCRIBE_CHUNK_SECONDS', '30'))
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '4'))
+
+# Speech within this many seconds of a timestamp counts as "near" it
+TRANSCRIPT_NEAR_SECONDS = float(os.getenv('TRANSCRIPT_NEAR_SECONDS', '2.5'))
+
+# A failed transcription (endpoint down, a chunk erroring) isn't retried for this long
+TRANSCRIPT_RETRY_SECONDS = float(os.getenv('TRANSCRIPT_RETRY_SECONDS', '60'))
+
+# Finished transcripts, empty to keep them in memory only
+TRANSCRIPT_DIR = os.getenv('TRANSCRIPT_DIR', os.path.join('cache', 'transcripts'))
+
+# WHISPER_ENDPOINT_NAME value that selects StubWhisperRuntime (local testing, no AWS)
+STUB_ENDPOINT = 'local-stub'
+
+
+class TranscriptIndex:
+    """
+    Timed transcript segments sorted by time
+    Segments don't overlap, so both starts and ends are sorted and a lookup
+    is two bisects plus the segments it returns.
+    """
+
+    def __init__(self, segments, stats=None):
+        self.stats = stats or {}
+        self.segments = sorted(
+            ({'start': float(s['start']), 'end': float(s['end']), 'text': s['text'].strip()} for s in segments
+             if s.get('text', '').strip()),
+            key=lambda s: s['start']
+        )
+        self._starts = [s['start'] for s in self.segments]
+        self._ends = [s['end'] for s in self.segments]
+
+    def __len__(self):
+        return len(self.segments)
+
+    def between(self, start, end):
+        """Segments overlapping [start, end]"""
+        first = bisect.bisect_left(self._ends, start)
+        last = bisect.bisect_right(self._starts, end)
+        return self.segments[first:last]
+
+    def near(self, timestamp, window=TRANSCRIPT_NEAR_SECONDS):
+        """Speech around timestamp as one string, None if nobody spoke"""
+        text = ' '.join(s['text'] for s in self.between(timestamp - window, timestamp + window))
+        return text or None
+
+    @property
+    def text(self):
+        return ' '.join(s['text'] for s in self.segments)
+
+    def to_json(self):
+        return json.dumps({'segments': self.segments, 'stats': self.stats})
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        return cls(data['segments'], data.get('stats'))
+
+
+def parse_whisper_result(result, offset, chunk_end):
+    """
+    Timed segments from a Whisper response for a chunk starting at offset
+    HuggingFace Whisper returns {'text', 'chunks': [{'timestamp': [start, end], 'text'}]}
+    with chunk-relative times; a missing end means "until the end of the audio".
+    """
+    chunks = result.get('chunks')
+    if not chunks:
+        text = result.get('text', '').strip()
+        return [{'start': offset, 'end': chunk_end, 'text': text}] if text else []
+
+    segments = []
+    for chunk in chunks:
+        start, end = (chunk.get('timestamp') or [0, None])[:2]
+        start = offset + (start or 0)
+        end = min(chunk_end, offset + end) if end is not None else chunk_end
+        segments.append({'start': start, 'end': max(start, end), 'text': chunk.get('text', '')})
+    return segments
+
+
+def whisper_invoker(runtime, endpoint):
+    """invoke(wav) -> Whisper JSON result via a SageMaker runtime client (or the stub)"""
+    def invoke(audio_bytes):
+        payload = {
+            "inputs": base64.b64encode(audio_bytes).decode('utf-8'),
+            "parameters": {
+                "return_timestamps": True,
+                "language": None  # Auto-detect language
+            }
+        }
+        response = runtime.invoke_endpoint(
+            EndpointName=endpoint,
+            ContentType='application/json',
+            Body=json.dumps(payload)
+        )
+        return json.loads(response['Body'].read().decode('utf-8'))
+    return invoke
+
+
+def fixed_chunks(duration, chunk_seconds):
+    """[(start, end)] covering the whole track"""
+    bounds = []
+    start = 0.0
+    while start < duration:
+        bounds.append((start, min(duration, start + chunk_seconds)))
+        start += chunk_seconds
+    # Fold a sliver at the end into the previous chunk instead of its own call
+    if len(bounds) > 1 and bounds[-1][1] - bounds[-1][0] < 1:
+        bounds[-2:] = [(bounds[-2][0], bounds[-1][1])]
+    return bounds
+
+
+def transcribe_track(track, invoke, chunk_seconds=TRANSCRIBE_CHUNK_SECONDS, workers=TRANSCRIBE_WORKERS,
+                     use_vad=VAD_ENABLED):
+    """
+    TranscriptIndex for a whole AudioTrack, chunks transcribed in parallel
+    With VAD only speech regions are sent, packed into chunks of up to chunk_seconds
+    """
+    if use_vad:
+        speech = speech_regions(track.samples, track.sample_rate)
+        bounds = pack_regions(speech, chunk_seconds)
+        speech_seconds = sum(end - start for start, end in speech)
+    else:
+        bounds = fixed_chunks(track.duration, chunk_seconds)
+        speech_seconds = track.duration
+
+    def transcribe_chunk(chunk):
+        chunk_start, chunk_end = chunk
+        result = invoke(wav_bytes(track.segment(chunk_start, chunk_end), track.sample_rate))
+        return parse_whisper_result(result, chunk_start, chunk_end)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(bounds) or 1))) as executor:
+        chunk_segments = list(executor.map(transcribe_chunk, bounds))
+
+    endpoint_seconds = sum(end - start for start, end in bounds)
+    stats = {
+        'duration_seconds': round(track.duration, 2),
+        'vad': use_vad,
+        'speech_seconds': round(speech_seconds, 2),
+        'skipped_seconds': round(track.duration - speech_seconds, 2),
+        'endpoint_seconds': round(endpoint_seconds, 2),
+        'endpoint_seconds_saved': round(track.duration - endpoint_seconds, 2),
+        'requests': len(bounds),
+        'requests_without_vad': len(fixed_chunks(track.duration, chunk_seconds))
+    }
+    index = TranscriptIndex([segment for segments in chunk_segments for segment in segments], stats)
+    print(f"📝 Transcribed {track.duration:.0f}s of audio in {len(bounds)} chunks: {len(index)} segments, "
+          f"{stats['endpoint_seconds_saved']:.0f}s not sent")
+    return index
+
+
+_transcripts = {}  # (abspath, signature) -> TranscriptIndex, None when the video has no audio
+_transcripts_lock = threading.Lock()
+_transcribe_locks = {}
+_failures = {}  # key -> time of the last failed transcription
+_background = set()  # keys being transcribed by start_transcript
+
+
+def _key(video_path):
+    return os.path.abspath(video_path), file_signature(video_path)
+
+
+def _failed_recently(key):
+    """Caller holds _transcripts_lock"""
+    failed_at = _failures.get(key)
+    if failed_at is None:
+        return False
+    if time.time() - failed_at < TRANSCRIPT_RETRY_SECONDS:
+        return True
+    del _failures[key]
+    return False
+
+
+def _transcript_path(video_path, signature):
+    raw = f"{os.path.abspath(video_path)}|{signature[0]}|{signature[1]}"
+    return os.path.join(TRANSCRIPT_DIR, f"{hashlib.sha1(raw.encode()).hexdigest()}.json")
+
+
+def peek_transcript(video_path):
+    """Transcript if it's already built, never transcribes or waits"""
+    try:
+        key = _key(video_path)
+    except OSError:
+        return None
+    with _transcripts_lock:
+        return _transcripts.get(key)
+
+
+def start_transcript(video_path, invoke):
+    """
+    Transcribe a video on a background thread unless its transcript is built,
+    already being made, or failed less than TRANSCRIPT_RETRY_SECONDS ago
+    True if a transcription was started
+    """
+    key = _key(video_path)
+    with _transcripts_lock:
+        if key in _transcripts or key in _background or _failed_recently(key):
+            return False
+        _background.add(key)
+
+    def run():
+        try:
+            get_transcript(video_path, invoke)
+        except Exception as e:
+            print(f"⚠️ Transcription failed, retrying in {TRANSCRIPT_RETRY_SECONDS:.0f}s at the earliest: {e}")
+        finally:
+            with _transcripts_lock:
+                _background.discard(key)
+
+    threading.Thread(target=run, name='transcribe', daemon=True).start()
+    return True
+
+
+def get_transcript(video_path, invoke):
+    """
+    Transcript of a video, transcribing the track only the first time it's seen
+    Concurrent callers for the same video wait for one transcription. A
+    failure is raised once and remembered: for TRANSCRIPT_RETRY_SECONDS
+    callers get None instead of sending every chunk again.
+    """
+    key = _key(video_path)
+    signature = key[1]
+    with _transcripts_lock:
+        if key in _transcripts:
+            return _transcripts[key]
+        if _failed_recently(key):
+            return None
+        transcribe_lock = _transcribe_locks.setdefault(key, threading.Lock())
+
+    with transcribe_lock:
+        with _transcripts_lock:
+            if key in _transcripts:
+                return _transcripts[key]
+            if _failed_recently(key):
+                return None
+
+        index = None
+        stored = _transcript_path(video_path, signature) if TRANSCRIPT_DIR else None
+        if stored and os.path.exists(stored):
+            try:
+                with open(stored) as f:
+                    index = TranscriptIndex.from_json(f.read())
+            except (OSError, ValueError, KeyError):
+                index = None
+
+        if index is None:
+            track = get_audio_track(video_path)
+            if track is not None:
+                try:
+                    index = transcribe_track(track, invoke)
+                except Exception:
+                    with _transcripts_lock:
+                        _failures[key] = time.time()
+                        _transcribe_locks.pop(key, None)
+                    raise
+                if stored:
+                    try:
+                        os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
+                        temp_path = f"{stored}.{os.getpid()}.{threading.get_ident()}.tmp"
+                        with open(temp_path, 'w') as f:
+                            f.write(index.to_json())
+                        os.replace(temp_path, stored)
+                    except OSError as e:
+                        print(f"⚠️ Could not save transcript: {e}")
+
+        with _transcripts_lock:
+            _transcripts[key] = index
+            _failures.pop(key, None)
+            _transcribe_locks.pop(key, None)
+        return index
+
+
+class StubWhisperRuntime:
+    """
+    Local stand-in for the SageMaker runtime (WHISPER_ENDPOINT_NAME=local-stub)
+    Decodes the WAV payload and "hears" one segment per loud second, so the
+    transcript pipeline can be exercised without a deployed endpoint.
+    """
+
+    def __init__(self, threshold=500):
+        self.threshold = threshold
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke_endpoint(self, EndpointName, ContentType, Body):
+        with self._lock:
+            self.calls += 1
+        payload = json.loads(Body)
+        with wave.open(io.BytesIO(base64.b64decode(payload['inputs']))) as wav:
+            rate = wav.getframerate()
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+
+        chunks = []
+        for second in range(int(np.ceil(len(samples) / rate))):
+            window = samples[second * rate:(second + 1) * rate].astype(np.float32)
+            if len(window) and np.sqrt(np.mean(window ** 2)) >= self.threshold:
+                end = min(second + 1, len(samples) / rate)
+                chunks.append({'timestamp': [second, end], 'text': f" speech {second}s"})
+
+        result = {'text': ''.join(c['text'] for c in chunks)}
+        if payload.get('parameters', {}).get('return_timestamps'):
+            result['chunks'] = chunks
+        return {'Body': io.BytesIO(json.dumps(result).encode())}
@@ -0,0 +1,126 @@
+"""
+Content-addressed TTS audio cache for StreamBet
+An mp3 is stored under the hash of everything that shapes the audio
+(text, voice, model, voice settings, output format), so a phrase that was
+spoken once is served from disk forever after - no ElevenLabs call.
+"""
+
+import os
+import json
+import hashlib
+import threading
+
+TTS_CACHE_ENABLED = os.getenv('TTS_CACHE_ENABLED', 'true').lower() == 'true'
+
+
+def tts_key(text, voice_id, model_id, voice_settings, output_format):
+    """Stable hash of one synthesis request (whitespace-normalized text)"""
+    raw = json.dumps({
+        'text': ' '.join(text.split()),
+        'voice_id': voice_id,
+        'model_id': model_id,
+        'voice_settings': voice_settings,
+        'output_format': output_format
+    }, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class TTSCache:
+    """
+    mp3 files named tts_<key>.mp3 in one directory
+    The file's existence is the index, so every gunicorn worker shares it.
+    Concurrent requests for the same phrase render it once.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self._known = set()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def filename(self, key):
+        return f"tts_{key}.mp3"
+
+    def lookup(self, key):
+        """Cached filename for key, or None"""
+        # Always stat: the storage janitor may have evicted a known file
+        name = self.filename(key)
+        if os.path.exists(os.path.join(self.directory, name)):
+            with self._lock:
+                self._known.add(name)
+            return name
+        return None
+
+    def get_or_render(self, key, synthesize):
+        """
+        Filename for key, calling synthesize() -> iterable of mp3 chunks on a miss
+        (synthesis errors propagate, nothing is cached)
+        """
+        name = self.lookup(key)
+        if name:
+            with self._lock:
+                self.hits += 1
+            return name
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                # Another thread may have rendered it while we waited
+                name = self.lookup(key)
+                if name:
+                    with self._lock:
+                        self.hits += 1
+                    return name
+
+                with self._lock:
+                    self.misses += 1
+                name = self.filename(key)
+                path = os.path.join(self.directory, name)
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    with open(temp_path, 'wb') as f:
+                        for chunk in synthesize():
+                            f.write(chunk)
+                    os.replace(temp_path, path)  # Atomic, never serve a partial mp3
+                finally:
+                    if os.path.exists(temp_path):
+                        os.unlink(temp_path)
+
+                with self._lock:
+                    self.renders += 1
+                    self._known.add(name)
+                return name
+            finally:
+                # Failed renders too, or every failing phrase leaves a lock behind
+                with self._lock:
+                    self._key_locks.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': TTS_CACHE_ENABLED,
+                'hits': self.hits,
+                'misses': self.misses,
+                'renders': self.renders,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'known_files': len(self._known)
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache(directory):
+    """Process-wide cache instance for the audio directory"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache(directory)
+        return _cache
@@ -0,0 +1,150 @@
+"""
+Energy + zero-crossing voice activity detection for StreamBet
+Runs over the int16 PCM from audio_index.py in a handful of NumPy passes
+(no Python loop per frame), so silence and steady crowd noise can be
+dropped before audio is sent to the Whisper endpoint.
+"""
+
+import os
+
+import numpy as np
+
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() == 'true'
+
+VAD_FRAME_MS = float(os.getenv('VAD_FRAME_MS', '30'))
+
+# A frame is loud enough when it's this far above the track's noise floor
+# (10th percentile frame energy) and above an absolute minimum
+VAD_MARGIN_DB = float(os.getenv('VAD_MARGIN_DB', '12'))
+VAD_MIN_DBFS = float(os.getenv('VAD_MIN_DBFS', '-45'))
+
+# Frames this loud always pass the energy test (a track with no quiet parts
+# has no useful noise floor)
+VAD_LOUD_DBFS = float(os.getenv('VAD_LOUD_DBFS', '-30'))
+
+# Speech crosses zero far less often than hiss/applause-like noise
+VAD_MAX_ZCR = float(os.getenv('VAD_MAX_ZCR', '0.35'))
+
+# Smoothing: keep speech going through short pauses, drop short blips
+VAD_HANGOVER_MS = float(os.getenv('VAD_HANGOVER_MS', '300'))
+VAD_MIN_SPEECH_MS = float(os.getenv('VAD_MIN_SPEECH_MS', '250'))
+
+# Speech regions closer than this are merged into one region
+VAD_MERGE_GAP = float(os.getenv('VAD_MERGE_GAP', '1.5'))
+
+# Regions up to this far apart still share one Whisper request (fewer calls,
+# a little silence sent along)
+VAD_PACK_GAP = float(os.getenv('VAD_PACK_GAP', '5'))
+
+# Padding around each region so words aren't clipped
+VAD_PADDING = float(os.getenv('VAD_PADDING', '0.2'))
+
+
+def frame_features(samples, sample_rate, frame_ms=VAD_FRAME_MS):
+    """Per-frame energy (dBFS) and zero-crossing rate, shape (n_frames,)"""
+    frame_length = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(samples) // frame_length
+    if n_frames == 0:
+        return np.empty(0), np.empty(0), frame_length
+
+    frames = np.asarray(samples[:n_frames * frame_length], dtype=np.float32).reshape(n_frames, frame_length) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    energy_db = 20 * np.log10(np.maximum(rms, 1e-6))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_length - 1 or 1)
+    return energy_db, zcr, frame_length
+
+
+def _runs(mask):
+    """(start, end) frame index pairs of True runs"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+
+def _drop_short_runs(mask, min_frames):
+    """mask with True runs shorter than min_frames cleared (mask is non-empty)"""
+    # Run boundaries from np.diff, then every run's length and value - the
+    # kept runs are expanded back with np.repeat instead of a loop per run
+    edges = np.concatenate(([0], np.flatnonzero(np.diff(mask.astype(np.int8))) + 1, [len(mask)]))
+    lengths = np.diff(edges)
+    return np.repeat(mask[edges[:-1]] & (lengths >= min_frames), lengths)
+
+
+def noise_floor(samples, sample_rate):
+    """Energy (dBFS) of the quietest frames, None for audio shorter than a frame"""
+    energy_db, _, _ = frame_features(samples, sample_rate)
+    return float(np.percentile(energy_db, 10)) if len(energy_db) else None
+
+
+def speech_mask(samples, sample_rate, floor=None):
+    """
+    Boolean speech flag per VAD frame, plus the frame length in samples
+    floor is the noise floor in dBFS, estimated from samples when None
+    """
+    energy_db, zcr, frame_length = frame_features(samples, sample_rate)
+    if not len(energy_db):
+        return np.zeros(0, dtype=bool), frame_length
+
+    if floor is None:
+        floor = np.percentile(energy_db, 10)
+    threshold = max(floor + VAD_MARGIN_DB, VAD_MIN_DBFS)
+    mask = ((energy_db >= threshold) | (energy_db >= VAD_LOUD_DBFS)) & (zcr <= VAD_MAX_ZCR)
+
+    frame_seconds = frame_length / sample_rate
+    # Drop runs too short to be a word - before the hangover, which would
+    # stretch a single loud frame past the minimum
+    min_frames = int(round(VAD_MIN_SPEECH_MS / 1000 / frame_seconds))
+    mask = _drop_short_runs(mask, min_frames)
+
+    # Hangover: a speech frame keeps the next few frames open (dilation via cumsum)
+    hangover = int(round(VAD_HANGOVER_MS / 1000 / frame_seconds))
+    if hangover:
+        counts = np.cumsum(mask)
+        shifted = np.concatenate((np.zeros(hangover + 1, dtype=counts.dtype), counts[:-hangover - 1]))
+        mask = (counts - shifted[:len(counts)]) > 0
+    return mask, frame_length
+
+
+def speech_regions(samples, sample_rate, merge_gap=VAD_MERGE_GAP, padding=VAD_PADDING):
+    """[(start, end)] seconds of speech, padded and with close regions merged"""
+    mask, frame_length = speech_mask(samples, sample_rate)
+    starts, ends = _runs(mask)
+    duration = len(samples) / sample_rate
+    frame_seconds = frame_length / sample_rate
+
+    regions = []
+    for start, end in zip(starts * frame_seconds, ends * frame_seconds):
+        start, end = max(0.0, start - padding), min(duration, end + padding)
+        if regions and start - regions[-1][1] <= merge_gap:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def has_speech(samples, sample_rate, floor=None):
+    """
+    Whether a short window has speech, against the track's noise floor
+    Without one only the absolute VAD_MIN_DBFS applies - a window that is all
+    speech would otherwise be its own noise floor and never pass
+    """
+    return bool(np.any(speech_mask(samples, sample_rate, -np.inf if floor is None else floor)[0]))
+
+
+def pack_regions(regions, max_seconds, pack_gap=VAD_PACK_GAP):
+    """
+    Group speech regions into requests of at most max_seconds
+    Neighbouring regions share a request when the silence between them is
+    short; regions longer than max_seconds are split.
+    """
+    requests = []
+    for start, end in regions:
+        while end - start > max_seconds:
+            requests.append((start, start + max_seconds))
+            start += max_seconds
+        if requests and start - requests[-1][1] <= pack_gap and end - requests[-1][0] <= max_seconds:
+            requests[-1] = (requests[-1][0], end)
+        else:
+            requests.append((start, end))
+    return requests
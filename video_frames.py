@@ -0,0 +1,386 @@
+"""
+Video frame extraction for StreamBet
+Shared by the Flask API and the detection agent
+"""
+
+import os
+import math
+import queue
+import threading
+import cv2
+
+from video_meta import get_metadata
+from serving import offload_cpu, cooperative
+
+# 'sparse' decodes only the sampled frames (grab/seek), 'dense' decodes every frame
+FRAME_EXTRACT_MODE = os.getenv('FRAME_EXTRACT_MODE', 'sparse').lower()
+
+# Gaps larger than this (in frames) are crossed with a seek instead of grab()
+SEEK_THRESHOLD_FRAMES = int(os.getenv('FRAME_SEEK_THRESHOLD', '48'))
+
+# Max encoded frames buffered between the decoder thread and the analysis loop
+FRAME_QUEUE_SIZE = int(os.getenv('FRAME_QUEUE_SIZE', '8'))
+
+# Resize + JPEG settings for frames sent to Rekognition
+# Labels barely change below 1080p, payload size and upload time do
+ANALYSIS_PROFILES = {
+    'full': {'max_dimension': None, 'interpolation': 'area', 'jpeg_quality': 95},  # OpenCV defaults
+    'balanced': {'max_dimension': 960, 'interpolation': 'area', 'jpeg_quality': 85},
+    'fast': {'max_dimension': 640, 'interpolation': 'area', 'jpeg_quality': 80},
+    'tiny': {'max_dimension': 480, 'interpolation': 'area', 'jpeg_quality': 70},
+}
+DEFAULT_ANALYSIS_PROFILE = os.getenv('ANALYSIS_PROFILE', 'fast')
+
+INTERPOLATIONS = {
+    'area': cv2.INTER_AREA,
+    'linear': cv2.INTER_LINEAR,
+    'cubic': cv2.INTER_CUBIC,
+    'nearest': cv2.INTER_NEAREST,
+}
+
+
+def sample_indices(total_frames, frame_interval):
+    """Frame indices kept when sampling every frame_interval-th frame"""
+    return range(0, total_frames, max(1, frame_interval))
+
+
+def read_dense(cap, frame_interval):
+    """
+    Decode every frame and keep every frame_interval-th one
+    Yields (frame_index, frame) tuples
+    """
+    frame_count = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_interval == 0:
+            yield frame_count, frame
+        frame_count += 1
+
+
+def read_sparse(cap, indices, position=0):
+    """
+    Decode only the requested frame indices
+    Short gaps are skipped with grab() (demux + decode, no BGR conversion),
+    long gaps seek to the nearest keyframe so skipped frames are never decoded
+    position is the index of the next frame the decoder will return
+    (None if unknown, e.g. after earlier reads on the same handle)
+    Yields (frame_index, frame) tuples
+    """
+    for target in indices:
+        gap = target - position if position is not None else -1
+        if gap < 0 or gap > SEEK_THRESHOLD_FRAMES:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        else:
+            for _ in range(gap):
+                if not cap.grab():
+                    return
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position = target + 1
+        yield target, frame
+
+
+def get_profile(name=None):
+    """Look up an analysis profile by name, falling back to the default"""
+    name = name or DEFAULT_ANALYSIS_PROFILE
+    if name not in ANALYSIS_PROFILES:
+        print(f"⚠️  Unknown analysis profile '{name}', using '{DEFAULT_ANALYSIS_PROFILE}'")
+        name = DEFAULT_ANALYSIS_PROFILE
+    return name, ANALYSIS_PROFILES[name]
+
+
+def encode_frame(frame, profile=None):
+    """
+    Downscale a BGR frame to the profile's max dimension and JPEG-encode it
+    Returns the JPEG bytes
+    """
+    _, settings = get_profile(profile)
+    max_dimension = settings['max_dimension']
+    height, width = frame.shape[:2]
+
+    if max_dimension and max(height, width) > max_dimension:
+        scale = max_dimension / max(height, width)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        frame = cv2.resize(frame, size, interpolation=INTERPOLATIONS[settings['interpolation']])
+
+    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, settings['jpeg_quality']])
+    return buffer.tobytes()
+
+
+def open_video(video_path):
+    """
+    Open a video for decoding, header values come from the metadata index
+    Returns (cap, video_fps, total_frames), cap is None if the file can't be opened
+    """
+    metadata = get_metadata(video_path)
+    if metadata is None:
+        return None, 0, 0
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print("⚠️  Could not open video file")
+        return None, 0, 0
+    return cap, metadata['fps'], metadata['frame_count']
+
+
+def frame_interval_for(video_fps, fps):
+    """Number of source frames between two samples at the requested FPS"""
+    return max(1, int(video_fps / fps)) if video_fps > 0 else 1
+
+
+def iter_encoded_frames(cap, video_fps, total_frames, fps=1, mode=None, profile=None):
+    """
+    Decode and JPEG-encode sampled frames from an open capture
+    Yields (timestamp, frame_data) tuples, the caller releases cap
+    """
+    mode = (mode or FRAME_EXTRACT_MODE).lower()
+    frame_interval = frame_interval_for(video_fps, fps)
+
+    # Sparse mode needs a reliable frame count to plan its seeks
+    if mode == 'sparse' and total_frames > 0:
+        source = read_sparse(cap, sample_indices(total_frames, frame_interval))
+    else:
+        source = read_dense(cap, frame_interval)
+
+    for frame_index, frame in source:
+        timestamp = frame_index / video_fps if video_fps > 0 else frame_index
+
+        yield timestamp, encode_frame(frame, profile)
+
+
+def extract_frames(video_path, fps=1, mode=None, profile=None, scheduler=None, parallel=None):
+    """
+    Extract frames from video at specified FPS
+    (or at the times a sampling scheduler picks, see sampling.py)
+    parallel: decode across processes (see parallel_decode.py), None = auto for long videos
+    Returns list of (timestamp, frame_data) tuples
+    """
+    metadata = get_metadata(video_path)
+    if metadata is None:
+        return []
+
+    total_frames = metadata['frame_count']
+    duration = metadata['duration']
+    print(f"📹 Video: {metadata['fps']} fps, {total_frames} frames, {duration:.2f}s")
+
+    # Fixed-rate sparse sampling splits cleanly into independent time segments
+    if not scheduler and (mode or FRAME_EXTRACT_MODE).lower() == 'sparse' and total_frames > 0:
+        import parallel_decode
+        if parallel is None:
+            # The process pool isn't greenlet-safe, gevent workers decode on the CPU executor instead
+            parallel = (not cooperative()
+                        and parallel_decode.PARALLEL_DECODE_WORKERS > 1
+                        and duration >= parallel_decode.PARALLEL_DECODE_MIN_SECONDS)
+        if parallel:
+            frames = parallel_decode.extract_frames_parallel(video_path, fps=fps, profile=profile)
+            print(f"✅ Extracted {len(frames)} frames")
+            return frames
+
+    cap, video_fps, total_frames = open_video(video_path)
+    if cap is None:
+        return []
+
+    if scheduler:
+        print(f"🎬 Extracting frames with {type(scheduler).__name__}...")
+        frames = list(scheduler.iter_frames(cap, video_fps, total_frames, profile=profile))
+    else:
+        print(f"🎬 Extracting 1 frame per {1/fps} second(s) ({(mode or FRAME_EXTRACT_MODE).lower()})...")
+        frames = list(iter_encoded_frames(cap, video_fps, total_frames, fps=fps, mode=mode, profile=profile))
+
+    cap.release()
+    print(f"✅ Extracted {len(frames)} frames")
+    return frames
+
+
+class FrameStream:
+    """
+    Lazy frame source that decodes in a background thread
+    Iterate it to get (timestamp, frame_data) tuples as soon as each frame
+    is encoded. The bounded queue keeps at most queue_size JPEGs in memory
+    and blocks the decoder when the consumer falls behind.
+    """
+
+    _DONE = object()
+
+    def __init__(self, video_path, fps=1, mode=None, profile=None, scheduler=None, queue_size=None):
+        self.video_path = video_path
+        self.fps = fps
+        self.mode = mode
+        self.profile = profile
+        self.scheduler = scheduler
+        self._expected_count = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=queue_size or FRAME_QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Counts come from the metadata index, the capture is opened on the decoder thread
+        metadata = get_metadata(video_path)
+        if metadata is None:
+            self._queue.put(self._DONE)
+            return
+        video_fps = metadata['fps']
+        total_frames = metadata['frame_count']
+
+        if scheduler:
+            scheduler.duration = metadata['duration']
+        elif total_frames > 0:
+            self._expected_count = len(sample_indices(total_frames, frame_interval_for(video_fps, fps)))
+
+        print(f"📹 Streaming frames: {video_fps} fps, {total_frames} frames, ~{self.expected_count} samples")
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        """Block until the consumer makes room, giving up once the stream is closed"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @property
+    def expected_count(self):
+        """Number of frames this stream will yield (projected when a scheduler decides)"""
+        if self.scheduler:
+            return self.scheduler.expected_count()
+        return self._expected_count
+
+    def _produce(self):
+        # Under gevent this "thread" is a greenlet, so each decode step runs on
+        # the native CPU executor (offload_cpu is a plain call otherwise)
+        cap, video_fps, total_frames = offload_cpu(open_video, self.video_path)
+        if cap is None:
+            self._put(self._DONE)
+            return
+        try:
+            if self.scheduler:
+                source = self.scheduler.iter_frames(cap, video_fps, total_frames, profile=self.profile)
+            else:
+                source = iter_encoded_frames(cap, video_fps, total_frames, fps=self.fps,
+                                             mode=self.mode, profile=self.profile)
+            while True:
+                item = offload_cpu(next, source, self._DONE)
+                if item is self._DONE or not self._put(item):
+                    break
+        except Exception as e:
+            print(f"❌ Frame producer error: {e}")
+            self.error = e
+        finally:
+            cap.release()
+            self._put(self._DONE)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                break
+            yield item
+        if self.error:
+            raise self.error
+
+    def close(self):
+        """Stop the decoder thread (e.g. when the SSE client disconnects)"""
+        self._stop.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WindowReader:
+    """
+    Random-access reads of short time windows from one capture handle
+    Each window seeks once and then grabs forward, so a refinement pass
+    around a few candidate timestamps never decodes the rest of the video
+    """
+
+    def __init__(self, video_path, profile=None):
+        self.profile = profile
+        self.cap, self.video_fps, self.total_frames = open_video(video_path)
+        self._position = None  # Next frame the decoder will return, unknown until the first read
+
+    def read_window(self, start, end, fps, skip=()):
+        """
+        Encode frames between start and end seconds at the given FPS,
+        leaving out frame indices in skip (already-analyzed samples)
+        Returns a list of (timestamp, frame_data) tuples
+        """
+        if not self.cap or self.video_fps <= 0:
+            return []
+
+        # Round the step up so a source only a little faster than fps isn't read frame by frame
+        step = max(1, int(math.ceil(self.video_fps / fps))) if fps > 0 else 1
+        first = max(0, int(round(start * self.video_fps)))
+        last = int(end * self.video_fps)
+        if self.total_frames > 0:
+            last = min(last, self.total_frames - 1)
+        indices = [i for i in range(first, last + 1, step) if i not in skip]
+
+        frames = []
+        for frame_index, frame in read_sparse(self.cap, indices, position=self._position):
+            frames.append((frame_index / self.video_fps, encode_frame(frame, self.profile)))
+            self._position = frame_index + 1
+        return frames
+
+    def frame_index(self, timestamp):
+        return int(round(timestamp * self.video_fps))
+
+    def close(self):
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AnalysisStats:
+    """
+    Bytes-per-frame and Rekognition round-trip latency per analysis profile
+    Used to pick the cheapest profile that still gives good labels
+    """
+
+    def __init__(self, max_samples=500):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, profile, frame_bytes, seconds):
+        with self._lock:
+            samples = self._samples.setdefault(profile or DEFAULT_ANALYSIS_PROFILE, [])
+            samples.append((frame_bytes, seconds))
+            if len(samples) > self.max_samples:
+                del samples[0]
+
+    def summary(self):
+        summary = {}
+        with self._lock:
+            for profile, samples in self._samples.items():
+                sizes = sorted(s[0] for s in samples)
+                latencies = sorted(s[1] for s in samples)
+                count = len(samples)
+                summary[profile] = {
+                    'calls': count,
+                    'avg_bytes': int(sum(sizes) / count),
+                    'avg_latency_ms': round(sum(latencies) / count * 1000, 1),
+                    'p50_latency_ms': round(latencies[count // 2] * 1000, 1),
+                    'p95_latency_ms': round(latencies[min(count - 1, int(count * 0.95))] * 1000, 1),
+                }
+        return summary
@@ -0,0 +1,175 @@
+"""
+Video metadata index for StreamBet
+Probes a video once (fps, frame count, duration, resolution, codec) and
+keeps the result keyed by path + mtime + size, in memory and as a JSON file
+under VIDEO_META_DIR. Keyframe times need a pass over every packet, so they
+are only probed (with ffprobe) and added to the entry the first time
+get_keyframes asks for them - not at upload.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+import subprocess
+
+import cv2
+
+VIDEO_META_DIR = os.getenv('VIDEO_META_DIR', os.path.join('cache', 'video_meta'))
+
+# Keyframe listing reads every packet header, skip it for very long files
+KEYFRAME_PROBE_TIMEOUT = float(os.getenv('KEYFRAME_PROBE_TIMEOUT', '20'))
+
+_index = {}
+_index_lock = threading.Lock()
+
+
+def file_signature(path):
+    """(mtime, size) - any change to the file invalidates its metadata"""
+    stat = os.stat(path)
+    return stat.st_mtime, stat.st_size
+
+
+def index_path(path):
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(VIDEO_META_DIR, f"{digest}.json")
+
+
+def probe_keyframes(path):
+    """Keyframe timestamps in seconds from packet flags (no decoding), None without ffprobe"""
+    ffprobe = shutil.which('ffprobe')
+    if not ffprobe:
+        return None
+    try:
+        output = subprocess.run(
+            [ffprobe, '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path],
+            capture_output=True, text=True, timeout=KEYFRAME_PROBE_TIMEOUT, check=True
+        ).stdout
+    except Exception as e:
+        print(f"⚠️  Keyframe probe failed: {e}")
+        return None
+
+    keyframes = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(round(float(pts_time), 3))
+    return sorted(keyframes)
+
+
+def probe(path):
+    """Read the container header once, returns None if OpenCV can't open the file"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"⚠️  Could not open video file: {path}")
+        return None
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        codec = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ') or None
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        cap.release()
+
+    return {
+        'fps': fps,
+        'frame_count': frame_count,
+        'duration': frame_count / fps if fps > 0 else 0,
+        'width': width,
+        'height': height,
+        'codec': codec
+    }
+
+
+def _save_entry(stored, entry):
+    try:
+        os.makedirs(VIDEO_META_DIR, exist_ok=True)
+        temp_path = f"{stored}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(temp_path, stored)  # Atomic, other workers never see a partial file
+    except OSError as e:
+        print(f"⚠️  Could not save video metadata: {e}")
+
+
+def get_metadata(path):
+    """
+    Metadata for a video file, probing it only the first time it's seen
+    (or after it changed on disk). Returns None if the file can't be read.
+    """
+    entry = _get_entry(path)
+    return entry['metadata'] if entry else None
+
+
+def get_keyframes(path):
+    """Keyframe timestamps in seconds, probed on first use; None without ffprobe"""
+    entry = _get_entry(path)
+    if entry is None:
+        return None
+    metadata = entry['metadata']
+    if 'keyframes' not in metadata:
+        metadata['keyframes'] = probe_keyframes(path)
+        _save_entry(index_path(path), entry)
+    return metadata['keyframes']
+
+
+def _get_entry(path):
+    try:
+        signature = file_signature(path)
+    except OSError:
+        return None
+
+    key = os.path.abspath(path)
+    with _index_lock:
+        entry = _index.get(key)
+    if entry and entry['signature'] == list(signature):
+        return entry
+
+    stored = index_path(path)
+    try:
+        with open(stored) as f:
+            entry = json.load(f)
+        if entry['signature'] != list(signature):
+            entry = None
+    except (OSError, ValueError, KeyError):
+        entry = None
+
+    if entry is None:
+        metadata = probe(path)
+        if metadata is None:
+            return None
+        entry = {'path': key, 'signature': list(signature), 'metadata': metadata}
+        _save_entry(stored, entry)
+
+    with _index_lock:
+        _index[key] = entry
+    return entry
+
+
+_hashes = {}  # abspath -> (signature, sha256 hex)
+_hashes_lock = threading.Lock()
+
+
+def content_hash(path, block_size=1 << 20):
+    """
+    SHA-256 of a video's bytes, computed once per (path, mtime, size)
+    Two uploads of the same file get the same hash whatever they're named
+    """
+    signature = file_signature(path)
+    key = os.path.abspath(path)
+    with _hashes_lock:
+        entry = _hashes.get(key)
+    if entry and entry[0] == signature:
+        return entry[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    with _hashes_lock:
+        _hashes[key] = (signature, digest.hexdigest())
+    return digest.hexdigest()